@@ -0,0 +1,178 @@
+"""
+Automatic allocation of bells to the ringers in the room.  The solver fills the empty bells of
+every touch which hasn't been rung, and repairs touches where ringers have left: bells which have
+already been given to ringers in the room are kept, and every other bell is given to whoever has
+rung the fewest touches so far, preferring bells that they have rung before in the same mode.
+
+Nothing is changed directly - the result is a Suggestion, which the conductor can accept or
+dismiss.  All the work is done with bell masks (see `practice`), so solving 40 touches of 16 bells
+with 30 ringers takes a few milliseconds.
+"""
+
+from practice import BELL_MODES, HAND, bells_in_mask, mask_to_text, size_mask
+
+"""
+In handbell touches every ringer rings a pair of bells, starting at an odd bell (i.e. 1-2, 3-4,
+etc.), as masks of 0-indexed bells.
+"""
+HAND_PAIRS = [0b11 << (2 * i) for i in range(8)]
+
+
+class Preferences:
+    """
+    Which modes (tower or hand bells) each ringer will ring.  Ringers who aren't mentioned ring
+    both, and ringers with no modes are sitting out.
+    """
+
+    def __init__(self):
+        # Maps ringer IDs to the set of bell modes that they will ring
+        self._modes = {}
+
+    def modes(self, ringer_id):
+        return self._modes.get(ringer_id, set(BELL_MODES))
+
+    def set_modes(self, ringer_id, modes):
+        self._modes[ringer_id] = set(modes)
+
+    def rings(self, ringer_id, bell_mode):
+        return bell_mode in self.modes(ringer_id)
+
+    def rename(self, old_id, new_id):
+        """ Move a ringer's modes to a new ringer ID (see `Practice.rename_ringer`). """
+        if old_id in self._modes:
+            self._modes[new_id] = self._modes.pop(old_id)
+
+    def forget(self, ringer_id):
+        self._modes.pop(ringer_id, None)
+
+
+class Suggestion:
+    """ A set of suggested changes to the text of the cells of some touches. """
+
+    def __init__(self, changes):
+        # Maps touch IDs to maps from ringer IDs to their new text
+        self.changes = changes
+
+    @property
+    def num_changes(self):
+        return sum(len(cells) for cells in self.changes.values())
+
+    @property
+    def is_empty(self):
+        return not self.changes
+
+    def text(self, touch_id, ringer_id):
+        """ The suggested text for a cell, or None if the cell isn't changed. """
+        cells = self.changes.get(touch_id)
+        return None if cells is None else cells.get(ringer_id)
+
+    def apply(self, practice):
+        """ Make the suggested changes, returning the TouchPlans which have changed. """
+        plans = [t for t in practice.touches if t.id in self.changes]
+        for plan in plans:
+            # Ignore any ringers who have been removed since the suggestion was made
+            plan.set_texts({
+                r: text for r, text in self.changes[plan.id].items() if r in practice.ringers
+            })
+        return plans
+
+
+def suggest(practice, preferences, plans):
+    """
+    Works out how to fill and repair the given TouchPlans (in order), returning a Suggestion.
+    Touches which aren't given (and touches which have been archived) count towards the fairness,
+    but aren't changed.
+    """
+    present = [r for r, ringer in practice.ringers.items() if ringer.is_in_room]
+    plan_ids = {p.id for p in plans}
+
+    # The number of touches each present ringer rings, and the bells they've rung in each mode
+    num_rung = {r: practice.archived_rung.get(r, 0) for r in present}
+    preferred = {
+        mode: {r: practice.archived_bells[mode].get(r, 0) for r in present}
+        for mode in BELL_MODES
+    }
+    for plan in practice.touches:
+        for r in present:
+            mask = plan.bells(r)
+            if mask:
+                preferred[plan.bell_mode][r] |= mask
+                if plan.id not in plan_ids:
+                    num_rung[r] += 1
+
+    changes = {}
+    for plan in plans:
+        cells = _solve_touch(practice, preferences, plan, present, num_rung,
+                             preferred[plan.bell_mode])
+        if cells:
+            changes[plan.id] = cells
+    return Suggestion(changes)
+
+
+def _solve_touch(practice, preferences, plan, present, num_rung, preferred):
+    """
+    Fill the free bells of one touch, returning a map from ringer IDs to their new text (for the
+    cells which change), and updating `num_rung` with who rings this touch.
+    """
+    mode = plan.bell_mode
+    all_bells = size_mask(plan.size)
+    changes = {}
+
+    # Keep the bells of ringers who are here and ringing this mode (the first ringer to claim a bell
+    # keeps it), and take bells away from everyone else
+    taken = 0
+    ringing = set()
+    for r in practice.ringers:
+        mask = plan.bells(r)
+        if mask == 0 and not plan.has_invalid_text(r):
+            continue
+        kept = 0
+        if practice.is_in_room(r) and preferences.rings(r, mode):
+            kept = mask & ~taken
+        taken |= kept
+        if kept != mask or plan.has_invalid_text(r):
+            changes[r] = mask_to_text(kept)
+        if kept:
+            ringing.add(r)
+
+    free = all_bells & ~taken
+    if free:
+        # Split the free bells into the units that one ringer would ring
+        if mode == HAND:
+            units = [pair & free for pair in HAND_PAIRS if pair & free]
+        else:
+            units = [1 << b for b in bells_in_mask(free)]
+
+        # The ringers who have rung the least get the first choice of bells
+        candidates = sorted(
+            (r for r in present if r not in ringing and preferences.rings(r, mode)),
+            key=lambda r: num_rung[r],
+        )[:len(units)]
+        allocation = {}
+        for r in candidates:
+            # Prefer a unit containing a bell they've rung before, then the lowest free unit
+            best = 0
+            for i, unit in enumerate(units):
+                if unit & preferred[r]:
+                    best = i
+                    break
+            allocation[r] = units.pop(best)
+
+        # Swap bells between pairs of new ringers if that gives more people a preferred bell
+        new_ringers = list(allocation)
+        for i, a in enumerate(new_ringers):
+            for b in new_ringers[i + 1:]:
+                unit_a, unit_b = allocation[a], allocation[b]
+                before = bool(unit_a & preferred[a]) + bool(unit_b & preferred[b])
+                after = bool(unit_b & preferred[a]) + bool(unit_a & preferred[b])
+                if after > before:
+                    allocation[a], allocation[b] = unit_b, unit_a
+
+        for r, unit in allocation.items():
+            changes[r] = mask_to_text(unit)
+            ringing.add(r)
+
+    for r in ringing:
+        num_rung[r] += 1
+    # Don't suggest changes which leave a cell as it was
+    return {r: text for r, text in changes.items() if text != plan.text(r)}
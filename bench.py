@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+"""
+A benchmark harness for the paths that get hit every practice night.  It builds synthetic practices
+of N users by M touches on 4-16 bells, times the hot paths and writes the results as JSON so that
+releases can be compared.
+
+By default the Tk views (`main.Matrix` and friends) are benchmarked if a display is available
+(which can be a virtual one, e.g. under `xvfb-run`), and the headless `practice` model is used
+otherwise.  Tower traffic always goes to a `fake_tower.FakeTower`, so nothing touches the network.
+
+Example:
+    python bench.py --users 10,30 --touches 10,40 --bells 6,8,12,16 --output bench.json
+"""
+
+import argparse
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+
+from fake_tower import FakeTower
+from planner import UNASSIGN_ALL, plan_load
+from practice import BELL_NAMES, Practice, SIZES
+
+# The number of users who drop out and reconnect in a presence storm
+STORM_SIZE = 20
+
+
+# ===== BACKENDS =====
+
+class HeadlessBackend:
+    """ Drives the headless `practice.Practice` model directly. """
+
+    name = "headless"
+
+    def __init__(self, users):
+        self.practice = Practice()
+        for user_id, name in users.items():
+            self.practice.add_ringer(user_id, name)
+
+    @property
+    def touches(self):
+        return self.practice.touches
+
+    def plan(self, touch):
+        return touch
+
+    def add_touch(self):
+        return self.practice.add_touch()
+
+    def add_user(self, user_id, name):
+        self.practice.add_ringer(user_id, name)
+
+    def set_size(self, touch, size):
+        touch.set_size(size)
+
+    def set_cell(self, touch, user_id, text):
+        touch.set_text(user_id, text)
+
+    def presence(self, user_ids, is_in_room):
+        for u in user_ids:
+            self.practice.set_in_room(u, is_in_room)
+        self.practice.update_presence(user_ids)
+
+    def settle(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class TkBackend:
+    """ Drives the real Tk views, with all the redraws that they cause. """
+
+    name = "tk"
+
+    def __init__(self, users):
+        import tkinter as tk
+        import main
+
+        self._window = tk.Tk()
+        self._window.title("Minor General benchmark")
+        self._tower = FakeTower(users=users)
+        self.matrix = main.Matrix(self._window, self._tower)
+        self.matrix.pack(expand=True, fill=tk.BOTH)
+        self.settle()
+
+    @property
+    def touches(self):
+        return self.matrix.touches
+
+    def plan(self, touch):
+        return touch.plan
+
+    def add_touch(self):
+        self.matrix._add_touch()
+        return self.matrix.touches[-1]
+
+    def add_user(self, user_id, name):
+        self.matrix._on_user_enter(user_id, name)
+
+    def set_size(self, touch, size):
+        touch.set_size(size)
+
+    def set_cell(self, touch, user_id, text):
+        touch.set_cell(user_id, text)
+
+    def presence(self, user_ids, is_in_room):
+        for u in user_ids:
+            if is_in_room:
+                self.matrix._on_user_enter(u, self.matrix.users[u].name)
+            else:
+                self.matrix._on_user_leave(u, self.matrix.users[u].name)
+
+    def settle(self):
+        """ Run all the idle callbacks, which is where the redraws happen. """
+        self._window.update_idletasks()
+
+    def close(self):
+        self.matrix.close()
+        self._window.destroy()
+
+
+def make_backend(kind, users):
+    if kind == "headless":
+        return HeadlessBackend(users)
+    if kind == "tk":
+        return TkBackend(users)
+    # Pick the Tk views if there's a display to put them on
+    try:
+        return TkBackend(users)
+    except Exception:
+        return HeadlessBackend(users)
+
+
+# ===== SYNTHETIC PRACTICES =====
+
+def synthetic_touches(rng, user_ids, num_touches, num_bells, changes_per_touch=2):
+    """
+    Generates a list of `{bell: user_id}` assignments for consecutive touches, where each touch
+    differs from the last by swapping a few ringers in or out (like most real practices).
+    """
+    num_bells = min(num_bells, len(user_ids))
+    band = rng.sample(user_ids, num_bells)
+    touches = []
+    for _ in range(num_touches):
+        for _ in range(changes_per_touch):
+            bench = [u for u in user_ids if u not in band]
+            if bench and rng.random() < 0.5:
+                band[rng.randrange(num_bells)] = rng.choice(bench)
+            else:
+                i, j = rng.randrange(num_bells), rng.randrange(num_bells)
+                band[i], band[j] = band[j], band[i]
+        touches.append({b: u for b, u in enumerate(band)})
+    return touches
+
+
+def build_practice(backend, rng, num_users, num_touches, num_bells):
+    """ Fills a backend with a synthetic practice, returning the per-touch assignments. """
+    assignments = synthetic_touches(rng, list(range(num_users)), num_touches, num_bells)
+    for bells in assignments:
+        touch = backend.add_touch()
+        backend.set_size(touch, num_bells)
+        for bell, user_id in bells.items():
+            backend.set_cell(touch, user_id, BELL_NAMES[bell])
+    backend.settle()
+    return assignments
+
+
+# ===== TIMING =====
+
+def timed(func):
+    """ Runs `func`, returning the time it took in microseconds. """
+    start = time.perf_counter_ns()
+    func()
+    return (time.perf_counter_ns() - start) / 1000
+
+
+def summarise(name, params, samples_us, **extra):
+    samples_us = sorted(samples_us)
+    result = dict(params)
+    result.update({
+        "name": name,
+        "samples": len(samples_us),
+        "mean_us": statistics.mean(samples_us),
+        "median_us": statistics.median(samples_us),
+        "p95_us": samples_us[min(len(samples_us) - 1, int(len(samples_us) * 0.95))],
+        "max_us": samples_us[-1],
+    })
+    result.update(extra)
+    return result
+
+
+# ===== BENCHMARKS =====
+
+def bench_keystroke(backend, rng, params, num_samples):
+    """ The time from a cell being edited to the touch being validated and redrawn. """
+    touches = backend.touches
+    num_users = params["users"]
+    samples = []
+    for _ in range(num_samples):
+        touch = rng.choice(touches)
+        user_id = rng.randrange(num_users)
+        text = ''.join(rng.choice(BELL_NAMES[:params["bells"]]) for _ in range(rng.randrange(3)))
+
+        def edit():
+            backend.set_cell(touch, user_id, text)
+            backend.settle()
+        samples.append(timed(edit))
+    return summarise("keystroke", params, samples)
+
+
+def bench_add_user(backend, rng, params, num_samples):
+    """ The time to add a new user to every touch of the practice. """
+    samples = []
+    for i in range(num_samples):
+        user_id = params["users"] + 1000 + i
+
+        def add():
+            backend.add_user(user_id, f"Extra {i}")
+            backend.settle()
+        samples.append(timed(add))
+    return summarise("add_user", params, samples)
+
+
+def bench_add_touch(backend, rng, params, num_samples):
+    """ The time to add (and clone the settings of) a new touch. """
+    def add():
+        backend.add_touch()
+        backend.settle()
+    return summarise("add_touch", params, [timed(add) for _ in range(num_samples)])
+
+
+def bench_presence_storm(backend, rng, params, num_samples):
+    """ The time to handle `STORM_SIZE` users all leaving and then re-entering. """
+    user_ids = list(range(min(STORM_SIZE, params["users"])))
+    samples = []
+    for _ in range(num_samples):
+        def storm():
+            backend.presence(user_ids, False)
+            backend.settle()
+            backend.presence(user_ids, True)
+            backend.settle()
+        samples.append(timed(storm))
+    return summarise("presence_storm", params, samples, storm_size=len(user_ids))
+
+
+def bench_load_ops(assignments, params):
+    """
+    Counts the tower operations needed to load every touch in order, comparing the planner with
+    the original strategy of unassigning everything and reassigning every bell.
+    """
+    size = params["bells"]
+    current = {}
+    planned_ops = 0
+    full_resets = 0
+    naive_ops = 0
+    samples = []
+    for bells in assignments:
+        start = time.perf_counter_ns()
+        plan = plan_load(size, None, current, size, None, bells)
+        samples.append((time.perf_counter_ns() - start) / 1000)
+        planned_ops += plan.num_paced_ops
+        full_resets += sum(1 for op in plan if op[0] == UNASSIGN_ALL)
+        naive_ops += len(bells)
+        current = dict(bells)
+    return summarise(
+        "load_plan", params, samples,
+        planned_paced_ops=planned_ops,
+        naive_paced_ops=naive_ops,
+        full_resets=full_resets,
+    )
+
+
+BENCHMARKS = [bench_keystroke, bench_presence_storm, bench_add_user, bench_add_touch]
+
+
+def run(kind, user_counts, touch_counts, bell_counts, num_samples, seed):
+    results = []
+    backend_name = None
+    for num_users in user_counts:
+        for num_touches in touch_counts:
+            for num_bells in bell_counts:
+                params = {"users": num_users, "touches": num_touches, "bells": num_bells}
+                print(f"Benchmarking {params}", file=sys.stderr)
+                for bench in BENCHMARKS:
+                    # Every benchmark gets a fresh practice, so they don't affect each other
+                    rng = random.Random(seed)
+                    users = {u: f"Ringer {u}" for u in range(num_users)}
+                    backend = make_backend(kind, users)
+                    backend_name = backend.name
+                    assignments = build_practice(backend, rng, num_users, num_touches, num_bells)
+                    results.append(bench(backend, rng, params, num_samples))
+                    backend.close()
+                results.append(bench_load_ops(assignments, params))
+    return backend_name, results
+
+
+def parse_counts(text):
+    return [int(x) for x in text.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Minor General hot paths.")
+    parser.add_argument("--backend", choices=["auto", "tk", "headless"], default="auto")
+    parser.add_argument("--users", type=parse_counts, default=[10, 30])
+    parser.add_argument("--touches", type=parse_counts, default=[10, 40])
+    parser.add_argument("--bells", type=parse_counts, default=[6, 8, 12, 16])
+    parser.add_argument("--samples", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="File to write the JSON results to (default: stdout)")
+    args = parser.parse_args()
+
+    for b in args.bells:
+        if b not in SIZES:
+            parser.error(f"{b} is not a valid tower size (expected one of {SIZES})")
+
+    backend_name, results = run(args.backend, args.users, args.touches, args.bells,
+                                args.samples, args.seed)
+    report = {
+        "meta": {
+            "backend": backend_name,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "samples": args.samples,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.output is None:
+        print(text)
+    else:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
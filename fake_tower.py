@@ -0,0 +1,393 @@
+"""
+A local stand-in for `belltower.RingingRoomTower`, so that the load path and the event handling can
+be benchmarked and regression-tested without connecting to ringingroom.com.
+
+The fake keeps two copies of the tower's state: the 'server' state, which commands change
+immediately, and the 'client' state, which (like the real library) only changes when the server's
+echo arrives.  Echoes are delivered after a configurable latency on a separate thread (standing in
+for the socket-io thread), and can be dropped to simulate lost acknowledgements.  Every outgoing
+command is recorded with a timestamp.  The connection can also be dropped and resynchronised, like
+`tower_connection.PreparedTower`.
+"""
+
+import heapq
+import itertools
+import random
+import threading
+import time
+
+from belltower import Bell, TOWER_BELLS
+from belltower.ringing_room import SocketIOClientError
+
+
+class FakeTower:
+    """ An in-process fake of a Ringing Room tower, with the interface of `RingingRoomTower`. """
+
+    def __init__(self, tower_id=123456789, tower_name="Fake Tower", size=8,
+                 bell_type=TOWER_BELLS, users=None, latency=0.0, jitter=0.0, drop_rate=0.0,
+                 seed=None, assignments=None):
+        self.tower_id = tower_id
+        self._tower_name = tower_name
+
+        # How long (in seconds) the server takes to echo each command, plus up to `jitter` seconds
+        # of random extra delay, and the probability that an echo never arrives
+        self.latency = latency
+        self.jitter = jitter
+        self.drop_rate = drop_rate
+        self._random = random.Random(seed)
+
+        # A list of (timestamp, command name, args) for every command sent to the tower
+        self.calls = []
+        # A list of (timestamp, handler name, args) for every echo delivered back to the client
+        self.echoes = []
+
+        # ===== SERVER STATE =====
+        self.server_size = size
+        self.server_bell_type = bell_type
+        # Maps Bells to the IDs of the users ringing them
+        self.server_assignments = {
+            Bell.from_index(b): u for b, u in (assignments or {}).items()
+        }
+        # The users who are really in the tower, which only differs from the client's while
+        # disconnected
+        self._server_users = dict(users or {})
+
+        # ===== CLIENT STATE (updated by echoes) =====
+        self._size = size
+        self._bell_type = bell_type
+        self._assigned_users = dict(self.server_assignments)
+        self._user_name_map = dict(users or {})
+
+        # ===== CALLBACK LISTS =====
+        self._invoke_on_user_enter = []
+        self._invoke_on_user_leave = []
+        self._invoke_on_assign = []
+        self._invoke_on_unassign = []
+        self._invoke_on_size_change = []
+        self._invoke_on_type_change = []
+        self._invoke_on_set_at_hand = []
+        self._invoke_on_disconnect = []
+        self._invoke_on_resync = []
+        # Whether or not the client is connected (commands fail while it isn't)
+        self.is_connected = True
+
+        # ===== EVENT DELIVERY =====
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        # A heap of (delivery time, sequence number, function) for the pending echoes
+        self._pending = []
+        self._sequence = itertools.count()
+        # Whether or not an echo is being delivered right now
+        self._is_delivering = False
+        self._is_running = False
+        self._thread = None
+
+    # ===== MISC =====
+
+    def wait_loaded(self):
+        pass
+
+    def user_name_from_id(self, user_id):
+        return self._user_name_map.get(user_id)
+
+    def get_assignment(self, bell):
+        return self._assigned_users.get(bell)
+
+    @property
+    def all_users(self):
+        return dict(self._user_name_map)
+
+    @property
+    def number_of_bells(self):
+        return self._size
+
+    @property
+    def bell_type(self):
+        return self._bell_type
+
+    @property
+    def tower_name(self):
+        return self._tower_name
+
+    def wait_idle(self, timeout=None):
+        """ Block until every pending echo has been delivered, returning `False` on timeout. """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            while self._pending or self._is_delivering:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._wakeup.wait(remaining)
+        return True
+
+    def reset_calls(self):
+        self.calls = []
+        self.echoes = []
+
+    # ===== CALLBACK DECORATORS =====
+
+    def on_user_enter(self, func):
+        self._invoke_on_user_enter.append(func)
+        return func
+
+    def on_user_leave(self, func):
+        self._invoke_on_user_leave.append(func)
+        return func
+
+    def on_assign(self, func):
+        self._invoke_on_assign.append(func)
+        return func
+
+    def on_unassign(self, func):
+        self._invoke_on_unassign.append(func)
+        return func
+
+    def on_size_change(self, func):
+        self._invoke_on_size_change.append(func)
+        return func
+
+    def on_bell_type_change(self, func):
+        self._invoke_on_type_change.append(func)
+        return func
+
+    def on_set_at_hand(self, func):
+        self._invoke_on_set_at_hand.append(func)
+        return func
+
+    def on_disconnect(self, func):
+        self._invoke_on_disconnect.append(func)
+        return func
+
+    def on_resync(self, func):
+        self._invoke_on_resync.append(func)
+        return func
+
+    # ===== ACTIONS =====
+
+    def set_at_hand(self):
+        self._record("set_at_hand")
+        self._echo(self._on_set_at_hand)
+
+    def set_size(self, number):
+        self._record("set_size", number)
+        self.server_size = number
+        self.server_assignments = {
+            b: u for b, u in self.server_assignments.items() if b.index < number
+        }
+        self._echo(self._on_size_change, number)
+
+    def set_bell_type(self, new_type):
+        self._record("set_bell_type", new_type)
+        self.server_bell_type = new_type
+        self._echo(self._on_audio_change, new_type)
+
+    def assign(self, user_id, bell):
+        if bell.number > self.number_of_bells:
+            raise ValueError(f"Bell {bell.number} exceeds tower size of {self.number_of_bells}")
+        if user_id is not None and self.user_name_from_id(user_id) is None:
+            raise ValueError(f"Assigning non-existent user #{user_id} to bell {bell.number}")
+        self._record("assign" if user_id is not None else "unassign", user_id, bell.index)
+        if user_id is None:
+            self.server_assignments.pop(bell, None)
+        else:
+            self.server_assignments[bell] = user_id
+        self._echo(self._on_assign_user, bell, user_id)
+
+    def unassign(self, bell):
+        self.assign(None, bell)
+
+    def unassign_all(self):
+        self._record("unassign_all")
+        for b in range(self.number_of_bells):
+            bell = Bell.from_index(b)
+            self.server_assignments.pop(bell, None)
+            self._echo(self._on_assign_user, bell, None)
+
+    # ===== SIMULATED SERVER EVENTS =====
+
+    def user_enter(self, user_id, user_name, delay=0.0):
+        """ Simulate a user entering the tower after `delay` seconds. """
+        self._schedule(delay, self._on_user_enter, user_id, user_name)
+
+    def user_leave(self, user_id, delay=0.0):
+        """ Simulate a user leaving the tower after `delay` seconds. """
+        user_name = self._user_name_map.get(user_id, "")
+        self._schedule(delay, self._on_user_leave, user_id, user_name)
+
+    def simulate(self, event, *args, delay=0.0):
+        """
+        Simulate the server sending an event after `delay` seconds.  Events are named after the
+        `on_*` callbacks (e.g. 'user_enter' or 'assign'), and take the same arguments except that
+        bells are 0-indexed `int`s.
+        """
+        if event == "user_enter":
+            self._schedule(delay, self._on_user_enter, *args)
+        elif event == "user_leave":
+            self._schedule(delay, self._on_user_leave, *args)
+        elif event == "assign":
+            user_id, bell = args
+            self._schedule(delay, self._on_assign_user, Bell.from_index(bell), user_id)
+        elif event == "unassign":
+            bell, = args
+            self._schedule(delay, self._on_assign_user, Bell.from_index(bell), None)
+        elif event == "size_change":
+            self._schedule(delay, self._on_size_change, *args)
+        elif event == "bell_type_change":
+            self._schedule(delay, self._on_audio_change, *args)
+        elif event == "set_at_hand":
+            self._schedule(delay, self._on_set_at_hand)
+        elif event == "disconnect":
+            self._schedule(delay, self._on_disconnect)
+        elif event == "resync":
+            # The arguments are the snapshot, as lists of [user_id, name] and [bell, user_id] pairs
+            users, assignments = args
+            self._schedule(delay, self._on_resync, dict(users), {
+                Bell.from_index(b): u for b, u in assignments
+            })
+        else:
+            raise ValueError(f"Unknown tower event '{event}'")
+
+    def drop_connection(self, outage=0.0, delay=0.0):
+        """
+        Simulate the connection dropping after `delay` seconds, and then being resynchronised with
+        the server's state `outage` seconds later.  Users who enter or leave during the outage are
+        only noticed by the resync.
+        """
+        self._schedule(delay, self._on_disconnect)
+        self._schedule(delay + outage, self._resync_from_server)
+
+    def presence_storm(self, user_ids, duration=0.0):
+        """
+        Simulate every user in `user_ids` leaving and then re-entering, spread evenly over
+        `duration` seconds (like a band reconnecting after a network blip).
+        """
+        users = [(u, self._user_name_map.get(u, f"User {u}")) for u in user_ids]
+        step = duration / max(1, 2 * len(users))
+        for i, (u, name) in enumerate(users):
+            self._schedule(step * i, self._on_user_leave, u, name)
+            self._schedule(step * (len(users) + i), self._on_user_enter, u, name)
+
+    # ===== CLIENT-SIDE HANDLERS (called on the delivery thread) =====
+
+    def _on_set_at_hand(self):
+        for c in self._invoke_on_set_at_hand:
+            c()
+
+    def _on_size_change(self, new_size):
+        if new_size != self._size:
+            self._size = new_size
+            self._assigned_users = {
+                b: u for b, u in self._assigned_users.items() if b.number <= new_size
+            }
+            for c in self._invoke_on_size_change:
+                c(new_size)
+
+    def _on_audio_change(self, new_type):
+        if new_type != self._bell_type:
+            self._bell_type = new_type
+            for c in self._invoke_on_type_change:
+                c(new_type)
+
+    def _on_assign_user(self, bell, user_id):
+        if user_id is None:
+            self._assigned_users.pop(bell, None)
+            for c in self._invoke_on_unassign:
+                c(bell)
+        else:
+            self._assigned_users[bell] = user_id
+            for c in self._invoke_on_assign:
+                c(user_id, self.user_name_from_id(user_id), bell)
+
+    def _on_disconnect(self):
+        self.is_connected = False
+        for c in self._invoke_on_disconnect:
+            c()
+
+    def _resync_from_server(self):
+        self._on_resync(self._server_users, dict(self.server_assignments))
+
+    def _on_resync(self, users, assignments):
+        self._user_name_map = dict(users)
+        self._server_users = dict(users)
+        self.server_assignments = dict(assignments)
+        self._assigned_users = dict(assignments)
+        self.is_connected = True
+        for c in self._invoke_on_resync:
+            c()
+
+    def _on_user_enter(self, user_id, user_name):
+        self._server_users[user_id] = user_name
+        if not self.is_connected:
+            return
+        self._user_name_map[user_id] = user_name
+        for c in self._invoke_on_user_enter:
+            c(user_id, user_name)
+
+    def _on_user_leave(self, user_id, user_name):
+        self._server_users.pop(user_id, None)
+        self.server_assignments = {
+            b: u for b, u in self.server_assignments.items() if u != user_id
+        }
+        if not self.is_connected:
+            return
+        self._user_name_map.pop(user_id, None)
+        self._assigned_users = {b: u for b, u in self._assigned_users.items() if u != user_id}
+        for c in self._invoke_on_user_leave:
+            c(user_id, user_name)
+
+    # ===== HELPER FUNCTIONS =====
+
+    def _record(self, name, *args):
+        if not self.is_connected:
+            raise SocketIOClientError("Not Connected")
+        self.calls.append((time.monotonic(), name, args))
+
+    def _echo(self, func, *args):
+        """ Schedule the server's echo of a command, unless it gets dropped. """
+        if self.drop_rate and self._random.random() < self.drop_rate:
+            return
+        delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0)
+        self._schedule(delay, func, *args)
+
+    def _schedule(self, delay, func, *args):
+        with self._lock:
+            if not self._is_running:
+                raise RuntimeError("FakeTower used outside of a 'with' block")
+            heapq.heappush(self._pending, (time.monotonic() + delay, next(self._sequence),
+                                           func, args))
+            self._wakeup.notify_all()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while self._is_running and (
+                    not self._pending or self._pending[0][0] > time.monotonic()
+                ):
+                    timeout = self._pending[0][0] - time.monotonic() if self._pending else None
+                    self._wakeup.wait(timeout)
+                if not self._is_running:
+                    return
+                _due, _seq, func, args = heapq.heappop(self._pending)
+                self._is_delivering = True
+            try:
+                func(*args)
+                self.echoes.append((time.monotonic(), func.__name__, args))
+            finally:
+                with self._lock:
+                    self._is_delivering = False
+                    self._wakeup.notify_all()
+
+    # ===== ENTER/EXIT FOR 'WITH' BLOCKS =====
+
+    def __enter__(self):
+        with self._lock:
+            self._is_running = True
+        self._thread = threading.Thread(target=self._run, name="FakeTower", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        with self._lock:
+            self._is_running = False
+            self._wakeup.notify_all()
+        self._thread.join()
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Running a saved practice plan against a tower without any UI, e.g. from a machine with no display
+or from a script.  The plan can be a CSV/TSV file (see `plan_import`) or an autosave journal (see
+`practice_store`), and its ringers are matched by name to whoever is in the tower.  Touches are
+validated and loaded exactly as they are by the Matrix: through a `loader.LoadWorker`, which only
+sends the commands that the touch changes.  Tk is never imported.
+
+By default the runner waits for commands on stdin (Enter loads the next touch, a number loads that
+touch, and 'q' quits).  With `--all`, every touch from `--start` onwards is loaded back to back,
+which is useful for timing bulk loads.
+
+Example:
+    python headless.py 123456789 practice.csv --start 3
+    python headless.py 123456789 practice.csv --all --stats-output loads.csv
+"""
+
+import argparse
+import queue
+import sys
+import time
+
+import stats
+from loader import LoadJob, LoadWorker, bell_type_of
+from plan_import import PlanFormatError, import_plan, read_plan
+from practice import Practice, mask_to_names
+from practice_store import read_journal, restore
+
+""" How often (in seconds) to check for progress while waiting for a touch to load. """
+POLL_INTERVAL = 0.02
+
+
+def read_practice_file(practice, path):
+    """ Adds the touches of a saved plan (CSV/TSV or an autosave journal) to a practice. """
+    if path.lower().endswith(".jsonl"):
+        restore(practice, read_journal(path))
+        return
+    with open(path, newline="") as f:
+        _names, touches = read_plan(f.read())
+    _plans, missing_names = import_plan(practice, touches)
+    if missing_names:
+        print(f"These ringers aren't in the tower, so their bells were skipped: "
+              f"{', '.join(sorted(missing_names))}")
+
+
+class HeadlessRunner:
+    """
+    Loads the touches of a practice into a tower, keeping track of who is in the room.  The tower's
+    callbacks (which arrive on the socket-io thread) are queued and applied on the runner's thread
+    before every load, in one batch.
+    """
+
+    def __init__(self, tower):
+        self.tower = tower
+        self.practice = Practice()
+        self._presence_events = queue.Queue()
+
+        self.loader = LoadWorker(tower)
+        self.loader.start()
+        tower.on_user_enter(lambda user_id, name: self._presence_events.put((user_id, name, True)))
+        tower.on_user_leave(lambda user_id, name: self._presence_events.put((user_id, name, False)))
+        tower.on_resync(lambda: self._presence_events.put(None))
+
+        for user_id, name in tower.all_users.items():
+            self.practice.add_ringer(user_id, name)
+
+    def close(self):
+        self.loader.stop()
+
+    def next_index(self, start=0):
+        """ The index of the first touch from `start` which isn't done, or None. """
+        for i in range(start, len(self.practice.touches)):
+            if not self.practice.touches[i].is_done:
+                return i
+        return None
+
+    def load(self, index):
+        """ Load a touch (by 0-indexed position), returning `True` if it was fully loaded. """
+        self.update_presence()
+        plan = self.practice.touches[index]
+        label = f"#{index + 1}" + (f" '{plan.notes}'" if plan.notes else "")
+        if not plan.is_valid:
+            names = ", ".join(self.practice.ringers[r].name for r in sorted(plan.errors))
+            print(f"Not loading {label}: there are errors in the bells of {names}")
+            return False
+        if plan.bells_left:
+            print(f"Warning: {mask_to_names(plan.bells_left)} left in {label}")
+
+        result = []
+        job = LoadJob(
+            plan.id,
+            plan.size,
+            bell_type_of(plan.bell_mode),
+            plan.assignments(),
+            on_finish=lambda is_complete, error: result.append((is_complete, error)),
+        )
+        start = time.perf_counter()
+        self.loader.submit(job)
+        try:
+            while not result:
+                time.sleep(POLL_INTERVAL)
+                self.loader.process_events()
+        except KeyboardInterrupt:
+            job.cancel()
+            raise
+
+        is_complete, error = result[0]
+        if error is not None:
+            print(f"Loading {label} failed: {error}")
+        elif is_complete:
+            plan.is_done = True
+            print(f"Loaded {label} in {time.perf_counter() - start:.2f}s")
+        return is_complete
+
+    def update_presence(self):
+        """ Apply the users who have entered or left since the last load, in one batch. """
+        changed = set()
+        while True:
+            try:
+                event = self._presence_events.get_nowait()
+            except queue.Empty:
+                break
+            if event is None:
+                # The tower has reconnected, so take its users as they are now
+                users = self.tower.all_users
+                for user_id, ringer in self.practice.ringers.items():
+                    if ringer.is_in_room != (user_id in users):
+                        self.practice.set_in_room(user_id, user_id in users)
+                        changed.add(user_id)
+                for user_id, name in users.items():
+                    if user_id not in self.practice.ringers:
+                        changed.add(self._enter(user_id, name))
+                continue
+            user_id, name, is_entering = event
+            if is_entering:
+                changed.add(self._enter(user_id, name))
+            elif user_id in self.practice.ringers:
+                self.practice.set_in_room(user_id, False)
+                changed.add(user_id)
+        self.practice.update_presence(changed)
+
+    def _enter(self, user_id, name):
+        """
+        Mark a user as in the room (reattaching them to a ringer with the same name if there is
+        one), returning their ID.
+        """
+        if user_id not in self.practice.ringers:
+            ringer = self.practice.find_ringer(name)
+            if ringer is None or ringer.is_in_room:
+                self.practice.add_ringer(user_id, name)
+                return user_id
+            self.practice.rename_ringer(ringer.id, user_id)
+        self.practice.set_in_room(user_id, True)
+        return user_id
+
+
+def run_interactive(runner, start):
+    """ Load touches as they are asked for on stdin. """
+    index = start
+    num_touches = len(runner.practice.touches)
+    while True:
+        next_index = runner.next_index(index)
+        prompt = "all done" if next_index is None else f"Enter loads #{next_index + 1}"
+        try:
+            command = input(f"[{prompt}, a number loads that touch, q quits] ").strip()
+        except EOFError:
+            return
+        if command.lower() == "q":
+            return
+        if command == "":
+            if next_index is None:
+                continue
+            index = next_index
+        elif command.isdigit() and 1 <= int(command) <= num_touches:
+            index = int(command) - 1
+        else:
+            print(f"Touches are numbered 1 to {num_touches}")
+            continue
+        if runner.load(index):
+            index += 1
+
+
+def run_all(runner, start):
+    """ Load every touch from `start` onwards which isn't done, returning how many failed. """
+    num_failed = 0
+    index = runner.next_index(start)
+    while index is not None:
+        if not runner.load(index):
+            num_failed += 1
+        index = runner.next_index(index + 1)
+    return num_failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load a saved practice plan without any UI.")
+    parser.add_argument("tower_id", type=int, help="The 9-digit ID of the Ringing Room tower")
+    parser.add_argument("plan", help="A CSV/TSV practice plan, or an autosave journal (.jsonl)")
+    parser.add_argument("--start", type=int, default=1, help="The number of the first touch")
+    parser.add_argument("--all", action="store_true",
+                        help="Load every touch back to back, instead of waiting for commands")
+    parser.add_argument("--url", default="ringingroom.com", help="The Ringing Room server")
+    parser.add_argument(
+        "--stats-output",
+        help="File to write the timings to (as CSV if it ends in '.csv', otherwise JSON)"
+    )
+    args = parser.parse_args()
+
+    from tower_connection import open_tower
+
+    print("Connecting to tower...")
+    tower = open_tower(args.tower_id, args.url)
+    exit_code = 0
+    with tower:
+        tower.wait_loaded()
+        stats.mark_startup("connected")
+        print(f"Connected to '{tower.tower_name}' with {len(tower.all_users)} user(s)")
+
+        runner = HeadlessRunner(tower)
+        try:
+            read_practice_file(runner.practice, args.plan)
+        except (OSError, PlanFormatError) as e:
+            print(f"Couldn't read the practice plan: {e}")
+            runner.close()
+            return 1
+        num_touches = len(runner.practice.touches)
+        print(f"Read {num_touches} touch(es) from {args.plan}")
+        if not 1 <= args.start <= num_touches:
+            runner.close()
+            parser.error(f"--start must be between 1 and the number of touches ({num_touches})")
+
+        try:
+            if args.all:
+                exit_code = 1 if run_all(runner, args.start - 1) else 0
+            else:
+                run_interactive(runner, args.start - 1)
+        except KeyboardInterrupt:
+            print()
+        finally:
+            runner.close()
+
+    if args.stats_output is not None:
+        stats.dump(args.stats_output)
+        print(f"Wrote timings to {args.stats_output}")
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,385 @@
+"""
+A background worker which sends touches to Ringing Room.  Loading a touch is a stream of socket-io
+messages which have to wait for the server to process them, so it is run on its own thread to
+prevent the Tk mainloop from freezing while the bells are being assigned.
+
+Rather than sleeping for a fixed time between commands, every command waits for the server to
+echo it back on the tower socket.  Several commands are pipelined when the echoes come back
+quickly, and the timeouts adapt to the measured round-trip time.
+"""
+
+import logging
+import queue
+import threading
+import time
+
+import stats
+from practice import HAND, TOWER
+from planner import (ASSIGN, PACED_OPS, SET_BELL_TYPE, SET_SIZE, UNASSIGN, UNASSIGN_ALL,
+                     plan_tower_load)
+
+""" The most commands which can be waiting for their echo at once. """
+MAX_IN_FLIGHT = 4
+"""
+Round trips (in seconds) shorter than this count as 'fast', and let more commands be pipelined.
+"""
+FAST_RTT = 0.15
+""" The bounds (in seconds) on how long to wait for an echo before resending a command. """
+MIN_TIMEOUT = 0.3
+MAX_TIMEOUT = 3.0
+""" How many times a command is resent before the load is abandoned. """
+MAX_RETRIES = 2
+""" How often (in seconds) to check whether a job has been cancelled while waiting for echoes. """
+CANCEL_CHECK_INTERVAL = 0.05
+
+"""
+Operations which must be echoed before anything else is sent.  Until the new size is echoed, the
+tower won't let us assign the new bells, and `unassign_all` is a burst of commands in itself.
+"""
+BARRIER_OPS = {SET_SIZE, UNASSIGN_ALL}
+
+# The worker's diagnostics are logged rather than printed, so that they don't interleave with the
+# output of whatever is running the loads (e.g. `headless`)
+logger = logging.getLogger(__name__)
+
+
+class LoadError(Exception):
+    """ An error created when the server never echoes a command, even after retrying. """
+
+    def __init__(self, op):
+        super().__init__()
+        self._op = op
+
+    def __str__(self):
+        return f"Ringing Room didn't acknowledge {self._op} after {MAX_RETRIES} retries."
+
+
+class AckTracker:
+    """
+    Matches the server's echoes (which arrive on the socket-io thread) to the commands which are
+    waiting for them.  Echoes are identified by keys of the same form as planner operations.
+    """
+
+    def __init__(self, tower):
+        self._lock = threading.Lock()
+        # Maps keys to the Event of the command waiting for that echo
+        self._waiting = {}
+        # Incremented by every echo which changes the tower's state, so that plans made against an
+        # older state can be spotted
+        self.version = 0
+
+        tower.on_assign(self._on_assign)
+        tower.on_unassign(self._on_unassign)
+        tower.on_size_change(self._on_size_change)
+        tower.on_bell_type_change(self._on_bell_type_change)
+        tower.on_resync(self._on_resync)
+
+    def expect(self, key):
+        """ Returns an Event which will be set when the echo with a given key arrives. """
+        event = threading.Event()
+        with self._lock:
+            self._waiting[key] = event
+        return event
+
+    def forget(self, key):
+        with self._lock:
+            self._waiting.pop(key, None)
+
+    def _arrive(self, key):
+        with self._lock:
+            self.version += 1
+            event = self._waiting.pop(key, None)
+        if event is not None:
+            event.set()
+
+    def _on_assign(self, user_id, _user_name, bell):
+        self._arrive((ASSIGN, user_id, bell.index))
+
+    def _on_unassign(self, bell):
+        self._arrive((UNASSIGN, bell.index))
+
+    def _on_size_change(self, new_size):
+        self._arrive((SET_SIZE, new_size))
+
+    def _on_bell_type_change(self, new_type):
+        self._arrive((SET_BELL_TYPE, new_type))
+
+    def _on_resync(self):
+        # The whole state may have changed, but nothing that's waiting can be matched to it
+        with self._lock:
+            self.version += 1
+
+
+class Pacer:
+    """
+    Tracks the round-trip time of commands (in the same way as TCP), and uses it to decide how long
+    to wait for an echo and how many commands to pipeline.
+    """
+
+    def __init__(self):
+        self.smoothed_rtt = None
+        self._rtt_variance = 0
+        self._backoff = 1
+        # The number of commands which are allowed to wait for their echo at once
+        self.window = 1
+
+    @property
+    def timeout(self):
+        if self.smoothed_rtt is None:
+            timeout = MAX_TIMEOUT / 2
+        else:
+            timeout = self.smoothed_rtt + 4 * self._rtt_variance
+        return min(MAX_TIMEOUT, max(MIN_TIMEOUT, timeout) * self._backoff)
+
+    def on_ack(self, rtt):
+        if self.smoothed_rtt is None:
+            self.smoothed_rtt = rtt
+            self._rtt_variance = rtt / 2
+        else:
+            self._rtt_variance = 0.75 * self._rtt_variance + 0.25 * abs(self.smoothed_rtt - rtt)
+            self.smoothed_rtt = 0.875 * self.smoothed_rtt + 0.125 * rtt
+        self._backoff = 1
+        # Pipeline more commands while the server keeps up, and fewer when it starts to lag
+        if rtt < FAST_RTT:
+            self.window = min(MAX_IN_FLIGHT, self.window + 1)
+        else:
+            self.window = max(1, self.window - 1)
+
+    def on_timeout(self):
+        self._backoff *= 2
+        self.window = 1
+
+
+class _InFlight:
+    """ A command which has been sent, and is waiting for its echo. """
+
+    def __init__(self, op, key, event, is_paced):
+        self.op = op
+        self.key = key
+        self.event = event
+        self.is_paced = is_paced
+        self.sent_at = time.monotonic()
+        self.retries = 0
+
+
+class LoadJob:
+    """ A request to load a single touch into the tower. """
+
+    def __init__(self, touch_id, size, bell_type, assignments, on_progress=None, on_finish=None,
+                 plan=None, plan_version=None):
+        self.touch_id = touch_id
+        self.size = size
+        self.bell_type = bell_type
+        # Maps 0-indexed bells to the user ID who should ring them
+        self.assignments = assignments
+        # A plan which has already been made for this job, and the `LoadWorker.tower_version` that
+        # it was made against.  It is only used if the tower hasn't changed since.
+        self.plan = plan
+        self.plan_version = plan_version
+
+        # Callbacks, which are always called from the Tk thread (see `LoadWorker.process_events`)
+        self._on_progress = on_progress
+        self._on_finish = on_finish
+
+        self._cancelled = threading.Event()
+        # When the job was created, to measure how long the touch takes to be ready
+        self.created_at = time.perf_counter()
+
+    def cancel(self):
+        """ Request that this job stops as soon as possible (or never starts if it is queued). """
+        self._cancelled.set()
+
+    @property
+    def is_cancelled(self):
+        return self._cancelled.is_set()
+
+
+class LoadWorker:
+    """
+    A thread which owns all the outgoing assignment traffic to the tower.  Jobs are run strictly in
+    the order that they were submitted, and all the job callbacks are passed back to the Tk thread
+    through a queue which is drained by `process_events`.
+    """
+
+    def __init__(self, tower):
+        self._tower = tower
+
+        self._jobs = queue.Queue()
+        self._events = queue.Queue()
+
+        self._acks = AckTracker(tower)
+        self.pacer = Pacer()
+
+        self._thread = threading.Thread(target=self._run, name="LoadWorker", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        """ Stop the worker thread once the current job has finished. """
+        self._jobs.put(None)
+
+    def submit(self, job):
+        """ Add a job to the back of the queue. """
+        self._jobs.put(job)
+
+    @property
+    def tower_version(self):
+        """ A number which changes whenever the tower's state is changed by an echo. """
+        return self._acks.version
+
+    def plan(self, size, bell_type, assignments):
+        """
+        Plans a load against the tower's current state, returning the plan and the tower version
+        that it was made against (so that it can be prefetched and passed to a `LoadJob`).
+        """
+        # Read the version first, so that a change during planning makes the plan look stale
+        version = self.tower_version
+        return (plan_tower_load(self._tower, size, bell_type, assignments), version)
+
+    def process_events(self):
+        """ Run the callbacks of any progress that's been made.  Must be called on the Tk thread. """
+        while True:
+            try:
+                callback, args = self._events.get_nowait()
+            except queue.Empty:
+                return
+            callback(*args)
+
+    def _notify(self, callback, *args):
+        if callback is not None:
+            self._events.put((callback, args))
+
+    def _run(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                return
+            if job.is_cancelled:
+                self._notify(job._on_finish, False, None)
+                continue
+
+            try:
+                is_complete = self._load(job)
+                error = None
+                if is_complete:
+                    stats.record("load_to_ready", time.perf_counter() - job.created_at)
+            except Exception as e:
+                is_complete = False
+                error = e
+            self._notify(job._on_finish, is_complete, error)
+
+    def _load(self, job):
+        """ Sends one touch to the tower, returning `False` if the load was cancelled. """
+        # Use the prefetched plan if nothing has changed since it was made.  Otherwise, plan against
+        # the tower's state as it is now, since previous jobs will have changed it
+        if job.plan is not None and job.plan_version == self.tower_version:
+            plan = job.plan
+        else:
+            plan, _version = self.plan(job.size, job.bell_type, job.assignments)
+        logger.info(f"Loading touch {job.touch_id} with {plan.num_paced_ops} assignment(s)"
+                    + (" after unassigning all" if plan.is_full_reset else ""))
+
+        self._num_paced_ops = plan.num_paced_ops
+        self._paced_ops_done = 0
+        self._notify(job._on_progress, self._paced_ops_done, self._num_paced_ops)
+
+        in_flight = []
+        try:
+            for op in plan:
+                # Barriers wait for everything before them, everything else waits for a space in
+                # the pipeline
+                max_in_flight = 0 if op[0] in BARRIER_OPS else self.pacer.window - 1
+                if not self._wait_for_acks(job, in_flight, max_in_flight):
+                    return False
+                in_flight.extend(self._send(op))
+                if op[0] in BARRIER_OPS and not self._wait_for_acks(job, in_flight, 0):
+                    return False
+            return self._wait_for_acks(job, in_flight, 0)
+        finally:
+            for entry in in_flight:
+                self._acks.forget(entry.key)
+
+    def _send(self, op):
+        """ Sends an operation to the tower, returning the `_InFlight`s waiting for its echoes. """
+        kind = op[0]
+        if kind == UNASSIGN_ALL:
+            # This is echoed as an unassignment of every bell.  The plan doesn't count those as
+            # paced operations, so neither does the progress
+            keys = [(UNASSIGN, b) for b in range(self._tower.number_of_bells)]
+            retry_ops = keys
+        elif kind in PACED_OPS or kind in (SET_SIZE, SET_BELL_TYPE):
+            keys = [op]
+            retry_ops = [op]
+        else:
+            # Anything else doesn't have an echo we can wait for
+            apply_op(self._tower, op)
+            return []
+
+        entries = [
+            _InFlight(retry_op, key, self._acks.expect(key), kind in PACED_OPS)
+            for key, retry_op in zip(keys, retry_ops)
+        ]
+        apply_op(self._tower, op)
+        return entries
+
+    def _wait_for_acks(self, job, in_flight, max_in_flight):
+        """
+        Wait until at most `max_in_flight` commands are waiting for their echoes, resending any
+        which time out.  Returns `False` if the job gets cancelled.
+        """
+        while len(in_flight) > max(0, max_in_flight):
+            if job.is_cancelled:
+                return False
+            oldest = in_flight[0]
+            remaining = oldest.sent_at + self.pacer.timeout - time.monotonic()
+            oldest.event.wait(max(0, min(remaining, CANCEL_CHECK_INTERVAL)))
+
+            # Echoes can arrive in any order, so check all of them
+            now = time.monotonic()
+            for entry in [e for e in in_flight if e.event.is_set()]:
+                in_flight.remove(entry)
+                # The round trip of a resent command is ambiguous, so don't measure it
+                if entry.retries == 0:
+                    self.pacer.on_ack(now - entry.sent_at)
+                    stats.record(f"rtt_{entry.op[0]}", now - entry.sent_at)
+                if entry.is_paced:
+                    self._paced_ops_done += 1
+                    self._notify(job._on_progress, self._paced_ops_done, self._num_paced_ops)
+
+            if not oldest.event.is_set() and now >= oldest.sent_at + self.pacer.timeout:
+                # The echo (or the command) has been lost, so try again
+                if oldest.retries >= MAX_RETRIES:
+                    raise LoadError(oldest.op)
+                self.pacer.on_timeout()
+                oldest.retries += 1
+                oldest.event = self._acks.expect(oldest.key)
+                oldest.sent_at = now
+                apply_op(self._tower, oldest.op)
+        return True
+
+
+def bell_type_of(bell_mode):
+    """ Converts a `practice` bell mode into the BellType that Ringing Room uses. """
+    from belltower import HAND_BELLS, TOWER_BELLS
+
+    if bell_mode == TOWER:
+        return TOWER_BELLS
+    assert bell_mode == HAND
+    return HAND_BELLS
+
+
+def apply_op(tower, op):
+    """ Sends a single operation from a `planner.Plan` to the tower. """
+    # belltower imports the networking stack, so isn't imported until the program is connected
+    from belltower import Bell
+
+    kind, *args = op
+    if kind == ASSIGN:
+        user_id, bell = args
+        tower.assign(user_id, Bell.from_index(bell))
+    elif kind == UNASSIGN:
+        bell, = args
+        tower.unassign(Bell.from_index(bell))
+    else:
+        getattr(tower, kind)(*args)
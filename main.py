@@ -1,29 +1,65 @@
 #!/usr/bin/env python3
 
+# Imported first, so that startup times are measured from here and (when run as a program) every
+# other import is timed.  `belltower` isn't imported here, since it pulls in the whole networking
+# stack - instead it's imported in the background while the tower chooser is open (see
+# `tower_lookup`).
+import stats
+_import_timer = stats.ImportTimer()
+if __name__ == "__main__":
+    _import_timer.start()
+
+import argparse
+import logging
+import os
 import tkinter as tk
-from belltower import *
+import tkinter.filedialog
+import tkinter.font as tkfont
+import tkinter.messagebox
+import tkinter.ttk as ttk
+from allocation import Preferences, suggest
 from tower_chooser import choose_tower
-import time
+from tower_events import EventBus
+from loader import LoadJob, LoadWorker, bell_type_of
+from plan_import import PlanFormatError, import_plan, read_plan
+from practice_store import Journal, autosave_path, read_autosave, restore, touch_record
+from practice import Practice, BELL_MODES, HAND, SIZES, TOWER, mask_to_names
 
 FONT_NAME = "TkDefaultFont"
 FONT_SIZE = 12
 
 FONT = (FONT_NAME, FONT_SIZE)
 TITLE_FONT = (FONT_NAME, int(FONT_SIZE * 1.5), "bold")
-
-MAX_ROWS = 100
-MAX_COLS = 100
+HEADING_FONT = (FONT_NAME, FONT_SIZE, "bold")
 
 COL_ERROR = "#e3867d"
 COL_FG = "#000000"
 COL_BG = "#ffffff"
 COL_FADE = "#777777"
 COL_DONE = "#7de39c"
-
-BELL_NAMES = "1234567890ETABCD"
-
-
-ASSIGN_DELAY = 0.2
+COL_GRID = "#aaaaaa"
+COL_BUTTON = "#dddddd"
+COL_PANEL = "#f0f0f0"
+COL_SUGGEST = "#9cc3e6"
+
+# How often (in milliseconds) the Tk thread checks for progress from the load worker
+LOADER_POLL_INTERVAL = 50
+"""
+The options in the menu of what a ringer will ring, as (label, bell modes) pairs, and the marks
+shown after the names of ringers who don't ring everything.
+"""
+RINGER_MODE_OPTIONS = [
+    ("Rings tower and handbells", [TOWER, HAND]),
+    ("Rings tower bells only", [TOWER]),
+    ("Rings handbells only", [HAND]),
+    ("Sitting out", []),
+]
+RINGER_MODE_MARKS = {(TOWER,): " (T)", (HAND,): " (H)", (): " (out)"}
+""" How long (in ms) to collect changes for before they are written to the autosave. """
+AUTOSAVE_DELAY = 500
+
+# Diagnostics are logged (like the load worker's) rather than printed, and shown by `main`
+logger = logging.getLogger(__name__)
 
 
 class WrappingLabel(tk.Label):
@@ -34,349 +70,794 @@ class WrappingLabel(tk.Label):
         self.bind('<Configure>', lambda e: self.config(wraplength=self.winfo_reqwidth()))
 
 
-def bell_name_from_num(num):
-    """ Gets the bell name from a given 0-indexed number. """
-    return BELL_NAMES[num]
+class Touch:
+    """
+    A view of a single touch in the practice.  A Touch owns no widgets of its own - it is drawn as
+    one row of the Matrix's TouchTable, which is told whenever the touch's contents change.  All
+    the contents and validation live in the underlying `practice.TouchPlan`.
+    """
 
+    def __init__(self, matrix, index, plan):
+        self._matrix = matrix
+        self._index = index
+        self._plan = plan
 
-def bell_num_from_name(name):
-    """ Gets the bell name from a given 0-indexed number. """
-    assert len(name) == 1
-    if name.upper() in BELL_NAMES:
-        return BELL_NAMES.index(name.upper())
-    else:
-        return None
+        # The LoadJob of this touch, if it is currently queued or being loaded
+        self._load_job = None
+        self._load_text = "Load"
+        # Set when this touch was in the tower, but couldn't be re-applied after reconnecting
+        self._is_stale = False
 
+    # ===== PROPERTIES USED TO DRAW THE TOUCH =====
 
-class VLabel:
-    """ A utility class that creates a label where the text goes upwards. """
+    @property
+    def plan(self):
+        return self._plan
 
-    def __init__(self, parent, text, enabledness=True):
-        self._parent = parent
-        self._text = text
+    @property
+    def id(self):
+        return self._plan.id
 
-        # Create a canvas and a text element for the label
-        self._canvas = tk.Canvas(self._parent, width=FONT_SIZE * 1.1, height=100)
-        self._text_elem = self._canvas.create_text(
-            0, 0,
-            font=FONT,
-            text=self._text,
-            angle=90,
-        )
+    @property
+    def index(self):
+        return self._index
 
-        # Find out the size of the text, and make sure that the canvas encompasses the entire text
-        # (therefore, layouting will do what we expect)
-        x1, y1, x2, y2 = self._canvas.bbox(self._text_elem)
-        self._canvas.move(self._text_elem, -x1, -y1)
-        self._canvas.config(width=x2 - x1, height=y2 - y1)
+    @property
+    def size(self):
+        return self._plan.size
 
-        # Forward layout methods to the canvas widget
-        self.pack = self._canvas.pack
-        self.grid = self._canvas.grid
+    @property
+    def bell_mode(self):
+        return self._plan.bell_mode
 
-        # Set the enabledness
-        self.set_enabledness(enabledness)
+    @property
+    def is_done(self):
+        return self._plan.is_done
 
-    def set_enabledness(self, enabledness: bool):
-        self._canvas.itemconfig(
-            self._text_elem,
-            fill=COL_FG if enabledness else COL_FADE
-        )
+    @property
+    def notes(self):
+        return self._plan.notes
 
+    @property
+    def load_text(self):
+        """ The text on the load button, which shows the progress of any load. """
+        return self._load_text
 
-class User:
-    """ A single user in the practice. """
+    @property
+    def can_load(self):
+        # A touch which is being loaded can always be cancelled
+        return self._plan.is_valid or self._load_job is not None
 
-    """
-    The number of rows used up by the user name.  Used to put the touch in the right places on the
-    screen.
-    """
-    ROWS = 2
+    @property
+    def is_loading(self):
+        """ Whether or not this touch is queued or being loaded. """
+        return self._load_job is not None
 
-    def __init__(self, parent, user_id, name):
-        self._parent = parent
-        self._user_id = user_id
-        self._name = name
+    @property
+    def is_stale(self):
+        """ Whether the tower may no longer match this touch, since it couldn't be re-applied. """
+        return self._is_stale
 
-        self._in_room = True
+    @property
+    def bell_type(self):
+        """ The bell mode of this touch, as a BellType value. """
+        return bell_type_of(self._plan.bell_mode)
 
-        self._vlabel = VLabel(self._parent, self._name)
+    @property
+    def bells_left_text(self):
+        bells_left = self._plan.bells_left
+        return mask_to_names(bells_left) + " left" if bells_left else ""
+
+    def cell_text(self, user_id):
+        return self._plan.text(user_id)
+
+    def cell_has_error(self, user_id):
+        return user_id in self._plan.errors
+
+    # ===== EDITING =====
+
+    def set_size(self, size):
+        if size != self._plan.size:
+            with stats.timed("touch_update"):
+                self._plan.set_size(size)
+                self.on_change()
+
+    def set_bell_mode(self, bell_mode):
+        if bell_mode != self._plan.bell_mode:
+            self._plan.bell_mode = bell_mode
+            self.on_change()
+
+    def set_done(self, is_done):
+        if is_done != self._plan.is_done:
+            self._plan.is_done = is_done
+            self.on_change()
+
+    def set_notes(self, notes):
+        if notes != self._plan.notes:
+            self._plan.notes = notes
+            self.on_change(affects_bells=False)
+
+    def set_cell(self, user_id, text):
+        if text != self._plan.text(user_id):
+            with stats.timed("touch_update"):
+                self._plan.set_text(user_id, text)
+                # The text of the cell has changed, so it always has to be redrawn
+                self.on_change()
 
-        # Forward layout methods to the canvas widget
-        self.pack = self._vlabel.pack
-        self.grid = self._vlabel.grid
+    def set_index(self, new_index):
+        self._index = new_index
 
-    @property
-    def is_in_room(self):
-        return self._in_room
+    def redraw(self):
+        self._matrix.table.redraw_touch(self)
 
-    @property
-    def name(self):
-        """ The name of this user. """
-        return self._name
+    def on_change(self, affects_bells=True):
+        """ Called whenever the contents of the touch change. """
+        self.redraw()
+        self._matrix.on_touch_change(self, affects_bells)
 
-    def set_in_room(self, is_in_room):
-        self._in_room = is_in_room
-        self._vlabel.set_enabledness(is_in_room)
+    def suggested_text(self, user_id):
+        """ The text which the Matrix's suggestion would put in a cell, or None. """
+        return self._matrix.suggested_text(self.id, user_id)
 
+    # ===== LOADING =====
 
-class Touch:
-    """ A single touch in the practice. """
+    def load(self, plan=None, plan_version=None):
+        """
+        Queue this touch to be loaded into Ringing Room, optionally using a plan which has already
+        been made (see `LoadWorker.plan`).
+        """
+        # Clicking the button of a touch which is queued or loading cancels that load
+        if self._load_job is not None:
+            logger.info(f"Cancelling load of #{self._index + 1}")
+            self._load_job.cancel()
+            return
+        # Never send a touch with errors to the tower
+        if not self._plan.is_valid:
+            logger.warning(f"Not loading #{self._index + 1}, since it has errors")
+            return
+
+        logger.info(f"Loading #{self._index + 1}: '{self._plan.notes}'")
+        # Queue the update to Ringing Room
+        self._load_job = LoadJob(
+            self._plan.id,
+            self._plan.size,
+            self.bell_type,
+            self._plan.assignments(),
+            on_progress=self._on_load_progress,
+            on_finish=self._on_load_finish,
+            plan=plan,
+            plan_version=plan_version,
+        )
+        self._load_text = "Queued"
+        self._is_stale = False
+        self.on_change(affects_bells=False)
+        self._matrix.loader.submit(self._load_job)
+
+    def mark_stale(self):
+        """ Show that this touch is no longer fully in the tower. """
+        self._is_stale = True
+        self._load_text = "Stale"
+        self.redraw()
+
+    def _on_load_progress(self, bells_done, num_bells):
+        self._load_text = f"{bells_done}/{num_bells}"
+        self.redraw()
+
+    def _on_load_finish(self, is_complete, error):
+        self._load_job = None
+        self._load_text = "Load"
+        if error is not None:
+            logger.warning(f"Loading #{self._index + 1} failed: {error}")
+        # If we load a touch, then automatically flag it as done
+        if is_complete:
+            self._plan.is_done = True
+        # A touch which failed (e.g. because the connection dropped) may be partly in the tower
+        if is_complete or error is not None:
+            self._matrix.current_touch = self
+        self.on_change(affects_bells=False)
 
-    """
-    The number of columns used up by the touch input.  Used to put the user columns in the right
-    places on the screen.
-    """
-    COLS = 7
-    # Leave one column free for the move-touch arrows
-    LEFT_MARGIN = 1
 
+class TouchTable:
     """
-    The possible sizes that a RR tower can have.  We need these as strings so that they can be fed
-    into a tkinter OptionMenu.
+    A virtualized view of the matrix, with touches as rows and users as columns.  Only the rows and
+    columns which are visible are drawn (onto a single canvas), and all the editing is done by a
+    small pool of editor widgets which are moved over whichever cell is being edited.  Scrolling is
+    done in whole rows and columns.
     """
-    SIZES = [str(x) for x in [4, 5, 6, 8, 10, 12, 14, 16]]
 
-    """ The possible modes that Ringing Room can be in (towerbells or handbells) """
-    TOWER = "Tower"
-    HAND = "Hand"
-    BELL_MODES = [TOWER, HAND]
+    """ The padding (in pixels) around the contents of every cell. """
+    CELL_PAD = 3
+    """ The number of user columns reserved for the 'bells left' readout. """
+    BELLS_LEFT_COLS = 6
 
-    def __init__(self, matrix, parent, index, _id, touch_to_clone):
+    def __init__(self, parent, matrix):
         self._parent = parent
         self._matrix = matrix
-        self._index = index
-        self._id = _id
 
-        # The cells of the document
-        self._cells = {}
-        self._cell_vars = {}
+        self._frame = tk.Frame(self._parent)
+        # Forward layout methods to the frame
+        self.pack = self._frame.pack
+        self.grid = self._frame.grid
+
+        # ===== GEOMETRY =====
+
+        self._font = tkfont.Font(root=self._parent, font=FONT)
+        self._heading_font = tkfont.Font(root=self._parent, font=HEADING_FONT)
+        self._row_height = self._font.metrics("linespace") + 2 * self.CELL_PAD
+        # User cells are wide enough for two bell names
+        self._cell_width = max(self._font.measure("MM") + 2 * self.CELL_PAD, self._row_height)
+        self._char_width = self._font.measure("0")
+
+        # The fixed columns on the left of the table, as (key, heading, width) triples
+        def width(text, font=self._font):
+            return font.measure(text) + 4 * self.CELL_PAD
+        self._fixed_columns = [
+            ("swap", "", width("^")),
+            ("number", "", width("000")),
+            ("size", "Bells", max(width("16 ▾"), width("Bells", self._heading_font))),
+            ("mode", "Mode", width("Tower ▾")),
+            ("load", "", width("Queued")),
+            ("done", "Done", width("Done", self._heading_font)),
+            ("notes", "Touch notes", self._char_width * 20),
+        ]
+        # Maps the keys of the fixed columns to their (x1, x2) coordinates
+        self._fixed_x = {}
+        x = 0
+        for key, _heading, w in self._fixed_columns:
+            self._fixed_x[key] = (x, x + w)
+            x += w
+        self._fixed_width = x + self.CELL_PAD
+
+        # The cached widths of the names of the current users, used to size the header
+        self._name_widths = {}
+        self._header_height = 2 * self._row_height
+
+        # ===== WIDGETS =====
+
+        self._canvas = tk.Canvas(self._frame, highlightthickness=0, background=COL_PANEL)
+        self._xscroll = tk.Scrollbar(self._frame, orient=tk.HORIZONTAL, command=self._on_xscroll)
+        self._yscroll = tk.Scrollbar(self._frame, orient=tk.VERTICAL, command=self._on_yscroll)
+        self._canvas.grid(row=0, column=0, sticky="NESW")
+        self._yscroll.grid(row=0, column=1, sticky="NS")
+        self._xscroll.grid(row=1, column=0, sticky="EW")
+        self._frame.rowconfigure(0, weight=1)
+        self._frame.columnconfigure(0, weight=1)
+
+        # ===== VIEW STATE =====
+
+        # The scroll position, as the first visible touch index and user column
+        self._first_row = 0
+        self._first_col = 0
+        self._width = 1
+        self._height = 1
+        self._requested_size = None
+        # The user IDs of the columns, in order
+        self._user_ids = []
+
+        # Redraws are coalesced, and only happen once Tk is idle
+        self._needs_full_redraw = False
+        self._dirty_touches = set()
+        self._is_redraw_scheduled = False
+
+        # ===== EDITOR POOL =====
+
+        self._editor_var = tk.StringVar(self._canvas, value="")
+        self._editor_var.trace_add("write", self._on_editor_change)
+        self._editors = {
+            "cell": tk.Entry(self._canvas, textvariable=self._editor_var, font=FONT,
+                             justify=tk.CENTER, relief=tk.FLAT),
+            "notes": tk.Entry(self._canvas, textvariable=self._editor_var, font=FONT,
+                              relief=tk.FLAT),
+        }
+        # The (kind, touch, user_id) of the cell being edited, or None
+        self._editing = None
+        # Set while the editor is being pointed at a new cell, so that it doesn't write back
+        self._is_loading_editor = False
+
+        # Popup menus replace per-touch OptionMenus, and act on `_menu_touch`
+        self._menu_touch = None
+        self._size_menu = tk.Menu(self._canvas, tearoff=0)
+        for s in SIZES:
+            self._size_menu.add_command(label=str(s), command=lambda s=s: self._menu_touch.set_size(s))
+        self._mode_menu = tk.Menu(self._canvas, tearoff=0)
+        for m in BELL_MODES:
+            self._mode_menu.add_command(label=m, command=lambda m=m: self._menu_touch.set_bell_mode(m))
+        # The menu of what a ringer will ring, which acts on `_menu_user_id`
+        self._menu_user_id = None
+        self._ringer_modes_var = tk.StringVar(self._canvas, value="")
+        self._ringer_menu = tk.Menu(self._canvas, tearoff=0)
+        for label, modes in RINGER_MODE_OPTIONS:
+            self._ringer_menu.add_radiobutton(
+                label=label,
+                value=label,
+                variable=self._ringer_modes_var,
+                command=lambda modes=modes: self._matrix.set_ringer_modes(self._menu_user_id, modes)
+            )
+
+        # ===== BINDINGS =====
+
+        self._canvas.bind("<Configure>", self._on_configure)
+        self._canvas.bind("<Button-1>", self._on_click)
+        self._canvas.bind("<MouseWheel>", self._on_mouse_wheel)
+        self._canvas.bind("<Shift-MouseWheel>", self._on_mouse_wheel)
+        self._canvas.bind("<Button-4>", self._on_mouse_wheel)
+        self._canvas.bind("<Button-5>", self._on_mouse_wheel)
+        self._canvas.bind("<Shift-Button-4>", self._on_mouse_wheel)
+        self._canvas.bind("<Shift-Button-5>", self._on_mouse_wheel)
+
+        cell_editor = self._editors["cell"]
+        cell_editor.bind("<Tab>", lambda e: self._move_editor(0, 1))
+        cell_editor.bind("<Shift-Tab>", lambda e: self._move_editor(0, -1))
+        cell_editor.bind("<ISO_Left_Tab>", lambda e: self._move_editor(0, -1))
+        cell_editor.bind("<Right>", lambda e: self._move_editor(0, 1))
+        cell_editor.bind("<Left>", lambda e: self._move_editor(0, -1))
+        for editor in self._editors.values():
+            editor.bind("<Return>", lambda e: self._move_editor(1, 0))
+            editor.bind("<Down>", lambda e: self._move_editor(1, 0))
+            editor.bind("<Up>", lambda e: self._move_editor(-1, 0))
+            editor.bind("<Escape>", lambda e: self._stop_editing())
+            # Stop Ctrl+Enter from counting as Enter, so it reaches the window's 'load next' binding
+            editor.bind("<Control-Return>", lambda e: None)
+
+    # ===== REDRAW REQUESTS =====
+
+    def redraw(self):
+        """ Redraw everything which is visible, once Tk is idle. """
+        self._needs_full_redraw = True
+        self._schedule_redraw()
+
+    def redraw_touch(self, touch):
+        """ Redraw the row of a single touch (if it's visible), once Tk is idle. """
+        self._dirty_touches.add(touch)
+        self._schedule_redraw()
+
+    def rename_user(self, old_id, new_id):
+        """ Redraw after a user's ID has changed, keeping the editor on their cell. """
+        if self._editing is not None and self._editing[2] == old_id:
+            kind, touch, _user_id = self._editing
+            self._editing = (kind, touch, new_id)
+        self.redraw()
+
+    def forget(self, touches=(), user_ids=()):
+        """ Stop showing touches or users which have been removed, and redraw what's left. """
+        touches = set(touches)
+        if self._editing is not None:
+            _kind, touch, user_id = self._editing
+            if touch in touches or user_id in user_ids:
+                self._stop_editing()
+        self._dirty_touches -= touches
+        self.redraw()
+
+    def see(self, index):
+        """ Scroll so that the touch with a given index is visible. """
+        num_rows = self._num_visible_rows
+        if index < self._first_row:
+            self._first_row = index
+        elif index >= self._first_row + num_rows:
+            self._first_row = index - num_rows + 1
+        self.redraw()
+
+    def _schedule_redraw(self):
+        if not self._is_redraw_scheduled:
+            self._is_redraw_scheduled = True
+            self._canvas.after_idle(self._flush_redraws)
+
+    def _flush_redraws(self):
+        self._is_redraw_scheduled = False
+        if self._needs_full_redraw:
+            self._draw_all()
+        else:
+            for t in self._dirty_touches:
+                self._draw_touch(t)
+        self._needs_full_redraw = False
+        self._dirty_touches = set()
 
-        # ===== LHS ELEMENTS =====
+    # ===== GEOMETRY =====
 
-        # A label for the number of the touch
-        self._number = tk.Label(self._parent, text=str(self._index + 1))
-        # A dropdown for the size of the tower
-        self._size_var = tk.StringVar(
-            self._parent,
-            name=f"SizeVar {self._index + 1}",
-            value="8" if touch_to_clone is None else touch_to_clone._size_var.get()
+    @property
+    def _num_visible_rows(self):
+        return max(1, (self._height - self._header_height) // self._row_height)
+
+    @property
+    def _num_visible_cols(self):
+        return max(1, (self._width - self._fixed_width) // self._cell_width)
+
+    @property
+    def _num_cols(self):
+        """ The number of scrollable columns, including the space for the bells left readout. """
+        return len(self._user_ids) + self.BELLS_LEFT_COLS
+
+    def _update_geometry(self):
+        """ Recalculate the size of the header, then clamp the scroll position and scrollbars. """
+        self._user_ids = list(self._matrix.users)
+        # Only keep the widths of the labels being shown, so that removed users are forgotten
+        name_widths = {}
+        for u in self._user_ids:
+            label = self._matrix.ringer_label(u)
+            width = self._name_widths.get(label)
+            name_widths[label] = self._font.measure(label) if width is None else width
+        self._name_widths = name_widths
+        self._header_height = max(
+            [2 * self._row_height] + [w + 2 * self.CELL_PAD for w in self._name_widths.values()]
         )
-        self._size_var.trace("w", self.update)
-        self._size_menu = tk.OptionMenu(self._parent, self._size_var, *self.SIZES)
-        # A switch between towerbells and handbells
-        self._bellmode_var = tk.StringVar(
-            self._parent,
-            value=self.TOWER if touch_to_clone is None else touch_to_clone._bellmode_var.get()
+
+        # Ask for enough space to show everything, within the limits of the screen
+        num_touches = len(self._matrix.touches)
+        req_width = min(
+            self._fixed_width + self._num_cols * self._cell_width,
+            int(self._canvas.winfo_screenwidth() * 0.9)
         )
-        self._bellmode_var.trace("w", self.update)
-        self._bellmode_menu = tk.OptionMenu(self._parent, self._bellmode_var, *self.BELL_MODES)
-        # A toggle for touches which have been rung
-        self._done_var = tk.IntVar(self._parent, value=0)
-        self._done_var.trace("w", self._update_doneness)
-        self._done_toggle = tk.Checkbutton(self._parent, variable=self._done_var)
-        # A button to load this touch into the room
-        self._load_button = tk.Button(self._parent, text="Load", command=self._on_load)
-        # An otherwise-useless textbox for the user to put the touch names
-        self._name_box = tk.Entry(self._parent)
-
-        # ===== RHS ELEMENTS =====
-
-        self._bells_left = tk.Label(self._parent, text="<bells left label>")
-
-        # Layout all the LHS elements
-        self._pack_elems()
-
-        # Explicitly call an update to make sure that the display is initialised properly
-        self.update()
-
-    def _pack_elems(self):
-        self._number.grid       (row=self._row, column=self.LEFT_MARGIN + 0, padx=4)
-        self._size_menu.grid    (row=self._row, column=self.LEFT_MARGIN + 1)
-        self._bellmode_menu.grid(row=self._row, column=self.LEFT_MARGIN + 2)
-        self._load_button.grid  (row=self._row, column=self.LEFT_MARGIN + 3)
-        self._done_toggle.grid  (row=self._row, column=self.LEFT_MARGIN + 4)
-        self._name_box.grid     (row=self._row, column=self.LEFT_MARGIN + 5, padx=20)
-        for _u_id, (i, c) in self._cells.items():
-            c.grid(row=self._row, column=self.COLS + i)
-        self._bells_left.grid(row=self._row, column=MAX_COLS, sticky="w", padx=(10, 4))
-
-    def add_user(self, user_id, user):
-        """ Adds a user to this touch as a new column. """
-        cell_var = tk.StringVar(self._parent, value="")
-        cell_var.trace_add("write", self.update)
-
-        cell = tk.Entry(self._parent, width=2, textvariable=cell_var)
-        cell.grid(row=self._row, column=self.COLS + len(self._cells))
-
-        self._cell_vars[user_id] = cell_var
-        self._cells[user_id] = (len(self._cells), cell)
-
-    def _assignments_and_errors(self):
-        """
-        Returns a tuple of:
-        - A mapping between bells and user IDs
-        - A set of which user IDs have errors in their cells.
-        """
-        size = int(self._size_var.get())
-
-        # The set of cells which contain errors.  These cells will be highlighted red
-        cells_with_errors = set()
-
-        # Figure out which bells are assigned to whom
-        # assigned_users maps 0-indexed **bells** to **user_ids*
-        assigned_users = {}
-        for user_id, v in self._cell_vars.items():
-            for c in v.get():
-                bell = bell_num_from_name(c)
-                # If the name was invalid or the bell is out of range, mark this cell as having
-                # errors and continue
-                if bell is None or bell < 0 or bell >= size:
-                    cells_with_errors.add(user_id)
-                    continue
-                # If bells are assigned to a user who's left the tower, then that's also an error
-                if not self._matrix.is_user_in_room(user_id):
-                    cells_with_errors.add(user_id)
-                    continue
-                # Assign the bell to this user (but store existing assignments to show errors)
-                if bell in assigned_users:
-                    assigned_users[bell].append(user_id)
-                else:
-                    assigned_users[bell] = [user_id]
-
-        return (assigned_users, cells_with_errors)
-
-    def update(self, *args):
-        size = int(self._size_var.get())
-
-        assigned_users, cells_with_errors = self._assignments_and_errors()
-
-        # Mark duplicate assignments as errors
-        for b in assigned_users:
-            users = assigned_users[b]
-            if len(users) > 1:
-                for u in users:
-                    cells_with_errors.add(u)
-
-        # Update the cell highlighting and the enabledness of the button
-        for i, (_index, c) in self._cells.items():
-            c['background'] = COL_ERROR if i in cells_with_errors else COL_BG
-        self._load_button['state'] = tk.NORMAL if len(cells_with_errors) == 0 else tk.DISABLED
-
-        # Find which bells are unassigned, and update the readout
-        unassigned_bells = [b for b in range(size) if b not in assigned_users]
-        if len(unassigned_bells) == 0:
-            text = ''
+        req_height = min(
+            self._header_height + (num_touches + 1) * self._row_height,
+            int(self._canvas.winfo_screenheight() * 0.6)
+        )
+        if (req_width, req_height) != self._requested_size:
+            self._canvas.config(width=req_width, height=req_height)
+            self._requested_size = (req_width, req_height)
+
+        # Clamp the scroll position, and update the scrollbars to match
+        self._first_row = max(0, min(self._first_row, num_touches - self._num_visible_rows))
+        self._first_col = max(0, min(self._first_col, self._num_cols - self._num_visible_cols))
+        self._set_scrollbar(self._yscroll, self._first_row, self._num_visible_rows, num_touches)
+        self._set_scrollbar(self._xscroll, self._first_col, self._num_visible_cols, self._num_cols)
+
+    @staticmethod
+    def _set_scrollbar(scrollbar, first, num_visible, total):
+        total = max(total, 1)
+        scrollbar.set(first / total, min(1, (first + num_visible) / total))
+
+    def _row_y(self, index):
+        """ The y-coordinate of the top of a touch's row, or None if it isn't visible. """
+        row = index - self._first_row
+        if 0 <= row < self._num_visible_rows:
+            return self._header_height + row * self._row_height
+        return None
+
+    def _col_x(self, col):
+        """ The x-coordinate of the left of a user column, or None if it isn't visible. """
+        visible_col = col - self._first_col
+        if 0 <= visible_col < self._num_visible_cols:
+            return self._fixed_width + visible_col * self._cell_width
+        return None
+
+    # ===== DRAWING =====
+
+    def _draw_all(self):
+        self._canvas.delete("all")
+        self._update_geometry()
+        self._draw_header()
+        touches = self._matrix.touches
+        last_row = min(len(touches), self._first_row + self._num_visible_rows)
+        for t in touches[self._first_row:last_row]:
+            self._draw_touch(t)
+        self._place_editor()
+
+    def _draw_header(self):
+        c = self._canvas
+        y = self._header_height - self._row_height / 2
+        for key, heading, _w in self._fixed_columns:
+            x1, x2 = self._fixed_x[key]
+            c.create_text((x1 + x2) / 2, y, text=heading, font=self._heading_font, tags="header")
+
+        users = self._matrix.users
+        last_col = min(len(self._user_ids), self._first_col + self._num_visible_cols)
+        for col in range(self._first_col, last_col):
+            user = users[self._user_ids[col]]
+            x = self._col_x(col) + self._cell_width / 2
+            c.create_text(
+                x, self._header_height - self.CELL_PAD,
+                text=self._matrix.ringer_label(user.id),
+                font=self._font,
+                angle=90,
+                anchor="w",
+                fill=COL_FG if user.is_in_room else COL_FADE,
+                tags="header",
+            )
+
+    def _draw_touch(self, touch):
+        c = self._canvas
+        tag = f"touch{touch.id}"
+        c.delete(tag)
+        y1 = self._row_y(touch.index)
+        if y1 is None:
+            return
+        y2 = y1 + self._row_height
+        y_mid = (y1 + y2) / 2
+        tags = ("touch", tag)
+
+        def text(key, value, **kwargs):
+            x1, x2 = self._fixed_x[key]
+            c.create_text((x1 + x2) / 2, y_mid, text=value, font=self._font, tags=tags, **kwargs)
+
+        def box(key, fill):
+            x1, x2 = self._fixed_x[key]
+            c.create_rectangle(x1 + 1, y1 + 1, x2 - 1, y2 - 1, fill=fill, outline=COL_GRID,
+                               tags=tags)
+
+        # ===== FIXED COLUMNS =====
+        if touch.index > 0:
+            text("swap", "^")
+        text("number", str(touch.index + 1))
+        box("size", COL_BUTTON)
+        text("size", f"{touch.size} ▾")
+        box("mode", COL_BUTTON)
+        text("mode", f"{touch.bell_mode} ▾")
+        box("load", COL_BUTTON)
+        if touch.is_stale:
+            load_fill = COL_ERROR
         else:
-            text = ','.join([bell_name_from_num(b) for b in unassigned_bells]) + " left"
-        self._bells_left['text'] = text
+            load_fill = COL_FG if touch.can_load else COL_FADE
+        text("load", touch.load_text, fill=load_fill)
+        x1, x2 = self._fixed_x["done"]
+        x_mid = (x1 + x2) / 2
+        half = self._row_height / 2 - self.CELL_PAD
+        c.create_rectangle(x_mid - half, y_mid - half, x_mid + half, y_mid + half,
+                           fill=COL_DONE if touch.is_done else COL_BG, outline=COL_GRID, tags=tags)
+        if touch.is_done:
+            text("done", "✓")
+        box("notes", COL_DONE if touch.is_done else COL_BG)
+        x1, x2 = self._fixed_x["notes"]
+        max_chars = (x2 - x1) // self._char_width - 1
+        c.create_text(x1 + self.CELL_PAD * 2, y_mid, text=touch.notes[:max_chars], anchor="w",
+                      font=self._font, tags=tags)
+
+        # ===== USER CELLS =====
+        last_col = min(len(self._user_ids), self._first_col + self._num_visible_cols)
+        for col in range(self._first_col, last_col):
+            user_id = self._user_ids[col]
+            x1 = self._col_x(col)
+            x2 = x1 + self._cell_width
+            # Cells which would be changed by the current suggestion show the suggested text
+            suggested_text = touch.suggested_text(user_id)
+            if suggested_text is not None:
+                fill = COL_SUGGEST
+            elif touch.cell_has_error(user_id):
+                fill = COL_ERROR
+            else:
+                fill = COL_BG
+            c.create_rectangle(x1, y1, x2, y2, fill=fill, outline=COL_GRID, tags=tags)
+            c.create_text(
+                (x1 + x2) / 2, y_mid,
+                text=touch.cell_text(user_id) if suggested_text is None else suggested_text,
+                font=self._font,
+                tags=tags,
+            )
 
-    def _update_doneness(self, *args):
-        self._name_box.config(bg=COL_DONE if self._done_var.get() == 1 else COL_BG)
+        # ===== BELLS LEFT =====
+        x = self._col_x(len(self._user_ids))
+        if x is not None:
+            c.create_text(x + 2 * self.CELL_PAD, y_mid, text=touch.bells_left_text, anchor="w",
+                          font=self._font, tags=tags)
+
+    # ===== MOUSE & SCROLLING =====
+
+    def _on_configure(self, event):
+        self._width = event.width
+        self._height = event.height
+        self.redraw()
+
+    def _hit_test(self, x, y):
+        """ Returns the (touch, key, user_id) under a given point, or None. """
+        if y < self._header_height:
+            return None
+        index = self._first_row + int((y - self._header_height) // self._row_height)
+        touches = self._matrix.touches
+        if index >= len(touches):
+            return None
+        touch = touches[index]
+
+        if x < self._fixed_width:
+            for key, (x1, x2) in self._fixed_x.items():
+                if x1 <= x < x2:
+                    return (touch, key, None)
+            return None
+        col = self._first_col + int((x - self._fixed_width) // self._cell_width)
+        if col < len(self._user_ids):
+            return (touch, "cell", self._user_ids[col])
+        return None
 
-    def set_index(self, new_index):
-        self._index = new_index
-        self._number.config(text=str(self._index + 1))
-        self._pack_elems()
+    def _on_click(self, event):
+        if event.y < self._header_height:
+            self._stop_editing()
+            self._on_header_click(event)
+            return
+        hit = self._hit_test(event.x, event.y)
+        if hit is None:
+            self._stop_editing()
+            return
+        touch, key, user_id = hit
+
+        if key == "cell":
+            self._edit("cell", touch, user_id)
+            return
+        if key == "notes":
+            self._edit("notes", touch)
+            return
+
+        self._stop_editing()
+        if key == "swap" and touch.index > 0:
+            self._matrix.swap_touches(touch.index - 1)
+        elif key == "size":
+            self._menu_touch = touch
+            self._size_menu.tk_popup(event.x_root, event.y_root)
+        elif key == "mode":
+            self._menu_touch = touch
+            self._mode_menu.tk_popup(event.x_root, event.y_root)
+        elif key == "load" and touch.can_load:
+            touch.load()
+        elif key == "done":
+            touch.set_done(not touch.is_done)
+
+    def _on_header_click(self, event):
+        """ Clicking a ringer's name shows the menu of what they will ring. """
+        if event.x < self._fixed_width:
+            return
+        col = self._first_col + int((event.x - self._fixed_width) // self._cell_width)
+        if col >= len(self._user_ids):
+            return
+        self._menu_user_id = self._user_ids[col]
+        modes = self._matrix.preferences.modes(self._menu_user_id)
+        for label, option_modes in RINGER_MODE_OPTIONS:
+            if set(option_modes) == modes:
+                self._ringer_modes_var.set(label)
+        self._ringer_menu.tk_popup(event.x_root, event.y_root)
+
+    def _on_mouse_wheel(self, event):
+        if event.num == 4:
+            steps = -1
+        elif event.num == 5:
+            steps = 1
+        else:
+            steps = -1 if event.delta > 0 else 1
+        # Shift scrolls sideways
+        if event.state & 0x1:
+            self._first_col += steps
+        else:
+            self._first_row += steps
+        self.redraw()
 
-    @property
-    def _row(self):
-        """ Gets the row that this touch should occupy in the grid. """
-        return User.ROWS + self._index
-
-    @classmethod
-    def create_headings(cls, parent):
-        headers = [
-            tk.Label(parent, text=i, font=(FONT_NAME, FONT_SIZE, "bold"))
-            for i in ["Bells", "Mode", "", "Done", "Touch notes"]
-        ]
-        for i, h in enumerate(headers):
-            h.grid(row=User.ROWS - 1, column=Touch.LEFT_MARGIN + 1 + i, sticky="S")
-        return headers
+    def _on_yscroll(self, *args):
+        self._first_row = self._scroll_position(
+            args, self._first_row, self._num_visible_rows, len(self._matrix.touches)
+        )
+        self.redraw()
 
-    def _on_load(self):
-        print(f"Loading #{self._index + 1}: '{self._name_box.get()}'")
-        # If we load a touch, then automatically flag it as done
-        self._done_var.set(1)
-        # ===== READ ALL THE REQUIRED VALUES =====
-        assigned_users, _cells_with_errors = self._assignments_and_errors()
-        new_size = int(self._size_var.get())
-        # Convert the bell type string into a BellType value
-        bell_type_str = self._bellmode_var.get()
-        if bell_type_str == "Tower":
-            bell_type = TOWER_BELLS
+    def _on_xscroll(self, *args):
+        self._first_col = self._scroll_position(
+            args, self._first_col, self._num_visible_cols, self._num_cols
+        )
+        self.redraw()
+
+    @staticmethod
+    def _scroll_position(args, first, num_visible, total):
+        """ Converts the arguments of a scrollbar command into a new first row/column. """
+        if args[0] == "moveto":
+            return int(round(float(args[1]) * total))
+        steps = int(args[1])
+        if args[2] == "pages":
+            steps *= max(1, num_visible - 1)
+        return first + steps
+
+    # ===== EDITING =====
+
+    def _edit(self, kind, touch, user_id=None):
+        """ Point the editor of a given kind at a cell, and give it the keyboard focus. """
+        if self._editing is not None and self._editing[0] != kind:
+            self._editors[self._editing[0]].place_forget()
+        self._editing = (kind, touch, user_id)
+
+        self._is_loading_editor = True
+        self._editor_var.set(touch.cell_text(user_id) if kind == "cell" else touch.notes)
+        self._is_loading_editor = False
+
+        editor = self._editors[kind]
+        self._place_editor()
+        editor.focus_set()
+        editor.select_range(0, tk.END)
+        editor.icursor(tk.END)
+
+    def _stop_editing(self):
+        if self._editing is not None:
+            self._editors[self._editing[0]].place_forget()
+            self._editing = None
+            self._canvas.focus_set()
+
+    def _place_editor(self):
+        """ Move the current editor over its cell, hiding it if the cell is scrolled away. """
+        if self._editing is None:
+            return
+        kind, touch, user_id = self._editing
+        editor = self._editors[kind]
+
+        y = self._row_y(touch.index)
+        if kind == "cell":
+            x = self._col_x(self._user_ids.index(user_id))
+            width = self._cell_width
         else:
-            assert bell_type_str == "Hand"
-            bell_type = HAND_BELLS
-
-        # ===== UPDATE RINGING ROOM =====
-        # Reassign all bells if we're changing the touch
-        should_unassign_all = (self._id != self._matrix.last_assigned_touch_id)
-        self._matrix.last_assigned_touch_id = self._id
-        print(should_unassign_all)
-        # Set tower size and setting
-        tower = self._matrix.tower
-        tower.set_at_hand()
-        tower.set_size(new_size)
-        tower.set_bell_type(bell_type)
-        # Unassign all if needed
-        if should_unassign_all:
-            tower.unassign_all()
-        # Assign users
-        for i in range(new_size):
-            bell = Bell.from_index(i)
-            user_ids = assigned_users.get(i)
-            if user_ids:
-                # Only re-assign the bell if needed
-                user_id = user_ids[0]
-                # Only assign bells if change is required (in the case of unassigning all, we force
-                # through this change, in case the Tower's internal state hasn't updated)
-                if should_unassign_all or user_id != tower.get_assignment(bell):
-                    time.sleep(ASSIGN_DELAY)
-                    tower.assign(user_id, bell)
-            else:
-                # If the bell should be unassigned, then unassign it only if currently assigned
-                if not should_unassign_all and tower.get_assignment(bell) is not None:
-                    time.sleep(ASSIGN_DELAY)
-                    tower.unassign(bell)
+            x, x2 = self._fixed_x["notes"]
+            width = x2 - x
+        if x is None or y is None:
+            editor.place_forget()
+        else:
+            editor.place(x=x, y=y, width=width, height=self._row_height)
+
+    def _move_editor(self, d_row, d_col):
+        """ Move the current editor by a number of rows and columns, scrolling to follow it. """
+        if self._editing is None:
+            return "break"
+        kind, touch, user_id = self._editing
+        touches = self._matrix.touches
+
+        index = max(0, min(touch.index + d_row, len(touches) - 1))
+        self.see(index)
+        if kind == "cell":
+            col = self._user_ids.index(user_id) + d_col
+            col = max(0, min(col, len(self._user_ids) - 1))
+            if col < self._first_col:
+                self._first_col = col
+            elif col >= self._first_col + self._num_visible_cols:
+                self._first_col = col - self._num_visible_cols + 1
+            user_id = self._user_ids[col]
+        self._edit(kind, touches[index], user_id)
+        # Don't let Tk also handle the key
+        return "break"
+
+    def _on_editor_change(self, *args):
+        if self._is_loading_editor or self._editing is None:
+            return
+        kind, touch, user_id = self._editing
+        if kind == "cell":
+            touch.set_cell(user_id, self._editor_var.get())
+        else:
+            touch.set_notes(self._editor_var.get())
 
 
 class Matrix:
     """ The matrix between touches (left) and ringers (top) """
 
-    def __init__(self, parent, tower):
+    def __init__(self, parent, tower, save_path=None, locate_ringer=None):
         # ===== INITIALISATION =====
         self._parent = parent
         self._panel = tk.Frame(self._parent)
+        self.tower = tower
+        # A function which returns the name of another tower that a ringer (given by name) is in,
+        # or None.  This is used to show where ringers have gone when several towers are open.
+        self._locate_ringer = locate_ringer
 
-        # Users is a mapping between user ids (`int`s) and the User objects
-        self._users = {}
+        # The headless model of the practice, which this class and the Touches are views of
+        self.practice = Practice()
+        # The views of the touches, in the same order as `self.practice.touches`
         self._touches = []
-        self._next_touch_id = 0
-        self.last_assigned_touch_id = None
+        # Maps touch IDs to their views
+        self._touches_by_id = {}
+        # The user ids who have entered or left since the last presence flush
+        self._pending_presence = set()
+        # The plan to load the next touch, prefetched as a (touch, plan, tower version) triple, or
+        # None if it needs to be (re)computed
+        self._next_load = None
+        self._is_next_load_scheduled = False
+        # The journal which the practice is autosaved to (if any), and the changes which haven't
+        # been sent to it yet
+        self._journal = None
+        self._unsaved_touches = set()
+        self._is_order_unsaved = False
+        self._is_save_scheduled = False
+        # What each ringer will ring, and the allocation suggested by the solver (or None)
+        self.preferences = Preferences()
+        self.suggestion = None
+        # Set when ringers leave, so that the next presence flush repairs the touches they were in
+        self._has_departures = False
+        # The touch which was last loaded into the tower (or failed while loading), which is
+        # re-applied after reconnecting
+        self.current_touch = None
 
         # Forward layout methods to the panel
         self.pack = self._panel.pack
         self.grid = self._panel.grid
 
-        # ===== HANDLE RR CALLBACKS =====
-        self.tower = tower
-        self.tower.on_user_enter(self._on_user_enter)
-        self.tower.on_user_leave(self._on_user_leave)
-
-        # Make sure that all the existing users appear in the list
-        for user_id, user_name in self.tower.all_users.items():
-            self._on_user_enter(user_id, user_name)
-
-        # ===== TOP-LEFT CORNER BOX =====
+        # ===== TOP BOX =====
         self._help_box = tk.Frame(self._panel)
-        self._help_box.grid(
-            row=0,
-            column=0,
-            rowspan=User.ROWS - 1,
-            columnspan=Touch.COLS,
-            sticky="NESW"
-        )
+        self._help_box.pack(fill=tk.X)
 
         self._title = tk.Label(
             self._help_box,
@@ -394,9 +875,9 @@ class Matrix:
 
         self._tower_label = tk.Label(
             self._help_box,
-            text=f"Tower #{self.tower.tower_id}: {self.tower.tower_name}",
             font=(FONT_NAME, FONT_SIZE)
         )
+        self._show_connection(True)
         self._tower_label.pack()
 
         self._help_block = tk.Frame(self._help_box)
@@ -408,9 +889,14 @@ class Matrix:
             "Give people bells by typing bell names into box",
             "The bell names for 1-16 are 1234567890ETABCD",
             "Write two bell names to assign to two bells",
+            "Tab, Enter and the arrow keys move between boxes",
             "If a bell is assigned to two ringers then the cells go red",
             "If an invalid bell name is entered the cell goes red",
-            "Press 'Load' to load that touch to Ringing Room"
+            "Press 'Load' to load that touch to Ringing Room",
+            "Press 'Load next' (or Ctrl+Enter) to load the first touch which isn't done",
+            "'Import' reads a whole practice from CSV, or cells pasted from a spreadsheet",
+            "'Suggest bells' fills the touches fairly (click a name to say what they ring)",
+            "'Tidy up' archives the touches which are done, or removes ringers who have left"
         ]
         self._help_labels = []
         for l in help_lines:
@@ -425,112 +911,715 @@ class Matrix:
 
         # ===== INITIALISE THE TABLE =====
 
-        # Always start with one touch, and generate the headings for the columns
-        self._headers = Touch.create_headings(self._panel)
-        self._add_touch()
+        self.table = TouchTable(self._panel, self)
+        self.table.pack(expand=True, fill=tk.BOTH)
+
+        # The bar showing the current suggestion, which is only packed while there is one
+        self._suggestion_bar = tk.Frame(self._panel, background=COL_SUGGEST)
+        self._suggestion_label = tk.Label(self._suggestion_bar, font=FONT, background=COL_SUGGEST)
+        self._suggestion_label.pack(side=tk.LEFT, padx=5)
+        tk.Button(
+            self._suggestion_bar,
+            text="Dismiss",
+            font=FONT,
+            command=self.dismiss_suggestion
+        ).pack(side=tk.RIGHT, padx=2, pady=2)
+        tk.Button(
+            self._suggestion_bar,
+            text="Accept",
+            font=FONT,
+            command=self.accept_suggestion
+        ).pack(side=tk.RIGHT, padx=2, pady=2)
+
+        self._button_bar = tk.Frame(self._panel)
+        self._button_bar.pack()
 
-        # An array to store the buttons to swap touches
-        self._swap_buttons = []
         # Create the plus button
         self._plus_button = tk.Button(
-            self._panel,
+            self._button_bar,
             text='+',
             font=FONT,
             command=self._add_touch
         )
-        self._plus_button.grid(row=MAX_ROWS, column=0, columnspan=MAX_COLS + 1)
+        self._plus_button.pack(side=tk.LEFT, padx=2)
 
-    def is_user_in_room(self, user_id):
-        if user_id in self._users:
-            return self._users[user_id].is_in_room
+        # Create the button to load the next touch
+        self._load_next_button = tk.Button(
+            self._button_bar,
+            text="Load next",
+            font=FONT,
+            state=tk.DISABLED,
+            command=self.load_next
+        )
+        self._load_next_button.pack(side=tk.LEFT, padx=2)
 
-    def _on_user_enter(self, user_id, user_name):
-        if user_id in self._users:
-            self._users[user_id].set_in_room(True)
-            # Update all the touches when a user returns to the tower
-            for t in self._touches:
-                t.update()
+        # Create the menu of ways to import a practice plan
+        self._import_button = tk.Menubutton(
+            self._button_bar,
+            text="Import",
+            font=FONT,
+            relief=tk.RAISED
+        )
+        self._import_menu = tk.Menu(self._import_button, tearoff=0)
+        self._import_menu.add_command(label="Paste from clipboard", command=self._import_clipboard)
+        self._import_menu.add_command(label="Open file...", command=self._import_file)
+        self._import_button["menu"] = self._import_menu
+        self._import_button.pack(side=tk.LEFT, padx=2)
+
+        # Create the button to suggest an allocation of bells
+        self._suggest_button = tk.Button(
+            self._button_bar,
+            text="Suggest bells",
+            font=FONT,
+            command=self.suggest_allocation
+        )
+        self._suggest_button.pack(side=tk.LEFT, padx=2)
+
+        # Create the menu of ways to shrink a long practice
+        self._tidy_button = tk.Menubutton(
+            self._button_bar,
+            text="Tidy up",
+            font=FONT,
+            relief=tk.RAISED
+        )
+        self._tidy_menu = tk.Menu(self._tidy_button, tearoff=0)
+        self._tidy_menu.add_command(label="Archive done touches", command=self.archive_done_touches)
+        self._tidy_menu.add_command(label="Remove ringers who have left",
+                                    command=self.remove_departed_ringers)
+        self._tidy_button["menu"] = self._tidy_menu
+        self._tidy_button.pack(side=tk.LEFT, padx=2)
+        self._panel.winfo_toplevel().bind("<Control-Return>", self._on_load_next_key, add="+")
+
+        # ===== HANDLE RR CALLBACKS =====
+        # All loads are sent to the tower from a separate thread, so that the UI stays responsive
+        self.loader = LoadWorker(self.tower)
+        self.loader.start()
+        self._poll_loader()
+        # The tower's callbacks come from the socket-io thread, so are queued and handled on the Tk
+        # thread in batches
+        self.events = EventBus()
+        self.tower.on_user_enter(self.events.callback("user_enter", self._on_user_enter))
+        self.tower.on_user_leave(self.events.callback("user_leave", self._on_user_leave))
+        self.tower.on_disconnect(
+            self.events.callback("disconnect", self._on_disconnect, is_control=True)
+        )
+        self.tower.on_resync(
+            self.events.callback("resync", self._reconcile_with_tower, is_control=True)
+        )
+        # If presence events have been dropped, then catch up with the tower's current users
+        self.events.on_overflow(self._catch_up_with_tower)
+        self.events.start(self._panel)
+
+        # Make sure that all the existing users appear in the list
+        for user_id, user_name in self.tower.all_users.items():
+            self._on_user_enter(user_id, user_name)
+
+        # Restore the practice if it was autosaved, otherwise always start with one touch
+        records = read_autosave(save_path) if save_path is not None else None
+        if records:
+            self._add_touch_views(restore(self.practice, records))
+            logger.info(f"Restored {len(records)} touch(es) from {save_path}")
+            self.table.redraw()
         else:
-            self._add_user(user_id, user_name)
+            self._add_touch()
+
+        if save_path is not None:
+            self._journal = Journal(save_path)
+            self._journal.start([touch_record(self.practice, p) for p in self.practice.touches])
+
+    @property
+    def users(self):
+        """ The users of the practice, as a mapping from user ids to Ringers (in column order). """
+        return self.practice.ringers
+
+    @property
+    def touches(self):
+        """ The views of the touches of the practice, in order. """
+        return self._touches
+
+    def close(self):
+        """ Stop the background threads, after writing any unsaved changes. """
+        self.loader.stop()
+        if self._journal is not None:
+            self._flush_save()
+            self._journal.stop()
+
+    def on_touch_change(self, touch, affects_bells=True):
+        """ Called by a Touch whenever its contents change. """
+        # A suggestion is out of date once the bells of the touches it was made from have changed,
+        # or if one of the touches it changes is being rung
+        if self.suggestion is not None and (
+            affects_bells
+            or (touch.id in self.suggestion.changes and (touch.is_loading or touch.is_done))
+        ):
+            self.dismiss_suggestion()
+        self.invalidate_next_load()
+        self._queue_save(touch)
+
+    def _poll_loader(self):
+        """ Pass progress from the load worker to the touches, then re-schedule this poll. """
+        # Stop polling once this Matrix's tab has been closed
+        if not self._panel.winfo_exists():
+            return
+        self.loader.process_events()
+        # Re-plan the next load if the tower has changed since it was planned
+        if self._next_load is not None and self._next_load[2] != self.loader.tower_version:
+            self.invalidate_next_load()
+        self._panel.after(LOADER_POLL_INTERVAL, self._poll_loader)
+
+    # ===== LOADING THE NEXT TOUCH =====
+
+    def next_touch(self):
+        """ The first touch which isn't done or already being loaded, or None. """
+        for touch in self._touches:
+            if not touch.is_done and not touch.is_loading:
+                return touch
+        return None
+
+    def invalidate_next_load(self):
+        """
+        Throw away the prefetched plan for the next load, and make a new one the next time Tk is
+        idle (so that a burst of changes only causes one re-plan).
+        """
+        self._next_load = None
+        if not self._is_next_load_scheduled:
+            self._is_next_load_scheduled = True
+            self._panel.after_idle(self._prefetch_next_load)
+
+    def _prefetch_next_load(self):
+        self._is_next_load_scheduled = False
+        touch = self.next_touch()
+        if touch is None or not touch.plan.is_valid:
+            self._next_load = None
+            self._load_next_button.config(text="Load next", state=tk.DISABLED)
+            return
+        plan, version = self.loader.plan(touch.size, touch.bell_type, touch.plan.assignments())
+        self._next_load = (touch, plan, version)
+        self._load_next_button.config(text=f"Load next (#{touch.index + 1})", state=tk.NORMAL)
+
+    def _on_load_next_key(self, _event):
+        # Every Matrix in the window gets the key, but only the one being shown should load
+        if self._panel.winfo_exists() and self._panel.winfo_ismapped():
+            self.load_next()
+
+    def load_next(self):
+        """ Load the first touch which isn't done, using the prefetched plan if it's fresh. """
+        if self._next_load is None:
+            self._prefetch_next_load()
+        if self._next_load is None:
+            return
+        touch, plan, version = self._next_load
+        touch.load(plan, version)
+
+    # ===== SUGGESTING ALLOCATIONS =====
+
+    def ringer_label(self, user_id):
+        """
+        The name at the top of a ringer's column, marked if they don't ring everything or if
+        they've gone to another tower.
+        """
+        ringer = self.users[user_id]
+        modes = tuple(m for m in BELL_MODES if self.preferences.rings(user_id, m))
+        label = ringer.name + RINGER_MODE_MARKS.get(modes, "")
+        if not ringer.is_in_room and self._locate_ringer is not None:
+            tower_name = self._locate_ringer(ringer.name)
+            if tower_name is not None:
+                label += f" (in {tower_name})"
+        return label
+
+    def set_ringer_modes(self, user_id, modes):
+        """ Set which modes a ringer will ring, and re-suggest any suggestion being shown. """
+        self.preferences.set_modes(user_id, modes)
+        self.table.redraw()
+        if self.suggestion is not None:
+            self.suggest_allocation()
+
+    def suggested_text(self, touch_id, user_id):
+        return None if self.suggestion is None else self.suggestion.text(touch_id, user_id)
+
+    def suggest_allocation(self, is_automatic=False):
+        """
+        Work out how to fill the touches which haven't been rung, and show the result for the
+        conductor to accept or dismiss.  Automatic suggestions (after ringers leave) aren't shown
+        if there's nothing to change.
+        """
+        plans = [t.plan for t in self._touches if not t.is_done and not t.is_loading]
+        with stats.timed("allocation"):
+            suggestion = suggest(self.practice, self.preferences, plans)
+        if suggestion.is_empty and is_automatic:
+            self.dismiss_suggestion()
+            return
+        self.suggestion = suggestion
+        self._suggestion_label.config(
+            text=f"Suggested {suggestion.num_changes} change(s) in "
+                 f"{len(suggestion.changes)} touch(es)"
+        )
+        self._suggestion_bar.pack(fill=tk.X, before=self._button_bar)
+        self.table.redraw()
+
+    def accept_suggestion(self):
+        """ Apply every change of the current suggestion, validating each touch once. """
+        suggestion = self.suggestion
+        if suggestion is None:
+            return
+        # Clear the suggestion first, so the changes it makes don't dismiss it halfway through
+        self.dismiss_suggestion()
+        with stats.timed("touch_update"):
+            for plan in suggestion.apply(self.practice):
+                self._touches_by_id[plan.id].on_change()
+
+    def dismiss_suggestion(self):
+        if self.suggestion is None:
+            return
+        self.suggestion = None
+        self._suggestion_bar.pack_forget()
+        self.table.redraw()
+
+    def _on_user_enter(self, user_id, user_name):
+        with stats.timed("user_enter"):
+            self._user_entered(user_id, user_name)
 
     def _on_user_leave(self, user_id, user_name):
-        self._users[user_id].set_in_room(False)
-        # Update all the touches when a user leaves the tower
-        for t in self._touches:
-            t.update()
+        with stats.timed("user_leave"):
+            self._user_left(user_id)
+
+    def _user_entered(self, user_id, user_name):
+        if user_id not in self.practice.ringers:
+            # Reattach restored ringers (or ringers who have rejoined with a new ID) by name
+            ringer = self.practice.find_ringer(user_name)
+            if ringer is None or ringer.is_in_room:
+                self._add_user(user_id, user_name)
+                return
+            old_id = ringer.id
+            self.practice.rename_ringer(old_id, user_id)
+            self.preferences.rename(old_id, user_id)
+            self.table.rename_user(old_id, user_id)
+            # The suggestion was made for the old ID, so make it again for the new one
+            if self.suggestion is not None:
+                self.suggest_allocation()
+
+        self.practice.set_in_room(user_id, True)
+        self.table.redraw()
+        # Update the touches when a user returns to the tower
+        self._queue_presence_change(user_id)
+
+    def _user_left(self, user_id):
+        # belltower reports users leaving who it never saw enter, and the enter event may also have
+        # been dropped by the EventBus
+        if user_id not in self.practice.ringers:
+            return
+        self.practice.set_in_room(user_id, False)
+        self._has_departures = True
+        self.table.redraw()
+        # Update the touches when a user leaves the tower
+        self._queue_presence_change(user_id)
+
+    def _queue_presence_change(self, user_id):
+        """
+        Buffer a presence change until the next time Tk is idle, so that a burst of users entering
+        or leaving only causes each touch to be updated once.
+        """
+        if not self._pending_presence:
+            self._panel.after_idle(self._flush_presence_changes)
+        self._pending_presence.add(user_id)
+
+    def _flush_presence_changes(self):
+        user_ids = self._pending_presence
+        self._pending_presence = set()
+        with stats.timed("presence_flush"):
+            for plan in self.practice.update_presence(user_ids):
+                self._touches_by_id[plan.id].redraw()
+        # Repair the touches of ringers who have left, and keep any suggestion up to date with
+        # who is in the room
+        if self._has_departures or self.suggestion is not None:
+            self._has_departures = False
+            self.suggest_allocation(is_automatic=True)
+        # Presence changes can change the next touch's assignments and whether it's valid
+        self.invalidate_next_load()
+
+    # ===== RECONNECTING =====
+
+    def _on_disconnect(self):
+        """ Called when the connection to Ringing Room drops. """
+        self._show_connection(False)
+
+    def _show_connection(self, is_connected):
+        text = f"Tower #{self.tower.tower_id}: {self.tower.tower_name}"
+        if is_connected:
+            self._tower_label.config(text=text, fg=COL_FG)
+        else:
+            self._tower_label.config(text=text + " (reconnecting...)", fg=COL_ERROR)
+
+    def _reconcile_with_tower(self):
+        """
+        Bring the practice up to date with the tower's users after reconnecting, and then re-apply
+        the touch which was in the tower.  The loader plans against the resynchronised assignments,
+        so only the bells which changed while we were disconnected are sent.
+        """
+        with stats.timed("resync"):
+            self._catch_up_with_tower()
+        self._show_connection(True)
+
+        touch = self.current_touch
+        if touch is None or touch.is_loading:
+            return
+        # A touch which was edited into an invalid state while we were disconnected isn't sent
+        if touch.plan.is_valid:
+            touch.load()
+        else:
+            logger.warning(
+                f"Not re-applying #{touch.index + 1} after reconnecting, since it has errors"
+            )
+            touch.mark_stale()
+
+    def _catch_up_with_tower(self):
+        """
+        Apply the difference between the practice's users and the tower's, as one batch of
+        presence changes.  This is also how events which the EventBus dropped are caught up with.
+        """
+        users = self.tower.all_users
+        for user_id, user_name in users.items():
+            if not self.practice.is_in_room(user_id):
+                self._user_entered(user_id, user_name)
+        for user_id, ringer in list(self.practice.ringers.items()):
+            if ringer.is_in_room and user_id not in users:
+                self._user_left(user_id)
+        # Apply the presence changes now, so that anything which follows sees them
+        if self._pending_presence:
+            self._flush_presence_changes()
 
     def _add_touch(self):
         """ Adds another row to the touch list. """
-        # If this isn't the first touch, then create a new swap button
         num_touches = len(self._touches)
-        if num_touches > 0:
-            new_swap_button = tk.Button(
-                self._panel,
-                text="^",
-                font=FONT,
-                command=lambda: self._swap_touches(num_touches - 1)
-            )
-            new_swap_button.grid(row=User.ROWS + num_touches, column=0)
-            self._swap_buttons.append(new_swap_button)
-
-        # Generate a new ID for this touch
-        new_id = self._next_touch_id
-        self._next_touch_id += 1
-        # Add a new touch
-        touch_to_clone = self._touches[-1] if self._touches != [] else None
-        new_touch = Touch(self, self._panel, num_touches, new_id, touch_to_clone)
-        # Add all the existing users to the touch row
-        for u_id, user in self._users.items():
-            new_touch.add_user(u_id, user)
-        # Add touch to list
-        self._touches.append(new_touch)
-
-    def _swap_touches(self, i):
+        self._add_touch_views([self.practice.add_touch()])
+        self.table.see(num_touches)
+        self.invalidate_next_load()
+
+    def _add_touch_views(self, plans):
+        """ Create views for any of the given TouchPlans which don't have one yet. """
+        for plan in plans:
+            if plan.id not in self._touches_by_id:
+                touch = Touch(self, len(self._touches), plan)
+                self._touches.append(touch)
+                self._touches_by_id[plan.id] = touch
+            self._queue_save(self._touches_by_id[plan.id])
+        self._queue_save(is_order_changed=True)
+
+    # ===== TIDYING UP =====
+
+    def archive_done_touches(self):
+        """
+        Remove the touches which are done from the table, so that a long practice doesn't slow
+        down.  They still count towards the fairness of suggested allocations.  The touch which is
+        in the tower is kept, so that it can be re-applied after reconnecting.
+        """
+        archived = [
+            t for t in self._touches
+            if t.is_done and not t.is_loading and t is not self.current_touch
+        ]
+        if not archived:
+            return
+        self.practice.archive_touches([t.plan for t in archived])
+        for touch in archived:
+            del self._touches_by_id[touch.id]
+        self._unsaved_touches.difference_update(archived)
+        self._touches = [t for t in self._touches if t.id in self._touches_by_id]
+        for i, touch in enumerate(self._touches):
+            touch.set_index(i)
+        logger.info(f"Archived {len(archived)} touch(es)")
+
+        self.table.forget(touches=archived)
+        if not self._touches:
+            self._add_touch()
+        self.invalidate_next_load()
+        self._queue_save(is_order_changed=True)
+
+    def remove_departed_ringers(self):
+        """
+        Remove the columns of every ringer who has left the tower, along with their bells.  Ringers
+        restored from an autosave who haven't rejoined yet are kept.
+        """
+        departed = self.practice.departed_ringers()
+        if not departed:
+            return
+        for user_id in departed:
+            for plan in self.practice.remove_ringer(user_id):
+                self._queue_save(self._touches_by_id[plan.id])
+            self.preferences.forget(user_id)
+        self._pending_presence.difference_update(departed)
+        logger.info(f"Removed {len(departed)} ringer(s)")
+
+        self.table.forget(user_ids=departed)
+        # Any suggestion was made for the old columns
+        if self.suggestion is not None:
+            self.suggest_allocation()
+        self.invalidate_next_load()
+
+    def swap_touches(self, i):
         # Swap touches
+        self.practice.swap_touches(i)
         self._touches[i], self._touches[i + 1] = self._touches[i + 1], self._touches[i]
         # Update indices
         self._touches[i].set_index(i)
         self._touches[i + 1].set_index(i + 1)
+        self.table.redraw()
+        self.invalidate_next_load()
+        self._queue_save(is_order_changed=True)
+
+    # ===== AUTOSAVING =====
+
+    def _queue_save(self, touch=None, is_order_changed=False):
+        """
+        Mark a touch (or the order of the touches) as needing to be autosaved.  Changes are
+        collected for `AUTOSAVE_DELAY` ms, so typing into a cell doesn't write every keystroke.
+        """
+        if self._journal is None:
+            return
+        if touch is not None:
+            self._unsaved_touches.add(touch)
+        self._is_order_unsaved |= is_order_changed
+        if not self._is_save_scheduled:
+            self._is_save_scheduled = True
+            self._panel.after(AUTOSAVE_DELAY, self._flush_save)
+
+    def _flush_save(self):
+        """ Hand the unsaved changes to the journal, which writes them on its own thread. """
+        self._is_save_scheduled = False
+        self._journal.write_touches(
+            [touch_record(self.practice, t.plan) for t in self._unsaved_touches]
+        )
+        if self._is_order_unsaved:
+            self._journal.write_order([t.id for t in self._touches])
+        self._unsaved_touches = set()
+        self._is_order_unsaved = False
+
+    # ===== IMPORTING =====
+
+    def _import_clipboard(self):
+        try:
+            text = self._panel.clipboard_get()
+        except tk.TclError:
+            tk.messagebox.showerror("Import", "The clipboard is empty.")
+            return
+        self.import_plan(text)
+
+    def _import_file(self):
+        path = tk.filedialog.askopenfilename(
+            title="Import practice plan",
+            filetypes=[("Spreadsheets", "*.csv *.tsv *.txt"), ("All files", "*")]
+        )
+        if not path:
+            return
+        with open(path, newline="") as f:
+            self.import_plan(f.read())
+
+    def import_plan(self, text):
+        """
+        Add the touches of a CSV/TSV practice plan to the end of the practice.  All the cells are
+        applied to the model in one batch, and the table is only redrawn once.
+        """
+        try:
+            _names, imported = read_plan(text)
+        except PlanFormatError as e:
+            tk.messagebox.showerror("Import", f"Couldn't read the practice plan.\n{e}")
+            return
+
+        plans, missing_names = import_plan(self.practice, imported)
+        self._add_touch_views(plans)
+        logger.info(f"Imported {len(plans)} touch(es)")
+        if missing_names:
+            names = ", ".join(sorted(missing_names))
+            tk.messagebox.showwarning(
+                "Import",
+                f"These ringers aren't in the tower, so their bells were skipped: {names}"
+            )
+        self.table.redraw()
+        if plans:
+            self.table.see(self._touches_by_id[plans[0].id].index)
+        self.invalidate_next_load()
 
     def _add_user(self, user_id, user_name):
         """
         Add a user to the practice.  This will be called as a callback for a user entering the
         practice.
         """
-        user = User(self._panel, user_id, user_name)
-        user.grid(
-            row=0,
-            column=Touch.COLS + len(self._users),
-            rowspan=User.ROWS,
-            sticky="S",
-            padx=2,
-            pady=(4, 2),
+        self.practice.add_ringer(user_id, user_name)
+        self.table.redraw()
+
+
+class TowerTabs:
+    """
+    The towers which this process is running practices in, each with its own Matrix in a tab.
+    Every tower has its own socket-io connection and LoadWorker thread, so loads to different
+    towers run in parallel, while all the UI shares one Tk event loop.
+    """
+
+    def __init__(self, window, record_path=None):
+        self._window = window
+        # The file that the first tower is recorded to (later towers add their ID to the name)
+        self._record_path = record_path
+        # The (tower, matrix, frame) of every open tower, in tab order
+        self._sessions = []
+
+        self._notebook = ttk.Notebook(window)
+        self._notebook.pack(expand=True, fill=tk.BOTH)
+        # Tabs which are hidden don't show where ringers have gone, so redraw them when shown
+        self._notebook.bind("<<NotebookTabChanged>>", self._on_tab_change)
+
+        menu_bar = tk.Menu(window)
+        self._tower_menu = tk.Menu(menu_bar, tearoff=0)
+        self._tower_menu.add_command(label="Join another tower...", command=self.choose_and_add)
+        self._tower_menu.add_command(label="Leave this tower", command=self.close_current,
+                                     state=tk.DISABLED)
+        menu_bar.add_cascade(label="Towers", menu=self._tower_menu)
+        window.config(menu=menu_bar)
+
+    @property
+    def matrices(self):
+        return [matrix for _tower, matrix, _frame in self._sessions]
+
+    def add(self, tower):
+        """ Connect to a tower (unless it's already connected) and open a tab for it. """
+        if self._record_path is not None:
+            from recording import RecordingTower
+            tower = RecordingTower(tower, self._recording_path(tower.tower_id))
+        tower.__enter__()
+        try:
+            tower.wait_loaded()
+        except Exception:
+            tower.__exit__(None, None, None)
+            raise
+
+        frame = tk.Frame(self._notebook)
+        matrix = Matrix(
+            frame,
+            tower,
+            save_path=autosave_path(tower.tower_id),
+            locate_ringer=lambda name: self.locate_ringer(name, exclude=tower)
         )
-        self._users[user_id] = user
+        matrix.pack(expand=True, fill=tk.BOTH)
+        self._notebook.add(frame, text=tower.tower_name)
+        self._notebook.select(frame)
+        self._sessions.append((tower, matrix, frame))
+        self._update_menu()
+        return matrix
+
+    def choose_and_add(self):
+        tower = choose_tower("Join another tower", FONT, TITLE_FONT, parent=self._window)
+        if tower is None:
+            return
+        if any(t.tower_id == tower.tower_id for t, _m, _f in self._sessions):
+            tower.__exit__(None, None, None)
+            tk.messagebox.showinfo("Join tower", f"'{tower.tower_name}' is already open.")
+            return
+        try:
+            self.add(tower)
+        except Exception as e:
+            tk.messagebox.showerror("Join tower", f"Couldn't join '{tower.tower_name}'.\n{e}")
+
+    def locate_ringer(self, name, exclude=None):
+        """ The name of an open tower (other than `exclude`) which a ringer is in, or None. """
+        for tower, matrix, _frame in self._sessions:
+            if tower is not exclude:
+                ringer = matrix.practice.find_ringer(name)
+                if ringer is not None and ringer.is_in_room:
+                    return tower.tower_name
+        return None
 
-        # Add this user to all the touches
-        for t in self._touches:
-            t.add_user(user_id, user)
+    def close_current(self):
+        """ Leave the tower whose tab is being shown, unless it's the only one. """
+        if len(self._sessions) <= 1:
+            return
+        tower, matrix, frame = self._sessions.pop(self._notebook.index("current"))
+        self._close(tower, matrix)
+        self._notebook.forget(frame)
+        frame.destroy()
+        self._update_menu()
+
+    def close(self):
+        """ Leave every tower, after saving their practices. """
+        for tower, matrix, _frame in self._sessions:
+            self._close(tower, matrix)
+        self._sessions = []
+
+    @staticmethod
+    def _close(tower, matrix):
+        matrix.close()
+        tower.__exit__(None, None, None)
+
+    def _recording_path(self, tower_id):
+        if not self._sessions:
+            return self._record_path
+        stem, ext = os.path.splitext(self._record_path)
+        return f"{stem}-{tower_id}{ext}"
+
+    def _update_menu(self):
+        self._tower_menu.entryconfig(
+            "Leave this tower",
+            state=tk.NORMAL if len(self._sessions) > 1 else tk.DISABLED
+        )
+
+    def _on_tab_change(self, _event):
+        if self._sessions:
+            _tower, matrix, _frame = self._sessions[self._notebook.index("current")]
+            matrix.table.redraw()
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Run extremely efficient Ringing Room practices.")
+    parser.add_argument("--stats", action="store_true", help="Show a window of live timings")
+    parser.add_argument(
+        "--stats-output",
+        help="File to write the timings to on exit (as CSV if it ends in '.csv', otherwise JSON)"
+    )
+    parser.add_argument("--profile", help="File to write a cProfile of the whole session to")
+    parser.add_argument(
+        "--record",
+        help="File to log every tower event and command to (replay it with recording.py)"
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    # belltower's towers log every message from Ringing Room at INFO (as 'TOWER'), which would
+    # drown out ours
+    logging.getLogger("TOWER").setLevel(logging.WARNING)
+
     tower = choose_tower("Minor General", FONT, TITLE_FONT)
     if tower is None:
         return -1
 
-    print("Connecting to tower...")
-    with tower:
-        tower.wait_loaded()
-
-        print("Connected!")
-
-        window = tk.Tk()
-        window.title("Minor General")
-
-        matrix = Matrix(window, tower)
-        matrix.pack()
+    window = tk.Tk()
+    window.title("Minor General")
+    towers = TowerTabs(window, record_path=args.record)
 
+    print("Connecting to tower...")
+    towers.add(tower)
+
+    print("Connected!")
+    stats.mark_startup("connected")
+    _import_timer.stop()
+    print("Startup times:")
+    for line in stats.startup_report():
+        print("    " + line)
+
+    stall_monitor = stats.StallMonitor(window)
+    stall_monitor.start()
+    if args.stats:
+        stats.StatsPanel(window)
+    profiler = None
+    if args.profile is not None:
+        profiler = stats.SessionProfiler(args.profile)
+        profiler.start()
+
+    try:
         window.mainloop()
+    finally:
+        if profiler is not None:
+            profiler.stop()
+        towers.close()
+    if args.stats_output is not None:
+        stats.dump(args.stats_output)
+        print(f"Wrote timings to {args.stats_output}")
 
 
 if __name__ == "__main__":
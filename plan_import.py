@@ -0,0 +1,151 @@
+"""
+Code to import a whole practice plan at once, from CSV or TSV text (e.g. a file exported from a
+spreadsheet, or cells pasted from the clipboard).  The first row is a header, and every other row
+is one touch:
+
+    Size,Mode,Notes,Alice,Bob,Carol,...
+    8,Tower,Plain Bob Major,12,3,45,...
+    6,Hand,Grandsire Doubles,,12,34,...
+
+The 'Size', 'Mode' and 'Notes' columns are optional (and can be in any order), and every other
+column is the bells of the ringer with that name.  A touch with no size or mode copies the one
+before it.  All the cells of a touch are applied in one go and validated once, so importing a
+whole practice takes a few milliseconds.
+"""
+
+import csv
+import io
+
+from practice import HAND, SIZES, TOWER
+
+SIZE_HEADING = "size"
+MODE_HEADING = "mode"
+NOTES_HEADING = "notes"
+
+
+class PlanFormatError(Exception):
+    """ An error created when an imported practice plan can't be read. """
+
+    def __init__(self, line, message):
+        super().__init__()
+        self._line = line
+        self._message = message
+
+    def __str__(self):
+        return f"Line {self._line}: {self._message}"
+
+
+class ImportedTouch:
+    """ A single touch read from a practice plan, before it is added to a Practice. """
+
+    __slots__ = ("size", "bell_mode", "notes", "texts")
+
+    def __init__(self, size, bell_mode, notes, texts):
+        # The size and bell mode, or None if they should be copied from the previous touch
+        self.size = size
+        self.bell_mode = bell_mode
+        self.notes = notes
+        # Maps ringer names to the text written for them
+        self.texts = texts
+
+
+def read_plan(text):
+    """
+    Reads a practice plan from CSV or TSV text, returning a tuple of the ringer names (in column
+    order) and the list of ImportedTouches.
+    """
+    lines = text.splitlines()
+    # Spreadsheets put tabs between pasted cells, so use those if the header has any
+    dialect = csv.excel_tab if lines and "\t" in lines[0] else csv.excel
+    rows = [
+        (line_num, [cell.strip() for cell in row])
+        for line_num, row in enumerate(csv.reader(io.StringIO(text), dialect), start=1)
+        if any(cell.strip() for cell in row)
+    ]
+    if not rows:
+        raise PlanFormatError(1, "The plan is empty.")
+
+    header_line, header = rows[0]
+    # Maps the special headings to their column indices, and the ringer names to theirs
+    special_cols = {}
+    ringer_cols = []
+    for i, heading in enumerate(header):
+        key = heading.lower()
+        if key in (SIZE_HEADING, MODE_HEADING, NOTES_HEADING):
+            if key in special_cols:
+                raise PlanFormatError(header_line, f"'{heading}' appears more than once.")
+            special_cols[key] = i
+        elif heading != "":
+            ringer_cols.append((heading, i))
+    names = [name for name, _i in ringer_cols]
+    if len(set(names)) != len(names):
+        raise PlanFormatError(header_line, "A ringer's name appears more than once.")
+
+    touches = []
+    for line_num, row in rows[1:]:
+        def cell(col):
+            return row[col] if col is not None and col < len(row) else ""
+
+        size_text = cell(special_cols.get(SIZE_HEADING))
+        size = None
+        if size_text != "":
+            if not size_text.isdigit() or int(size_text) not in SIZES:
+                raise PlanFormatError(line_num, f"'{size_text}' isn't a valid tower size.")
+            size = int(size_text)
+
+        mode_text = cell(special_cols.get(MODE_HEADING)).lower()
+        if mode_text == "":
+            bell_mode = None
+        elif mode_text.startswith("tower"):
+            bell_mode = TOWER
+        elif mode_text.startswith("hand"):
+            bell_mode = HAND
+        else:
+            raise PlanFormatError(line_num, f"'{mode_text}' isn't 'Tower' or 'Hand'.")
+
+        notes = cell(special_cols.get(NOTES_HEADING))
+        texts = {name: cell(col) for name, col in ringer_cols if cell(col) != ""}
+        touches.append(ImportedTouch(size, bell_mode, notes, texts))
+    return (names, touches)
+
+
+def import_plan(practice, touches):
+    """
+    Adds imported touches to the end of a practice, filling in any blank touches at the end first.
+    Returns a tuple of the TouchPlans which were filled in and the names of the imported ringers
+    who aren't in the practice (whose bells are skipped).
+    """
+    missing_names = set()
+
+    # Reuse the blank touches at the end of the practice, rather than leaving them in the way
+    start = len(practice.touches)
+    while start > 0 and practice.touches[start - 1].is_blank:
+        start -= 1
+
+    plans = []
+    for i, imported in enumerate(touches):
+        index = start + i
+        plan = practice.touches[index] if index < len(practice.touches) else practice.add_touch()
+        # Touches without a size or mode copy the touch before them
+        previous = practice.touches[index - 1] if index > 0 else None
+        if imported.size is not None:
+            plan.size = imported.size
+        elif previous is not None:
+            plan.size = previous.size
+        if imported.bell_mode is not None:
+            plan.bell_mode = imported.bell_mode
+        elif previous is not None:
+            plan.bell_mode = previous.bell_mode
+        plan.notes = imported.notes
+
+        texts = {}
+        for name, text in imported.texts.items():
+            ringer = practice.find_ringer(name)
+            if ringer is None:
+                missing_names.add(name)
+            else:
+                texts[ringer.id] = text
+        # Apply all the cells at once, and only validate the touch once
+        plan.set_texts(texts)
+        plans.append(plan)
+    return (plans, missing_names)
@@ -0,0 +1,112 @@
+"""
+A module to work out the smallest set of commands which will change the tower from whatever state
+it is currently in to a given touch.  Most consecutive touches in a practice only differ by a few
+bells, so this means that the time taken to load a touch depends on how much the touch changes, not
+on the size of the tower.
+"""
+
+"""
+The kinds of operation that a plan can contain.  Every operation is a tuple of its kind followed by
+the arguments to the `RingingRoomTower` method of the same name, except that bells are always
+stored as 0-indexed `int`s.
+"""
+SET_AT_HAND = "set_at_hand"
+SET_SIZE = "set_size"
+SET_BELL_TYPE = "set_bell_type"
+UNASSIGN_ALL = "unassign_all"
+ASSIGN = "assign"
+UNASSIGN = "unassign"
+
+""" The operations which wait for their echo from Ringing Room, and count as progress. """
+PACED_OPS = {ASSIGN, UNASSIGN}
+
+"""
+How many paced operations a single `unassign_all` is worth.  It sends one message per bell, but as
+one burst which doesn't need any pacing.
+"""
+UNASSIGN_ALL_COST = 1
+
+
+class Plan:
+    """ An ordered list of operations which will load a touch into the tower. """
+
+    def __init__(self, ops, is_full_reset):
+        self.ops = ops
+        self.is_full_reset = is_full_reset
+
+    @property
+    def cost(self):
+        """ The number of paced operations needed to run this plan. """
+        num_unassign_alls = sum(1 for op in self.ops if op[0] == UNASSIGN_ALL)
+        return self.num_paced_ops + num_unassign_alls * UNASSIGN_ALL_COST
+
+    @property
+    def num_paced_ops(self):
+        return sum(1 for op in self.ops if op[0] in PACED_OPS)
+
+    def __iter__(self):
+        return iter(self.ops)
+
+    def __len__(self):
+        return len(self.ops)
+
+    def __repr__(self):
+        return f"Plan({self.ops!r}, is_full_reset={self.is_full_reset})"
+
+
+def read_assignments(tower, size):
+    """
+    Reads the current assignments of the first `size` bells of a tower, as a map from 0-indexed
+    bells to user IDs.
+    """
+    from belltower import Bell
+
+    assignments = {}
+    for i in range(size):
+        user_id = tower.get_assignment(Bell.from_index(i))
+        if user_id is not None:
+            assignments[i] = user_id
+    return assignments
+
+
+def plan_load(current_size, current_bell_type, current_assignments, size, bell_type, assignments):
+    """
+    Generates the cheapest `Plan` to change a tower from its current state to a given touch.  Both
+    `current_assignments` and `assignments` map 0-indexed bells to user IDs.
+    """
+    ops = [(SET_AT_HAND,)]
+    if size != current_size:
+        ops.append((SET_SIZE, size))
+    if bell_type != current_bell_type:
+        ops.append((SET_BELL_TYPE, bell_type))
+    # Ringing Room drops the assignments of any bells removed by a resize
+    current_assignments = {b: u for b, u in current_assignments.items() if b < size}
+
+    # Only touch the bells which actually change
+    diff_ops = []
+    for b in range(size):
+        user_id = assignments.get(b)
+        if user_id == current_assignments.get(b):
+            continue
+        diff_ops.append((UNASSIGN, b) if user_id is None else (ASSIGN, user_id, b))
+    diff_plan = Plan(ops + diff_ops, False)
+
+    # Clear the tower and assign every bell from scratch
+    reset_ops = [(UNASSIGN_ALL,)] if current_assignments else []
+    reset_ops += [(ASSIGN, assignments[b], b) for b in range(size) if b in assignments]
+    reset_plan = Plan(ops + reset_ops, True)
+
+    # Only fall back to a full reset if it's actually cheaper
+    return reset_plan if reset_plan.cost < diff_plan.cost else diff_plan
+
+
+def plan_tower_load(tower, size, bell_type, assignments):
+    """ Generates the cheapest `Plan` to load a touch into the current state of a given tower. """
+    return plan_load(
+        tower.number_of_bells,
+        tower.bell_type,
+        read_assignments(tower, tower.number_of_bells),
+        size,
+        bell_type,
+        assignments,
+    )
@@ -0,0 +1,457 @@
+"""
+The headless model of a practice: the ringers, the touches and who rings which bells in each touch.
+This has no dependency on Tk, so it can be validated, tested and benchmarked without a display - the
+Tk classes in `main` are thin views over it.
+
+Bells are stored as bitmasks over `BELL_NAMES` (bit 0 is the treble), so finding duplicate
+assignments and the bells which are left is done with a handful of integer operations per ringer.
+"""
+
+BELL_NAMES = "1234567890ETABCD"
+MAX_BELLS = len(BELL_NAMES)
+
+""" The possible sizes that a RR tower can have. """
+SIZES = [4, 5, 6, 8, 10, 12, 14, 16]
+DEFAULT_SIZE = 8
+
+""" The possible modes that Ringing Room can be in (towerbells or handbells) """
+TOWER = "Tower"
+HAND = "Hand"
+BELL_MODES = [TOWER, HAND]
+
+# Maps every bell name (in either case) to the bit representing it in a bell mask
+_BELL_BITS = {}
+for _i, _name in enumerate(BELL_NAMES):
+    _BELL_BITS[_name] = 1 << _i
+    _BELL_BITS[_name.lower()] = 1 << _i
+
+
+def size_mask(size):
+    """ The mask containing the first `size` bells. """
+    return (1 << size) - 1
+
+
+def bells_in_mask(mask):
+    """ Generates the 0-indexed bells in a mask, in increasing order. """
+    while mask:
+        low_bit = mask & -mask
+        yield low_bit.bit_length() - 1
+        mask ^= low_bit
+
+
+def mask_to_names(mask):
+    """ Converts a bell mask to a string like '1,2,E'. """
+    return ','.join(BELL_NAMES[b] for b in bells_in_mask(mask))
+
+
+def mask_to_text(mask):
+    """ Converts a bell mask to the text which would be written in a cell, like '12E'. """
+    return ''.join(BELL_NAMES[b] for b in bells_in_mask(mask))
+
+
+def parse_bells(text, size):
+    """
+    Parses the bell names written in a cell, returning a tuple of the mask of valid bells and
+    whether or not the text contained any invalid, out-of-range or repeated bell names.
+    """
+    valid_bells = size_mask(size)
+    mask = 0
+    is_invalid = False
+    for c in text:
+        bit = _BELL_BITS.get(c, 0)
+        if bit & valid_bells == 0 or bit & mask:
+            is_invalid = True
+        else:
+            mask |= bit
+    return (mask, is_invalid)
+
+
+class Ringer:
+    """ A single user in the practice. """
+
+    __slots__ = ("id", "name", "is_in_room")
+
+    def __init__(self, ringer_id, name, is_in_room=True):
+        self.id = ringer_id
+        self.name = name
+        self.is_in_room = is_in_room
+
+
+class TouchPlan:
+    """
+    A single touch in the practice, and which bells each ringer rings in it.  The validation state
+    is kept up to date incrementally, so editing one ringer's bells only does work proportional to
+    the bells which changed.
+    """
+
+    __slots__ = (
+        "id", "size", "bell_mode", "is_done", "notes",
+        "_practice", "_texts", "_masks", "_invalid", "_counted", "_counts", "_assigned",
+        "_duplicated", "errors",
+    )
+
+    def __init__(self, practice, touch_id, size=DEFAULT_SIZE, bell_mode=TOWER):
+        self._practice = practice
+        self.id = touch_id
+        self.size = size
+        self.bell_mode = bell_mode
+        # Whether or not the touch has been rung
+        self.is_done = False
+        # An otherwise-useless note for the user to put the touch names
+        self.notes = ""
+
+        # Maps ringer IDs to the text written for them
+        self._texts = {}
+        # Maps ringer IDs to the mask of valid bells in their text
+        self._masks = {}
+        # The ringer IDs whose text contains invalid bell names
+        self._invalid = set()
+        # Maps ringer IDs to the mask of bells which they're counted as ringing (this is 0 for
+        # ringers who aren't in the room)
+        self._counted = {}
+        # How many ringers are counted as ringing each bell, and the masks of the bells which are
+        # rung by at least one and more than one ringer
+        self._counts = [0] * MAX_BELLS
+        self._assigned = 0
+        self._duplicated = 0
+        # The ringer IDs whose bells contain errors
+        self.errors = set()
+
+        for ringer_id in practice.ringers:
+            self.add_ringer(ringer_id)
+
+    def add_ringer(self, ringer_id):
+        self._texts[ringer_id] = ""
+        self._masks[ringer_id] = 0
+        self._counted[ringer_id] = 0
+
+    def rename_ringer(self, old_id, new_id):
+        """ Move all of a ringer's bells and validation state to a new ringer ID. """
+        for state in (self._texts, self._masks, self._counted):
+            state[new_id] = state.pop(old_id)
+        for ringer_ids in (self._invalid, self.errors):
+            if old_id in ringer_ids:
+                ringer_ids.discard(old_id)
+                ringer_ids.add(new_id)
+
+    def remove_ringer(self, ringer_id):
+        """ Remove a ringer's column, returning `True` if the errors or bells left have changed. """
+        # Clearing their text takes their bells out of the counts and the practice's index
+        has_changed = self.set_text(ringer_id, "")
+        for state in (self._texts, self._masks, self._counted):
+            del state[ringer_id]
+        return has_changed
+
+    def text(self, ringer_id):
+        """ The text written for a ringer in this touch. """
+        return self._texts[ringer_id]
+
+    def bells(self, ringer_id):
+        """ The mask of valid bells written for a ringer (whether or not they're in the room). """
+        return self._masks[ringer_id]
+
+    def has_invalid_text(self, ringer_id):
+        """ Whether or not a ringer's text has invalid, out-of-range or repeated bell names. """
+        return ringer_id in self._invalid
+
+    @property
+    def bells_left(self):
+        """ The mask of bells which nobody is ringing. """
+        return size_mask(self.size) & ~self._assigned
+
+    @property
+    def is_valid(self):
+        return len(self.errors) == 0
+
+    @property
+    def is_blank(self):
+        """ Whether or not nothing has been written in this touch. """
+        return not self.is_done and self.notes == "" and not any(self._texts.values())
+
+    def assignments(self):
+        """ Returns a mapping from 0-indexed bells to the ID of the ringer ringing them. """
+        return {
+            bell: ringer_id
+            for ringer_id, mask in self._counted.items()
+            for bell in bells_in_mask(mask)
+        }
+
+    # ===== EDITING =====
+
+    def set_text(self, ringer_id, text):
+        """
+        Sets the text written for a ringer, returning `True` if the errors or the bells left have
+        changed.
+        """
+        self._texts[ringer_id] = text
+        self._parse(ringer_id)
+
+        old_assigned = self._assigned
+        changed_bells = self._count(ringer_id)
+        has_changed = self._refresh_errors((ringer_id,), changed_bells)
+        return has_changed or self._assigned != old_assigned
+
+    def set_texts(self, texts):
+        """
+        Sets the text written for many ringers at once (given as a mapping from ringer IDs to
+        text), then validates the whole touch once.  Ringers who aren't given keep their text.
+        """
+        self._texts.update(texts)
+        self.revalidate()
+
+    def set_size(self, size):
+        """ Sets the size of this touch, which changes which bells are valid. """
+        self.size = size
+        self.revalidate()
+
+    def update_ringers(self, ringer_ids):
+        """
+        Updates the touch after the given ringers have entered or left the room, returning `True`
+        if the errors or the bells left have changed.
+        """
+        old_assigned = self._assigned
+        changed_bells = 0
+        for ringer_id in ringer_ids:
+            if ringer_id in self._texts:
+                changed_bells |= self._count(ringer_id)
+        has_changed = self._refresh_errors(ringer_ids, changed_bells)
+        return has_changed or self._assigned != old_assigned
+
+    def revalidate(self):
+        """ Rebuild the entire validation state from scratch. """
+        self._counted = dict.fromkeys(self._texts, 0)
+        self._counts = [0] * MAX_BELLS
+        self._assigned = 0
+        self._duplicated = 0
+        for ringer_id in self._texts:
+            self._parse(ringer_id)
+            self._count(ringer_id)
+        self.errors = {r for r in self._texts if self._has_error(r)}
+
+    # ===== VALIDATION =====
+
+    def _parse(self, ringer_id):
+        mask, is_invalid = parse_bells(self._texts[ringer_id], self.size)
+        # Keep the practice's index of which touches each ringer has bells in up to date
+        if bool(mask) != bool(self._masks[ringer_id]):
+            self._practice._set_ringer_has_bells(ringer_id, self, bool(mask))
+        self._masks[ringer_id] = mask
+        if is_invalid:
+            self._invalid.add(ringer_id)
+        else:
+            self._invalid.discard(ringer_id)
+
+    def _count(self, ringer_id):
+        """
+        Makes the counts reflect a ringer's current bells (which are only counted if the ringer is
+        in the room), returning the mask of bells which started or stopped being duplicated.
+        """
+        is_in_room = self._practice.is_in_room(ringer_id)
+        old_mask = self._counted[ringer_id]
+        new_mask = self._masks[ringer_id] if is_in_room else 0
+        if old_mask == new_mask:
+            return 0
+        self._counted[ringer_id] = new_mask
+
+        counts = self._counts
+        changed_bells = 0
+        for b in bells_in_mask(old_mask & ~new_mask):
+            counts[b] -= 1
+            if counts[b] == 0:
+                self._assigned &= ~(1 << b)
+            elif counts[b] == 1:
+                self._duplicated &= ~(1 << b)
+                changed_bells |= 1 << b
+        for b in bells_in_mask(new_mask & ~old_mask):
+            counts[b] += 1
+            if counts[b] == 1:
+                self._assigned |= 1 << b
+            elif counts[b] == 2:
+                self._duplicated |= 1 << b
+                changed_bells |= 1 << b
+        return changed_bells
+
+    def _has_error(self, ringer_id):
+        if ringer_id in self._invalid:
+            return True
+        # If bells are assigned to a ringer who's left the tower, then that's also an error
+        if self._masks[ringer_id] and not self._practice.is_in_room(ringer_id):
+            return True
+        # Bells which are assigned to more than one ringer are errors
+        return self._counted[ringer_id] & self._duplicated != 0
+
+    def _refresh_errors(self, ringer_ids, changed_bells):
+        """
+        Recheck the errors of the given ringers, plus anyone ringing a bell whose duplication has
+        changed.  Returns `True` if any ringer's errors have changed.
+        """
+        to_check = set(ringer_ids)
+        if changed_bells:
+            to_check.update(r for r, mask in self._counted.items() if mask & changed_bells)
+
+        has_changed = False
+        for ringer_id in to_check:
+            if ringer_id not in self._texts:
+                continue
+            has_error = self._has_error(ringer_id)
+            if has_error != (ringer_id in self.errors):
+                if has_error:
+                    self.errors.add(ringer_id)
+                else:
+                    self.errors.discard(ringer_id)
+                has_changed = True
+        return has_changed
+
+
+class Practice:
+    """ A whole practice: the ringers (in column order) and the touches (in row order). """
+
+    __slots__ = (
+        "ringers", "touches", "archived_rung", "archived_bells", "_ringer_touches",
+        "_next_touch_id", "_next_placeholder_id",
+    )
+
+    def __init__(self):
+        # Maps ringer IDs to Ringers
+        self.ringers = {}
+        self.touches = []
+        # What the touches which have been archived still count for when allocating bells fairly
+        # (see `allocation`): a map from ringer IDs to how many archived touches they rang, and a
+        # map from each bell mode to maps from ringer IDs to the bells they rang in that mode
+        self.archived_rung = {}
+        self.archived_bells = {mode: {} for mode in BELL_MODES}
+        # A reverse index mapping ringer IDs to the set of TouchPlans which have bells assigned to
+        # them, so that presence changes only need to revalidate the affected touches
+        self._ringer_touches = {}
+        self._next_touch_id = 0
+        # Ringers who are known by name but haven't been seen in the tower (e.g. from a restored
+        # practice) are given negative IDs, since Ringing Room's user IDs are all positive
+        self._next_placeholder_id = -1
+
+    def is_in_room(self, ringer_id):
+        ringer = self.ringers.get(ringer_id)
+        return ringer is not None and ringer.is_in_room
+
+    def add_ringer(self, ringer_id, name, is_in_room=True):
+        """ Adds a new ringer to the practice, with empty bells in every touch. """
+        ringer = Ringer(ringer_id, name, is_in_room)
+        self.ringers[ringer_id] = ringer
+        for t in self.touches:
+            t.add_ringer(ringer_id)
+        return ringer
+
+    def add_placeholder_ringer(self, name):
+        """ Adds a ringer who isn't in the tower, and so doesn't have a Ringing Room user ID. """
+        ringer_id = self._next_placeholder_id
+        self._next_placeholder_id -= 1
+        return self.add_ringer(ringer_id, name, is_in_room=False)
+
+    def find_ringer(self, name):
+        """ Finds a ringer by name (preferring ringers who are in the room), or returns None. """
+        found = None
+        for ringer in self.ringers.values():
+            if ringer.name != name:
+                continue
+            if found is None or (ringer.is_in_room and not found.is_in_room):
+                found = ringer
+        return found
+
+    def departed_ringers(self):
+        """
+        The IDs of the ringers who have been in the tower and have since left.  Placeholder ringers
+        (e.g. from a restored practice) haven't been in the tower yet, so aren't included.
+        """
+        # Placeholders are the only ringers with negative IDs
+        return [r for r, ringer in self.ringers.items() if r >= 0 and not ringer.is_in_room]
+
+    def rename_ringer(self, old_id, new_id):
+        """
+        Gives a ringer a new ID, keeping their column and bells.  This is used to reattach a ringer
+        to a new Ringing Room user (e.g. someone who left and rejoined as a guest).
+        """
+        self.ringers = {
+            (new_id if ringer_id == old_id else ringer_id): ringer
+            for ringer_id, ringer in self.ringers.items()
+        }
+        self.ringers[new_id].id = new_id
+        for t in self.touches:
+            t.rename_ringer(old_id, new_id)
+        for index in (self._ringer_touches, self.archived_rung, *self.archived_bells.values()):
+            if old_id in index:
+                index[new_id] = index.pop(old_id)
+
+    def remove_ringer(self, ringer_id):
+        """
+        Removes a ringer (and their column) from the practice, e.g. once they have left for good.
+        Returns the list of TouchPlans whose errors or bells left have changed.
+        """
+        changed = [t for t in self.touches if t.remove_ringer(ringer_id)]
+        del self.ringers[ringer_id]
+        for index in (self._ringer_touches, self.archived_rung, *self.archived_bells.values()):
+            index.pop(ringer_id, None)
+        return changed
+
+    def set_in_room(self, ringer_id, is_in_room):
+        """
+        Record that a ringer has entered or left the room.  The touches aren't updated until
+        `update_presence` is called, so that bursts of presence changes can be batched.
+        """
+        self.ringers[ringer_id].is_in_room = is_in_room
+
+    def update_presence(self, ringer_ids):
+        """
+        Update the touches after the given ringers have entered or left, returning the list of
+        TouchPlans whose errors or bells left have changed.
+        """
+        # Only touches which have bells assigned to these ringers can have changed
+        touches_to_update = {}
+        for r in ringer_ids:
+            for t in self._ringer_touches.get(r, ()):
+                touches_to_update.setdefault(t, []).append(r)
+        return [t for t, ringers in touches_to_update.items() if t.update_ringers(ringers)]
+
+    def add_touch(self):
+        """ Adds a new touch to the end of the practice, copying the size and mode of the last. """
+        last_touch = self.touches[-1] if self.touches else None
+        touch = TouchPlan(
+            self,
+            self._next_touch_id,
+            DEFAULT_SIZE if last_touch is None else last_touch.size,
+            TOWER if last_touch is None else last_touch.bell_mode,
+        )
+        self._next_touch_id += 1
+        self.touches.append(touch)
+        return touch
+
+    def remove_touches(self, plans):
+        """ Removes some touches from the practice. """
+        removed = set(plans)
+        self.touches = [t for t in self.touches if t not in removed]
+        for touches in self._ringer_touches.values():
+            touches -= removed
+
+    def archive_touches(self, plans):
+        """
+        Removes some touches from the practice, but remembers who rang which bells in them, so that
+        they still count towards a fair allocation.
+        """
+        for plan in plans:
+            bells = self.archived_bells[plan.bell_mode]
+            for r in self.ringers:
+                mask = plan.bells(r)
+                if mask:
+                    self.archived_rung[r] = self.archived_rung.get(r, 0) + 1
+                    bells[r] = bells.get(r, 0) | mask
+        self.remove_touches(plans)
+
+    def swap_touches(self, i):
+        """ Swaps the touches at indices `i` and `i + 1`. """
+        self.touches[i], self.touches[i + 1] = self.touches[i + 1], self.touches[i]
+
+    def _set_ringer_has_bells(self, ringer_id, touch, has_bells):
+        """ Record whether or not a given touch has bells assigned to a given ringer. """
+        touches = self._ringer_touches.setdefault(ringer_id, set())
+        if has_bells:
+            touches.add(touch)
+        else:
+            touches.discard(touch)
@@ -0,0 +1,282 @@
+"""
+Saving practices to disk, so that a crash (or a laptop going to sleep) in the middle of a practice
+doesn't lose the plan.  A practice is saved as a journal of JSON lines, where each line is one of:
+
+    {"touches": [<touch>, ...]}    a snapshot of every touch, in order
+    {"touch": <touch>}             the new contents of a single touch
+    {"order": [<touch id>, ...]}   the new order of the touches
+
+and each <touch> looks like:
+
+    {"id": 3, "size": 8, "mode": "Tower", "done": false, "notes": "...",
+     "bells": [[4, "Alice", "12"], ...]}
+
+Each cell is stored with both the ringer's ID and their name.  Ringing Room doesn't make names
+unique, so the ID tells apart ringers with the same name, but IDs change between sessions, so the
+name is what reattaches a saved practice to whoever is in the tower when it is restored.  (Older
+journals stored `bells` as a map from names to text, which can still be read.)
+
+Journal lines are written by a background thread, so the Tk thread never waits for the disk, and
+the journal is compacted back into a single snapshot once it gets long.
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+
+from practice import BELL_MODES, SIZES
+
+""" The directory where practices are autosaved. """
+AUTOSAVE_DIR = os.path.join(os.path.expanduser("~"), ".minor_general")
+"""
+Autosaves older than this (in seconds) are from a previous practice, not one which has crashed, and
+so aren't restored.
+"""
+RESTORE_MAX_AGE = 12 * 60 * 60
+""" The number of journal lines after which the journal is compacted into a new snapshot. """
+COMPACT_AFTER = 500
+
+
+def autosave_path(tower_id):
+    """ The path of the autosave file for a given tower. """
+    return os.path.join(AUTOSAVE_DIR, f"practice-{tower_id}.jsonl")
+
+
+# ===== CONVERTING TOUCHES =====
+
+def touch_record(practice, plan):
+    """ Converts a TouchPlan into a JSON-able dict, with the ringers stored by ID and name. """
+    return {
+        "id": plan.id,
+        "size": plan.size,
+        "mode": plan.bell_mode,
+        "done": plan.is_done,
+        "notes": plan.notes,
+        "bells": [
+            [ringer_id, ringer.name, plan.text(ringer_id)]
+            for ringer_id, ringer in practice.ringers.items()
+            if plan.text(ringer_id) != ""
+        ],
+    }
+
+
+def restore(practice, records):
+    """
+    Adds saved touches to the end of a practice in one batch, returning the new TouchPlans.  Every
+    saved ringer is matched to a different ringer in the practice by name (preferring the same ID),
+    and ringers who aren't there yet are added as placeholders (to be reattached when they enter
+    the tower).  Cells which are malformed are skipped.
+    """
+    # Maps saved ringer IDs (or names, for older journals) to the ringers they've been matched to
+    matched = {}
+    claimed = set()
+
+    def match(saved_id, name):
+        ringer = matched.get(saved_id)
+        if ringer is not None:
+            return ringer
+        ringer = practice.ringers.get(saved_id)
+        if ringer is None or ringer.name != name or ringer.id in claimed:
+            # Prefer ringers in the room, as `Practice.find_ringer` does
+            candidates = [
+                r for r in practice.ringers.values() if r.name == name and r.id not in claimed
+            ]
+            candidates.sort(key=lambda r: not r.is_in_room)
+            ringer = candidates[0] if candidates else practice.add_placeholder_ringer(name)
+        matched[saved_id] = ringer
+        claimed.add(ringer.id)
+        return ringer
+
+    plans = []
+    for record in records:
+        plan = practice.add_touch()
+        if record.get("size") in SIZES:
+            plan.size = record["size"]
+        if record.get("mode") in BELL_MODES:
+            plan.bell_mode = record["mode"]
+        plan.is_done = bool(record.get("done", False))
+        notes = record.get("notes", "")
+        plan.notes = notes if isinstance(notes, str) else ""
+
+        bells = record.get("bells", [])
+        if isinstance(bells, dict):
+            bells = [[name, name, text] for name, text in bells.items()]
+        elif not isinstance(bells, list):
+            bells = []
+        texts = {}
+        for cell in bells:
+            # A corrupted cell is skipped, rather than losing the whole practice
+            if not _is_cell(cell):
+                continue
+            saved_id, name, text = cell
+            texts[match(saved_id, name).id] = text
+        # Apply all the cells at once, and only validate the touch once
+        plan.set_texts(texts)
+        plans.append(plan)
+    return plans
+
+
+def _is_cell(cell):
+    """ Whether or not a saved cell has the form `[ringer ID, name, text]`. """
+    return (
+        isinstance(cell, list)
+        and len(cell) == 3
+        and isinstance(cell[0], (int, str))
+        and isinstance(cell[1], str)
+        and isinstance(cell[2], str)
+    )
+
+
+# ===== READING JOURNALS =====
+
+def read_journal(path):
+    """ Replays a journal file, returning the list of touch records in order. """
+    # Maps touch IDs to their latest records
+    touches = {}
+    order = []
+    with open(path) as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # The last line can be half-written if the program died while writing it
+                break
+            if "touches" in entry:
+                touches = {t["id"]: t for t in entry["touches"]}
+                order = [t["id"] for t in entry["touches"]]
+            elif "touch" in entry:
+                touches[entry["touch"]["id"]] = entry["touch"]
+            elif "order" in entry:
+                order = entry["order"]
+    return [touches[i] for i in order if i in touches]
+
+
+def read_autosave(path):
+    """
+    Returns the touch records of a recent autosave, or None if there isn't one.  An autosave which
+    is too old to restore is moved out of the way, so that it doesn't get overwritten.
+    """
+    try:
+        age = time.time() - os.path.getmtime(path)
+    except OSError:
+        return None
+    if age > RESTORE_MAX_AGE:
+        try:
+            os.replace(path, path + ".old")
+        except OSError as e:
+            # The old practice will be overwritten, but that's no reason not to open the tower
+            print(f"Couldn't move the old autosave {path} out of the way: {e}")
+        return None
+    try:
+        return read_journal(path)
+    except (OSError, KeyError, TypeError) as e:
+        print(f"Couldn't restore the practice from {path}: {e}")
+        return None
+
+
+# ===== WRITING JOURNALS =====
+
+class Journal:
+    """
+    A background thread which appends changes to a journal file.  The writer keeps its own copy of
+    the latest touch records, so that it can compact the journal without asking the Tk thread.
+    """
+
+    def __init__(self, path):
+        self._path = path
+        self._entries = queue.Queue()
+
+        # The writer's copy of the practice, as a map from touch IDs to records plus the order
+        self._touches = {}
+        self._order = []
+        self._num_lines = 0
+        self._file = None
+
+        self._thread = threading.Thread(target=self._run, name="Journal", daemon=True)
+
+    def start(self, records):
+        """ Start the writer, replacing the journal with a snapshot of the given touch records. """
+        self._entries.put({"touches": records})
+        self._thread.start()
+
+    def stop(self):
+        """ Write everything which has been queued, and then stop the writer. """
+        self._entries.put(None)
+        self._thread.join()
+
+    def write_touches(self, records):
+        """ Record the new contents of some touches. """
+        for record in records:
+            self._entries.put({"touch": record})
+
+    def write_order(self, touch_ids):
+        """ Record the new order of the touches. """
+        self._entries.put({"order": list(touch_ids)})
+
+    def _run(self):
+        is_running = True
+        while is_running:
+            entries = [self._entries.get()]
+            # Write everything that's been queued in one go, so there's only one flush
+            while True:
+                try:
+                    entries.append(self._entries.get_nowait())
+                except queue.Empty:
+                    break
+
+            lines = []
+            # The journal is replaced by a snapshot when one is queued, or when it gets too long
+            needs_snapshot = False
+            for entry in entries:
+                if entry is None:
+                    is_running = False
+                    continue
+                self._apply(entry)
+                if "touches" in entry:
+                    needs_snapshot = True
+                else:
+                    lines.append(json.dumps(entry, separators=(",", ":")))
+            if self._file is None or self._num_lines + len(lines) > COMPACT_AFTER:
+                needs_snapshot = True
+
+            try:
+                if needs_snapshot:
+                    self._write_snapshot()
+                elif lines:
+                    self._file.write("\n".join(lines) + "\n")
+                    self._file.flush()
+                    os.fsync(self._file.fileno())
+                    self._num_lines += len(lines)
+            except OSError as e:
+                print(f"Couldn't autosave the practice: {e}")
+        if self._file is not None:
+            self._file.close()
+
+    def _apply(self, entry):
+        if "touches" in entry:
+            self._touches = {t["id"]: t for t in entry["touches"]}
+            self._order = [t["id"] for t in entry["touches"]]
+        elif "touch" in entry:
+            self._touches[entry["touch"]["id"]] = entry["touch"]
+        elif "order" in entry:
+            self._order = entry["order"]
+
+    def _write_snapshot(self):
+        """ Atomically replace the journal with a single snapshot of the current touches. """
+        records = [self._touches[i] for i in self._order if i in self._touches]
+        # Forget the touches which have been removed from the practice
+        self._touches = {r["id"]: r for r in records}
+        os.makedirs(os.path.dirname(self._path) or ".", exist_ok=True)
+        temp_path = self._path + ".tmp"
+        with open(temp_path, "w") as f:
+            f.write(json.dumps({"touches": records}, separators=(",", ":")) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self._path)
+
+        if self._file is not None:
+            self._file.close()
+        self._file = open(self._path, "a")
+        self._num_lines = 0
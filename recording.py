@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Recording real practices, and replaying them offline.  A RecordingTower wraps a tower and writes
+every event it receives and every command sent to it to a log of JSON lines.  The log can then be
+replayed into a `main.Matrix` (through a `fake_tower.FakeTower`) at real time, faster, or as fast
+as possible, to reproduce a laggy practice and measure or profile the event handling.
+
+The first line of a log is the tower's state when recording started, and every other line is either
+an event or a command:
+
+    {"tower_id": 123, "tower_name": "...", "size": 8, "bell_type": "Tower",
+     "users": [[4, "Alice"], ...], "assignments": [[0, 4], ...]}
+    {"t": 1.234, "event": "user_enter", "args": [5, "Bob"]}
+    {"t": 1.301, "command": "assign", "args": [5, 1]}
+
+where `t` is the number of seconds since recording started, and bells are 0-indexed `int`s.  When
+the tower is resynchronised after reconnecting, the snapshot is logged as the arguments of a
+'resync' event, in the same form as the header's users and assignments.
+
+Example:
+    python recording.py practice.jsonl --speed 10 --stats-output replay.csv
+"""
+
+import argparse
+import json
+import threading
+import time
+
+from belltower import Bell, BellType
+
+import stats
+from fake_tower import FakeTower
+
+""" The replay speed which means 'as fast as possible'. """
+MAX_SPEED = "max"
+""" How often (in ms) the replay checks whether every event has been delivered. """
+REPLAY_POLL_INTERVAL = 50
+
+
+# ===== RECORDING =====
+
+class RecordingTower:
+    """
+    A wrapper around a `RingingRoomTower` which logs every event and command.  Anything which isn't
+    a command is passed straight through to the tower, so this can be used in its place.
+    """
+
+    def __init__(self, tower, path):
+        self._tower = tower
+        self._path = path
+        self._file = None
+        self._lock = threading.Lock()
+        self._start_time = None
+
+    def __getattr__(self, name):
+        return getattr(self._tower, name)
+
+    def wait_loaded(self):
+        """ Wait for the tower to load, then start recording from its current state. """
+        self._tower.wait_loaded()
+
+        tower = self._tower
+        header = {
+            "tower_id": tower.tower_id,
+            "tower_name": tower.tower_name,
+            "size": tower.number_of_bells,
+            "bell_type": tower.bell_type.ringingroom_name(),
+        }
+        header["users"], header["assignments"] = self._snapshot()
+        self._file = open(self._path, "w")
+        self._file.write(json.dumps(header) + "\n")
+        self._start_time = time.monotonic()
+
+        # These are added before anyone else's callbacks, so events are logged before handling
+        tower.on_user_enter(self._on_user_enter)
+        tower.on_user_leave(self._on_user_leave)
+        tower.on_assign(self._on_assign)
+        tower.on_unassign(self._on_unassign)
+        tower.on_size_change(self._on_size_change)
+        tower.on_bell_type_change(self._on_bell_type_change)
+        tower.on_set_at_hand(self._on_set_at_hand)
+        tower.on_disconnect(self._on_disconnect)
+        tower.on_resync(self._on_resync)
+
+    # ===== EVENTS =====
+
+    def _on_user_enter(self, user_id, user_name):
+        self._write("event", "user_enter", user_id, user_name)
+
+    def _on_user_leave(self, user_id, user_name):
+        self._write("event", "user_leave", user_id, user_name)
+
+    def _on_assign(self, user_id, _user_name, bell):
+        self._write("event", "assign", user_id, bell.index)
+
+    def _on_unassign(self, bell):
+        self._write("event", "unassign", bell.index)
+
+    def _on_size_change(self, new_size):
+        self._write("event", "size_change", new_size)
+
+    def _on_bell_type_change(self, new_type):
+        self._write("event", "bell_type_change", new_type.ringingroom_name())
+
+    def _on_set_at_hand(self):
+        self._write("event", "set_at_hand")
+
+    def _on_disconnect(self):
+        self._write("event", "disconnect")
+
+    def _on_resync(self):
+        self._write("event", "resync", *self._snapshot())
+
+    # ===== COMMANDS =====
+
+    def set_at_hand(self):
+        self._write("command", "set_at_hand")
+        self._tower.set_at_hand()
+
+    def set_size(self, number):
+        self._write("command", "set_size", number)
+        self._tower.set_size(number)
+
+    def set_bell_type(self, new_type):
+        self._write("command", "set_bell_type", new_type.ringingroom_name())
+        self._tower.set_bell_type(new_type)
+
+    def assign(self, user_id, bell):
+        self._write("command", "assign", user_id, bell.index)
+        self._tower.assign(user_id, bell)
+
+    def unassign(self, bell):
+        self._write("command", "unassign", bell.index)
+        self._tower.unassign(bell)
+
+    def unassign_all(self):
+        self._write("command", "unassign_all")
+        self._tower.unassign_all()
+
+    # ===== HELPER FUNCTIONS =====
+
+    def _snapshot(self):
+        """ The tower's users and assignments, as lists of [user_id, name] and [bell, user_id]. """
+        tower = self._tower
+        users = [[u, name] for u, name in tower.all_users.items()]
+        assignments = []
+        for b in range(tower.number_of_bells):
+            user_id = tower.get_assignment(Bell.from_index(b))
+            if user_id is not None:
+                assignments.append([b, user_id])
+        return (users, assignments)
+
+    def _write(self, kind, name, *args):
+        """ Log an event or command.  This is called from the socket-io and loader threads. """
+        with self._lock:
+            if self._file is None:
+                return
+            t = round(time.monotonic() - self._start_time, 6)
+            entry = {"t": t, kind: name, "args": list(args)}
+            self._file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+
+    # ===== ENTER/EXIT FOR 'WITH' BLOCKS =====
+
+    def __enter__(self):
+        self._tower.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        try:
+            return self._tower.__exit__(exc_type, exc_val, exc_tb)
+        finally:
+            with self._lock:
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+
+
+# ===== REPLAYING =====
+
+def read_recording(path):
+    """ Reads a log, returning the header and the list of events (ignoring the commands). """
+    with open(path) as f:
+        header = json.loads(f.readline())
+        events = []
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # The last line can be half-written if the program died while writing it
+                break
+            if "event" in entry:
+                events.append(entry)
+    return (header, events)
+
+
+def make_replay_tower(header):
+    """ Creates a FakeTower in the state that a recording started in. """
+    return FakeTower(
+        tower_id=header["tower_id"],
+        tower_name=header["tower_name"],
+        size=header["size"],
+        bell_type=BellType.from_ringingroom_name(header["bell_type"]),
+        users={user_id: name for user_id, name in header["users"]},
+        assignments={bell: user_id for bell, user_id in header["assignments"]},
+    )
+
+
+def schedule_replay(tower, events, speed):
+    """
+    Schedule recorded events to be sent by a FakeTower, at `speed` times real time (or all at once
+    if `speed` is `MAX_SPEED`).
+    """
+    for event in events:
+        delay = 0.0 if speed == MAX_SPEED else event["t"] / speed
+        args = event["args"]
+        if event["event"] == "bell_type_change":
+            args = [BellType.from_ringingroom_name(args[0])]
+        tower.simulate(event["event"], *args, delay=delay)
+
+
+def replay(path, speed):
+    """ Replays a recording into a Matrix, returning a dict of the throughput of the replay. """
+    import tkinter as tk
+    from main import Matrix
+
+    header, events = read_recording(path)
+    print(f"Replaying {len(events)} events from tower #{header['tower_id']} at {speed}x")
+
+    with make_replay_tower(header) as tower:
+        window = tk.Tk()
+        window.title("Minor General replay")
+        matrix = Matrix(window, tower)
+        matrix.pack(expand=True, fill=tk.BOTH)
+        stall_monitor = stats.StallMonitor(window)
+        stall_monitor.start()
+        window.update()
+
+        def poll():
+            # Stop once every event has been delivered and handled
+            if tower.wait_idle(timeout=0) and matrix.events.is_idle:
+                window.update_idletasks()
+                window.quit()
+            else:
+                window.after(REPLAY_POLL_INTERVAL, poll)
+
+        start = time.perf_counter()
+        schedule_replay(tower, events, speed)
+        poll()
+        window.mainloop()
+        duration = time.perf_counter() - start
+
+        stall_monitor.stop()
+        matrix.close()
+        window.destroy()
+
+    return {
+        "events": len(events),
+        "recorded_seconds": events[-1]["t"] if events else 0.0,
+        "replay_seconds": duration,
+        "events_per_second": len(events) / duration if duration > 0 else None,
+    }
+
+
+def parse_speed(text):
+    return MAX_SPEED if text == MAX_SPEED else float(text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded practice into Minor General.")
+    parser.add_argument("path", help="The log written by `main.py --record`")
+    parser.add_argument("--speed", type=parse_speed, default=1.0,
+                        help="How many times faster than real time to replay (or 'max')")
+    parser.add_argument(
+        "--stats-output",
+        help="File to write the timings to (as CSV if it ends in '.csv', otherwise JSON)"
+    )
+    parser.add_argument("--profile", help="File to write a cProfile of the replay to")
+    args = parser.parse_args()
+
+    profiler = None
+    if args.profile is not None:
+        profiler = stats.SessionProfiler(args.profile)
+        profiler.start()
+    result = replay(args.path, args.speed)
+    if profiler is not None:
+        profiler.stop()
+
+    print(json.dumps(result, indent=2))
+    for name, summary in stats.summaries().items():
+        print(f"{name}: {summary}")
+    if args.stats_output is not None:
+        stats.dump(args.stats_output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+"""
+Lightweight instrumentation, to show where the time goes during a practice.  Durations are recorded
+into named histograms (from any thread), which can be shown live in a StatsPanel and dumped to
+JSON or CSV when the program exits.  Recording a duration is a couple of dict lookups and integer
+operations, so the hot paths are always instrumented.  Only the StatsPanel needs Tk, so the rest
+can be used by headless code.
+
+The metrics recorded are:
+    touch_update     editing a touch, including re-validating it
+    user_enter/leave handling a user entering or leaving the tower
+    presence_flush   updating the touches after a burst of presence changes
+    rtt_<command>    the round trip of a tower command (e.g. `rtt_assign`), until its echo arrives
+    load_to_ready    the time from a touch being queued to it being fully loaded
+    allocation       suggesting an allocation of bells for every touch which hasn't been rung
+    tk_stall         how late the Tk event loop was in running a regular heartbeat
+    reconnect        the time from the connection dropping to the tower being resynchronised
+    resync           reconciling the practice with the tower's state after reconnecting
+    event_lag        the time from a tower callback to its event being handled on the Tk thread
+    event_batch      handling one batch of tower events on the Tk thread (see `tower_events`)
+    event_overflow   a tower event being dropped, recording how long since the queue was drained
+    import_<module>  importing a module (and everything it imports) while the program starts
+    startup_<stage>  how long after the program started it reached a stage, e.g. `first_window`
+"""
+
+import builtins
+import contextlib
+import cProfile
+import csv
+import json
+import sys
+import threading
+import time
+
+"""
+The upper bounds (in seconds) of the histogram buckets, which double from 10us to about 20s.  Any
+longer durations go in one final bucket.
+"""
+BUCKET_BOUNDS = [0.00001 * 2 ** i for i in range(22)]
+""" The percentiles shown in summaries. """
+PERCENTILES = [50, 90, 99]
+
+"""
+When the program started, or at least when this module was first imported (so programs which want
+to measure their startup should import it first).
+"""
+START_TIME = time.perf_counter()
+
+""" How often (in ms) the Tk heartbeat runs, and how often the StatsPanel refreshes. """
+HEARTBEAT_INTERVAL = 100
+PANEL_REFRESH_INTERVAL = 1000
+
+
+class Histogram:
+    """
+    A histogram of durations, in exponentially-sized buckets so that it takes constant memory and
+    constant time per sample.  Percentiles are estimated as the upper bound of their bucket.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self._buckets = [0] * (len(BUCKET_BOUNDS) + 1)
+
+    def record(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if self.min is None or seconds < self.min:
+            self.min = seconds
+        if self.max is None or seconds > self.max:
+            self.max = seconds
+        # The bounds double, so the bucket can be found from the ratio to the first bound
+        ratio = seconds / BUCKET_BOUNDS[0]
+        index = int(ratio - 1e-9).bit_length() if ratio > 1 else 0
+        self._buckets[min(index, len(BUCKET_BOUNDS))] += 1
+
+    def percentile(self, p):
+        if self.count == 0:
+            return None
+        rank = self.count * p / 100
+        seen = 0
+        for i, n in enumerate(self._buckets):
+            seen += n
+            if seen >= rank and n > 0:
+                bound = BUCKET_BOUNDS[i] if i < len(BUCKET_BOUNDS) else self.max
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self):
+        """ A dict of the count and the interesting durations, in milliseconds. """
+        def ms(seconds):
+            return None if seconds is None else round(seconds * 1000, 3)
+
+        summary = {
+            "count": self.count,
+            "mean_ms": ms(self.total / self.count) if self.count else None,
+            "min_ms": ms(self.min),
+        }
+        for p in PERCENTILES:
+            summary[f"p{p}_ms"] = ms(self.percentile(p))
+        summary["max_ms"] = ms(self.max)
+        return summary
+
+
+# ===== THE GLOBAL REGISTRY =====
+
+_lock = threading.Lock()
+# Maps metric names to Histograms
+_histograms = {}
+
+
+def record(name, seconds):
+    """ Record a duration (in seconds) for a given metric.  Can be called from any thread. """
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = Histogram()
+        histogram.record(seconds)
+
+
+@contextlib.contextmanager
+def timed(name):
+    """ A context manager which records how long its body takes. """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+
+def summaries():
+    """ Returns a map from metric names to their summaries, sorted by name. """
+    with _lock:
+        return {name: _histograms[name].summary() for name in sorted(_histograms)}
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+
+
+def dump(path):
+    """ Write every metric's summary to a file (CSV if the path ends in '.csv', otherwise JSON). """
+    all_summaries = summaries()
+    with open(path, "w", newline="") as f:
+        if path.lower().endswith(".csv"):
+            columns = ["count", "mean_ms", "min_ms"]
+            columns += [f"p{p}_ms" for p in PERCENTILES] + ["max_ms"]
+            writer = csv.writer(f)
+            writer.writerow(["metric"] + columns)
+            for name, summary in all_summaries.items():
+                writer.writerow([name] + [summary[c] for c in columns])
+        else:
+            json.dump(all_summaries, f, indent=2)
+            f.write("\n")
+
+
+# ===== STARTUP TIMING =====
+
+def mark_startup(stage):
+    """ Record how long after the program started it reached a stage, as `startup_<stage>`. """
+    record(f"startup_{stage}", time.perf_counter() - START_TIME)
+
+
+def startup_report():
+    """ The lines of a report of the import and startup times, slowest imports first. """
+    all_summaries = summaries()
+    imports = sorted(
+        ((name, s["max_ms"]) for name, s in all_summaries.items() if name.startswith("import_")),
+        key=lambda item: -item[1],
+    )
+    stages = sorted(
+        ((name, s["min_ms"]) for name, s in all_summaries.items() if name.startswith("startup_")),
+        key=lambda item: item[1],
+    )
+    return [f"{name:<32}{ms:>10.1f}ms" for name, ms in imports + stages]
+
+
+class ImportTimer:
+    """
+    Records how long every new top-level import takes (including everything that it imports), by
+    wrapping `__import__` until stopped.  Nested imports are counted in the module which imported
+    them, so the times add up to the total import time.
+    """
+
+    def __init__(self):
+        self._original_import = builtins.__import__
+        # Each thread has its own depth of nested imports
+        self._local = threading.local()
+
+    def start(self):
+        builtins.__import__ = self._import
+
+    def stop(self):
+        if builtins.__import__ == self._import:
+            builtins.__import__ = self._original_import
+
+    def _import(self, name, *args, **kwargs):
+        depth = getattr(self._local, "depth", 0)
+        # Imports of modules which are already loaded are just dict lookups, so aren't timed
+        is_timed = depth == 0 and name not in sys.modules
+        self._local.depth = depth + 1
+        start = time.perf_counter()
+        try:
+            return self._original_import(name, *args, **kwargs)
+        finally:
+            self._local.depth = depth
+            if is_timed:
+                record(f"import_{name}", time.perf_counter() - start)
+
+
+# ===== TK INSTRUMENTATION =====
+
+class StallMonitor:
+    """
+    Measures how responsive the Tk event loop is, by scheduling a heartbeat every
+    `HEARTBEAT_INTERVAL` ms and recording how late each one runs.
+    """
+
+    def __init__(self, widget):
+        self._widget = widget
+        self._expected = None
+        self._after_id = None
+
+    def start(self):
+        self._schedule()
+
+    def stop(self):
+        if self._after_id is not None:
+            self._widget.after_cancel(self._after_id)
+            self._after_id = None
+
+    def _schedule(self):
+        self._expected = time.perf_counter() + HEARTBEAT_INTERVAL / 1000
+        self._after_id = self._widget.after(HEARTBEAT_INTERVAL, self._beat)
+
+    def _beat(self):
+        record("tk_stall", max(0.0, time.perf_counter() - self._expected))
+        self._schedule()
+
+
+class StatsPanel:
+    """ A window which shows a live table of every metric's summary. """
+
+    def __init__(self, parent, font=None):
+        import tkinter as tk
+
+        self._window = tk.Toplevel(parent)
+        self._window.title("Minor General statistics")
+        self._text = tk.Text(self._window, width=96, height=14, font=font or "TkFixedFont")
+        self._text.pack(expand=True, fill=tk.BOTH)
+        self._refresh()
+
+    def _refresh(self):
+        # Stop refreshing once the user has closed the panel
+        if not self._window.winfo_exists():
+            return
+        headings = ["count", "mean", "p50", "p90", "p99", "max"]
+        lines = [f"{'metric':<20}" + "".join(f"{h:>12}" for h in headings)]
+        for name, summary in summaries().items():
+            values = [summary["count"], summary["mean_ms"]]
+            values += [summary[f"p{p}_ms"] for p in PERCENTILES] + [summary["max_ms"]]
+            lines.append(f"{name:<20}" + "".join(
+                f"{v:>12}" if isinstance(v, int) else f"{v:>10.3f}ms" for v in values
+            ))
+        self._text.delete("1.0", "end")
+        self._text.insert("end", "\n".join(lines))
+        self._window.after(PANEL_REFRESH_INTERVAL, self._refresh)
+
+
+# ===== PROFILING =====
+
+class SessionProfiler:
+    """ Runs cProfile over the Tk thread for a whole session, writing the stats when stopped. """
+
+    def __init__(self, path):
+        self._path = path
+        self._profile = cProfile.Profile()
+
+    def start(self):
+        self._profile.enable()
+
+    def stop(self):
+        self._profile.disable()
+        self._profile.dump_stats(self._path)
+        print(f"Wrote profile to {self._path} (view it with `python -m pstats {self._path}`)")
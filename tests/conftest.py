@@ -0,0 +1,9 @@
+"""
+The program's modules live at the top level of the repository rather than in a package, so make
+them importable from the tests.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
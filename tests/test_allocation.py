@@ -0,0 +1,120 @@
+from allocation import Preferences, suggest
+from practice import HAND, TOWER, Practice
+
+
+def make_practice(num_ringers):
+    practice = Practice()
+    for ringer_id in range(1, num_ringers + 1):
+        practice.add_ringer(ringer_id, f"Ringer {ringer_id}")
+    return practice
+
+
+def apply(practice, preferences, plans):
+    suggestion = suggest(practice, preferences, plans)
+    suggestion.apply(practice)
+    return suggestion
+
+
+def test_empty_touch_is_filled():
+    practice = make_practice(8)
+    touch = practice.add_touch()
+    apply(practice, Preferences(), [touch])
+    assert touch.is_valid
+    assert touch.bells_left == 0
+    assert sorted(touch.assignments()) == list(range(8))
+
+
+def test_existing_bells_are_kept():
+    practice = make_practice(8)
+    touch = practice.add_touch()
+    touch.set_text(1, "8")
+    suggestion = suggest(practice, Preferences(), [touch])
+    assert suggestion.text(touch.id, 1) is None
+    suggestion.apply(practice)
+    assert touch.text(1) == "8"
+    assert touch.bells_left == 0
+
+
+def test_bells_of_ringers_who_left_are_reallocated():
+    practice = make_practice(9)
+    touch = practice.add_touch()
+    for ringer_id in range(1, 9):
+        touch.set_text(ringer_id, str(ringer_id))
+    practice.set_in_room(3, False)
+    practice.update_presence([3])
+    assert touch.errors == {3}
+
+    apply(practice, Preferences(), [touch])
+    assert touch.is_valid
+    assert touch.text(3) == ""
+    assert touch.text(9) == "3"
+
+
+def test_ringers_who_have_rung_least_go_first():
+    practice = make_practice(9)
+    rung = practice.add_touch()
+    for ringer_id in range(1, 9):
+        rung.set_text(ringer_id, str(ringer_id))
+    rung.is_done = True
+    practice.archive_touches([rung])
+
+    touch = practice.add_touch()
+    apply(practice, Preferences(), [touch])
+    # Ringer 9 sat out the archived touch, so rings this one
+    assert touch.text(9) != ""
+    assert sum(1 for r in practice.ringers if touch.text(r)) == 8
+
+
+def test_ringers_get_bells_they_have_rung_before():
+    practice = make_practice(2)
+    first = practice.add_touch()
+    first.size = 4
+    first.set_text(1, "4")
+    first.set_text(2, "1")
+    first.is_done = True
+    second = practice.add_touch()
+    apply(practice, Preferences(), [second])
+    assert (second.text(1), second.text(2)) == ("4", "1")
+
+
+def test_handbell_touches_are_allocated_in_pairs():
+    practice = make_practice(3)
+    touch = practice.add_touch()
+    touch.bell_mode = HAND
+    touch.set_size(6)
+    apply(practice, Preferences(), [touch])
+    assert sorted(touch.text(r) for r in practice.ringers) == ["12", "34", "56"]
+
+
+def test_preferences_decide_who_rings():
+    practice = make_practice(3)
+    preferences = Preferences()
+    preferences.set_modes(1, [])
+    preferences.set_modes(2, [HAND])
+    touch = practice.add_touch()
+    touch.set_size(4)
+    apply(practice, preferences, [touch])
+    assert (touch.text(1), touch.text(2), touch.text(3)) == ("", "", "1")
+
+
+def test_preferences_follow_a_rename():
+    preferences = Preferences()
+    preferences.set_modes(1, [TOWER])
+    preferences.rename(1, 10)
+    assert preferences.modes(10) == {TOWER}
+    # The old ID is back to ringing everything
+    assert preferences.modes(1) == {TOWER, HAND}
+    # Renaming a ringer without any preferences changes nothing
+    preferences.rename(2, 20)
+    assert preferences.modes(20) == {TOWER, HAND}
+
+
+def test_apply_skips_removed_ringers():
+    practice = make_practice(2)
+    touch = practice.add_touch()
+    touch.set_size(4)
+    suggestion = suggest(practice, Preferences(), [touch])
+    practice.remove_ringer(2)
+    suggestion.apply(practice)
+    assert touch.text(1) != ""
+    assert 2 not in practice.ringers
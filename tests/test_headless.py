@@ -0,0 +1,104 @@
+import sys
+
+import pytest
+from belltower import Bell
+
+import headless
+import tower_connection
+from fake_tower import FakeTower
+from headless import HeadlessRunner, read_practice_file, run_all
+
+USERS = {1: "Alice", 2: "Bob", 3: "Carol"}
+PLAN = """Size,Notes,Alice,Bob,Carol
+4,First,12,3,4
+4,Second,34,1,2
+4,Third,1,2,34
+"""
+
+
+@pytest.fixture
+def plan_path(tmp_path):
+    path = tmp_path / "plan.csv"
+    path.write_text(PLAN)
+    return str(path)
+
+
+@pytest.fixture
+def tower():
+    with FakeTower(users=USERS, latency=0.001) as tower:
+        yield tower
+
+
+@pytest.fixture
+def runner(tower, plan_path):
+    runner = HeadlessRunner(tower)
+    read_practice_file(runner.practice, plan_path)
+    yield runner
+    runner.close()
+
+
+def assigned_users(tower):
+    return {b.index: u for b, u in tower.server_assignments.items()}
+
+
+def test_touch_is_loaded(runner, tower):
+    assert runner.load(1)
+    assert runner.practice.touches[1].is_done
+    assert tower.number_of_bells == 4
+    assert assigned_users(tower) == {2: 1, 3: 1, 0: 2, 1: 3}
+
+
+def test_run_all_skips_touches_which_are_done(runner, tower):
+    runner.practice.touches[1].is_done = True
+    assert run_all(runner, 0) == 0
+    # Only the first and third touches were loaded, so the tower has the third
+    assert assigned_users(tower) == {0: 1, 1: 2, 2: 3, 3: 3}
+    assert runner.next_index(0) is None
+
+
+def test_touches_with_errors_are_not_loaded(runner, tower, capsys):
+    tower.user_leave(3)
+    tower.wait_idle()
+    tower.reset_calls()
+    assert not runner.load(0)
+    assert tower.calls == []
+    assert "errors in the bells of Carol" in capsys.readouterr().out
+    assert run_all(runner, 0) == 3
+
+
+def test_rejoining_ringer_is_reattached(runner, tower):
+    tower.user_leave(3)
+    tower.user_enter(7, "Carol")
+    tower.wait_idle()
+    assert runner.load(0)
+    assert 3 not in runner.practice.ringers
+    assert tower.get_assignment(Bell.from_index(3)) == 7
+
+
+def test_resync_takes_the_towers_users(runner, tower):
+    tower.simulate("resync", [[1, "Alice"], [2, "Bob"]], [])
+    tower.wait_idle()
+    runner.update_presence()
+    assert not runner.practice.is_in_room(3)
+    assert runner.practice.touches[0].errors == {3}
+
+
+def run_main(monkeypatch, tower, *args):
+    monkeypatch.setattr(tower_connection, "open_tower", lambda _tower_id, _url: tower)
+    monkeypatch.setattr(sys, "argv", ["headless.py", "123456789", *args])
+    return headless.main()
+
+
+@pytest.mark.parametrize("start", ["0", "4"])
+def test_start_outside_the_practice_is_rejected(monkeypatch, plan_path, start, capsys):
+    tower = FakeTower(users=USERS)
+    with pytest.raises(SystemExit) as error:
+        run_main(monkeypatch, tower, plan_path, "--all", "--start", start)
+    assert error.value.code == 2
+    assert "--start must be between 1 and the number of touches (3)" in capsys.readouterr().err
+
+
+def test_main_loads_every_touch(monkeypatch, plan_path):
+    tower = FakeTower(users=USERS, latency=0.001)
+    assert run_main(monkeypatch, tower, plan_path, "--all", "--start", "2") == 0
+    assert assigned_users(tower) == {0: 1, 1: 2, 2: 3, 3: 3}
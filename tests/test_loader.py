@@ -0,0 +1,158 @@
+import time
+
+import pytest
+from belltower import Bell, TOWER_BELLS
+
+import loader
+from fake_tower import FakeTower
+from loader import MAX_RETRIES, LoadError, LoadJob, LoadWorker
+
+USERS = {1: "Alice", 2: "Bob", 3: "Carol"}
+# Users 1-8 ringing bells 0-7
+FULL_BAND_USERS = {u: f"User {u}" for u in range(1, 9)}
+FULL_BAND = {b: b + 1 for b in range(8)}
+
+
+class DroppingTower(FakeTower):
+    """ A FakeTower which drops the first `num_drops` echoes of every command. """
+
+    def __init__(self, num_drops, **kwargs):
+        super().__init__(**kwargs)
+        self.num_drops = num_drops
+        # Maps (handler name, args) to how many times that echo has been dropped
+        self.dropped = {}
+
+    def _echo(self, func, *args):
+        key = (func.__name__, args)
+        if self.dropped.get(key, 0) < self.num_drops:
+            self.dropped[key] = self.dropped.get(key, 0) + 1
+            return
+        super()._echo(func, *args)
+
+
+@pytest.fixture(autouse=True)
+def short_timeouts(monkeypatch):
+    # The echoes come back straight away, so there's no need to wait seconds for a lost one
+    monkeypatch.setattr(loader, "MIN_TIMEOUT", 0.05)
+    monkeypatch.setattr(loader, "MAX_TIMEOUT", 0.2)
+
+
+def run_job(tower, assignments, size=8, progress=None, timeout=10.0):
+    """
+    Loads a touch with a new worker, returning the `(is_complete, error)` it finished with.  If
+    `progress` is given, every progress callback's `(done, total)` is appended to it.
+    """
+    finished = []
+    worker = LoadWorker(tower)
+    worker.start()
+    worker.submit(LoadJob(0, size, TOWER_BELLS, assignments,
+                          on_progress=None if progress is None else lambda *p: progress.append(p),
+                          on_finish=lambda *result: finished.append(result)))
+    deadline = time.monotonic() + timeout
+    while not finished:
+        assert time.monotonic() < deadline, "the load never finished"
+        worker.process_events()
+        time.sleep(0.01)
+    worker.stop()
+    return finished[0]
+
+
+def assigned_users(tower):
+    return {b: tower.get_assignment(Bell.from_index(b)) for b in range(tower.number_of_bells)
+            if tower.get_assignment(Bell.from_index(b)) is not None}
+
+
+def test_only_changed_bells_are_sent():
+    with FakeTower(users=USERS, latency=0.01, assignments={0: 1, 1: 2}) as tower:
+        tower.reset_calls()
+        assert run_job(tower, {0: 1, 1: 3}) == (True, None)
+        assert [name for _, name, _ in tower.calls] == ["set_at_hand", "assign"]
+        assert assigned_users(tower) == {0: 1, 1: 3}
+
+
+def test_lost_echoes_are_resent():
+    with DroppingTower(MAX_RETRIES, users=USERS, latency=0.01) as tower:
+        assert run_job(tower, {0: 1, 1: 2, 2: 3}) == (True, None)
+        assert assigned_users(tower) == {0: 1, 1: 2, 2: 3}
+        # Every assignment was sent once, and then resent until its echo got through
+        assigns = [args for _, name, args in tower.calls if name == "assign"]
+        assert len(assigns) == 3 * (MAX_RETRIES + 1)
+        assert set(assigns) == {(1, 0), (2, 1), (3, 2)}
+
+
+def test_load_fails_after_max_retries():
+    with DroppingTower(MAX_RETRIES + 1, users=USERS, latency=0.01) as tower:
+        is_complete, error = run_job(tower, {0: 1})
+        assert not is_complete
+        assert isinstance(error, LoadError)
+        assigns = [args for _, name, args in tower.calls if name == "assign"]
+        assert assigns == [(1, 0)] * (MAX_RETRIES + 1)
+
+
+def test_resize_waits_for_its_echo():
+    with DroppingTower(1, users=USERS, latency=0.01) as tower:
+        assert run_job(tower, {0: 1, 9: 2}, size=10) == (True, None)
+        names = [name for _, name, _ in tower.calls]
+        # The assignments can't be sent until the tower has been resized
+        assert names[:3] == ["set_at_hand", "set_size", "set_size"]
+        assert tower.number_of_bells == 10
+        assert assigned_users(tower) == {0: 1, 9: 2}
+
+
+def test_full_reset_progress_counts_only_assignments():
+    progress = []
+    with FakeTower(users=FULL_BAND_USERS, latency=0.01, assignments=FULL_BAND) as tower:
+        tower.reset_calls()
+        assert run_job(tower, {0: 1}, progress=progress) == (True, None)
+        assert "unassign_all" in [name for _, name, _ in tower.calls]
+        assert assigned_users(tower) == {0: 1}
+    # The echoes of `unassign_all` aren't part of the total, so the progress never passes it
+    assert progress == [(0, 1), (1, 1)]
+
+
+# ===== QUEUEING =====
+
+def test_jobs_run_in_order_and_cancelled_jobs_are_skipped():
+    finished = []
+    with FakeTower(users=USERS, latency=0.01) as tower:
+        worker = LoadWorker(tower)
+        jobs = [
+            LoadJob(i, 8, TOWER_BELLS, {0: i + 1},
+                    on_finish=lambda *result, i=i: finished.append((i,) + result))
+            for i in range(3)
+        ]
+        jobs[1].cancel()
+        for job in jobs:
+            worker.submit(job)
+        worker.start()
+        deadline = time.monotonic() + 10.0
+        while len(finished) < 3:
+            assert time.monotonic() < deadline, "the loads never finished"
+            worker.process_events()
+            time.sleep(0.01)
+        worker.stop()
+        assert finished == [(0, True, None), (1, False, None), (2, True, None)]
+        assert assigned_users(tower) == {0: 3}
+        assert [args for _, name, args in tower.calls if name == "assign"] == [(1, 0), (3, 0)]
+
+
+def test_prefetched_plan_is_only_used_if_the_tower_has_not_changed():
+    with FakeTower(users=USERS, latency=0.01) as tower:
+        worker = LoadWorker(tower)
+        plan, version = worker.plan(8, TOWER_BELLS, {0: 1})
+        assert plan.ops[1:] == [("assign", 1, 0)]
+        # Someone else assigns the bell before the job runs, so the plan is out of date
+        tower.simulate("assign", 1, 0)
+        tower.wait_idle()
+        assert worker.tower_version != version
+
+        finished = []
+        worker.submit(LoadJob(0, 8, TOWER_BELLS, {0: 1}, plan=plan, plan_version=version,
+                              on_finish=lambda *result: finished.append(result)))
+        worker.start()
+        while not finished:
+            worker.process_events()
+            time.sleep(0.01)
+        worker.stop()
+        assert finished == [(True, None)]
+        assert [name for _, name, _ in tower.calls] == ["set_at_hand"]
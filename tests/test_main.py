@@ -0,0 +1,133 @@
+"""
+Tests of the Matrix, which need Tk (and so a display).  The tower's events are passed straight to
+the Matrix's handlers rather than through its EventBus, and `root.update()` runs the batched
+presence changes.
+"""
+
+import json
+import time
+
+import pytest
+
+import main
+from fake_tower import FakeTower
+
+USERS = {1: "Alice", 2: "Bob", 3: "Carol"}
+
+
+@pytest.fixture
+def root():
+    try:
+        root = main.tk.Tk()
+    except main.tk.TclError:
+        pytest.skip("Tk needs a display")
+    root.withdraw()
+    yield root
+    root.destroy()
+
+
+@pytest.fixture
+def tower():
+    with FakeTower(users=USERS, latency=0.001) as tower:
+        yield tower
+
+
+@pytest.fixture
+def matrix(root, tower):
+    matrix = main.Matrix(root, tower)
+    yield matrix
+    matrix.close()
+
+
+def test_unknown_user_leaving_is_ignored(root, matrix):
+    # e.g. because the EventBus dropped their entry, or belltower never saw them enter
+    matrix._on_user_leave(99, "Ghost")
+    root.update()
+    assert 99 not in matrix.practice.ringers
+    assert all(ringer.is_in_room for ringer in matrix.practice.ringers.values())
+
+
+def wait_for_loads(root, matrix, tower, timeout=5.0):
+    """ Run the loader's callbacks until no touch is loading. """
+    deadline = time.monotonic() + timeout
+    while any(t.is_loading for t in matrix.touches):
+        assert time.monotonic() < deadline, "the load never finished"
+        tower.wait_idle()
+        matrix.loader.process_events()
+        root.update()
+        time.sleep(0.01)
+
+
+def test_touch_with_errors_is_not_loaded(matrix):
+    touch = matrix.touches[0]
+    touch.set_cell(1, "12")
+    touch.set_cell(2, "2")
+    assert not touch.plan.is_valid
+    touch.load()
+    assert not touch.is_loading
+
+
+def test_invalid_touch_is_marked_stale_after_reconnecting(root, matrix, tower):
+    touch = matrix.touches[0]
+    touch.set_cell(1, "12")
+    touch.set_cell(2, "34")
+    touch.load()
+    wait_for_loads(root, matrix, tower)
+    assert matrix.current_touch is touch
+    tower.reset_calls()
+
+    # The touch is edited into an invalid state while disconnected
+    matrix._on_disconnect()
+    touch.set_cell(2, "2")
+    matrix._reconcile_with_tower()
+    assert not touch.is_loading
+    assert touch.is_stale
+    assert touch.load_text == "Stale"
+    assert tower.calls == []
+
+    # Once it's fixed, loading it clears the stale mark
+    touch.set_cell(2, "34")
+    touch.load()
+    wait_for_loads(root, matrix, tower)
+    assert not touch.is_stale
+
+
+def test_remove_departed_ringers_keeps_placeholders(root, tower, tmp_path):
+    # Dave was in the practice before it was restored, but hasn't rejoined yet
+    path = str(tmp_path / "practice.jsonl")
+    with open(path, "w") as f:
+        f.write(json.dumps({"touches": [
+            {"id": 0, "bells": [[1, "Alice", "12"], [2, "Bob", "34"], [9, "Dave", "56"]]}
+        ]}) + "\n")
+    matrix = main.Matrix(root, tower, save_path=path)
+    try:
+        dave = matrix.practice.find_ringer("Dave")
+        assert not dave.is_in_room
+        matrix._on_user_leave(2, "Bob")
+        root.update()
+
+        matrix.remove_departed_ringers()
+        assert list(matrix.practice.ringers) == [1, 3, dave.id]
+        assert matrix.touches[0].cell_text(dave.id) == "56"
+    finally:
+        matrix.close()
+
+
+def test_ringer_rejoining_with_a_new_id_keeps_their_column(root, matrix):
+    touch = matrix.touches[0]
+    touch.set_cell(2, "2")
+    matrix.preferences.set_modes(2, [main.TOWER])
+    matrix._on_user_leave(2, "Bob")
+    root.update()
+    # Bob's bell is suggested to someone else while he's away
+    assert matrix.suggestion is not None
+
+    matrix._on_user_enter(7, "Bob")
+    root.update()
+    assert list(matrix.practice.ringers) == [1, 7, 3]
+    assert touch.cell_text(7) == "2"
+    assert matrix.preferences.modes(7) == {main.TOWER}
+    # The suggestion has been made again, so it no longer gives his bell to anyone else
+    cells = matrix.suggestion.changes.get(touch.id, {})
+    assert 2 not in cells
+    assert all("2" not in text for text in cells.values())
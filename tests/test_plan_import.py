@@ -0,0 +1,69 @@
+import pytest
+
+from plan_import import PlanFormatError, import_plan, read_plan
+from practice import HAND, TOWER, Practice
+
+CSV_PLAN = """Size,Mode,Notes,Alice,Bob,Carol
+8,Tower,Plain Bob Major,1234,56,78
+6,Hand,Grandsire Doubles,,12,34
+,,Repeat,,12,34
+"""
+
+
+def test_csv_plan_is_read():
+    names, touches = read_plan(CSV_PLAN)
+    assert names == ["Alice", "Bob", "Carol"]
+    assert [(t.size, t.bell_mode, t.notes) for t in touches] == [
+        (8, TOWER, "Plain Bob Major"), (6, HAND, "Grandsire Doubles"), (None, None, "Repeat")
+    ]
+    assert touches[0].texts == {"Alice": "1234", "Bob": "56", "Carol": "78"}
+    # Blank cells aren't included
+    assert touches[1].texts == {"Bob": "12", "Carol": "34"}
+
+
+def test_pasted_cells_are_read_as_tsv():
+    names, touches = read_plan("Alice\tBob\tnotes\n12\t34\tFirst\n\n56\t78\tSecond\n")
+    assert names == ["Alice", "Bob"]
+    assert [(t.notes, t.texts) for t in touches] == [
+        ("First", {"Alice": "12", "Bob": "34"}), ("Second", {"Alice": "56", "Bob": "78"})
+    ]
+
+
+@pytest.mark.parametrize("text, line", [
+    ("", 1),
+    ("Size,Size,Alice\n8,8,1\n", 1),
+    ("Alice,Bob,Alice\n1,2,3\n", 1),
+    ("Size,Alice\n8,1\n7,1\n", 3),
+    ("Mode,Alice\nTower,1\nBells,1\n", 3),
+])
+def test_bad_plans_are_rejected(text, line):
+    with pytest.raises(PlanFormatError) as error:
+        read_plan(text)
+    assert str(error.value).startswith(f"Line {line}:")
+
+
+def test_import_adds_touches_by_name():
+    practice = Practice()
+    practice.add_ringer(1, "Alice")
+    practice.add_ringer(2, "Bob")
+    _names, touches = read_plan(CSV_PLAN)
+    plans, missing_names = import_plan(practice, touches)
+
+    assert missing_names == {"Carol"}
+    assert [(p.size, p.bell_mode, p.notes) for p in plans] == [
+        (8, TOWER, "Plain Bob Major"), (6, HAND, "Grandsire Doubles"), (6, HAND, "Repeat")
+    ]
+    assert [(p.text(1), p.text(2)) for p in plans] == [("1234", "56"), ("", "12"), ("", "12")]
+
+
+def test_import_fills_in_blank_touches_first():
+    practice = Practice()
+    practice.add_ringer(1, "Alice")
+    first = practice.add_touch()
+    first.set_text(1, "1")
+    blank = practice.add_touch()
+
+    plans, _missing_names = import_plan(practice, read_plan("Alice\n2\n3\n")[1])
+    assert plans[0] is blank
+    assert len(practice.touches) == 3
+    assert [t.text(1) for t in practice.touches] == ["1", "2", "3"]
@@ -0,0 +1,69 @@
+from planner import (ASSIGN, SET_AT_HAND, SET_BELL_TYPE, SET_SIZE, UNASSIGN, UNASSIGN_ALL,
+                     plan_load)
+
+TOWER_BELLS = "Tower"
+HAND_BELLS = "Hand"
+
+# Users 1-8 ringing bells 0-7
+FULL_BAND = {b: b + 1 for b in range(8)}
+
+
+def test_small_change_is_planned_as_a_diff():
+    target = {**FULL_BAND, 3: 9}
+    plan = plan_load(8, TOWER_BELLS, FULL_BAND, 8, TOWER_BELLS, target)
+    assert not plan.is_full_reset
+    assert plan.ops == [(SET_AT_HAND,), (ASSIGN, 9, 3)]
+    assert plan.cost == 1
+
+
+def test_bells_which_become_free_are_unassigned():
+    target = {b: u for b, u in FULL_BAND.items() if b != 5}
+    plan = plan_load(8, TOWER_BELLS, FULL_BAND, 8, TOWER_BELLS, target)
+    assert not plan.is_full_reset
+    assert plan.ops == [(SET_AT_HAND,), (UNASSIGN, 5)]
+
+
+def test_unchanged_touch_only_sets_at_hand():
+    plan = plan_load(8, TOWER_BELLS, FULL_BAND, 8, TOWER_BELLS, FULL_BAND)
+    assert plan.ops == [(SET_AT_HAND,)]
+    assert plan.cost == 0
+
+
+def test_clearing_most_bells_falls_back_to_unassign_all():
+    target = {0: 1}
+    plan = plan_load(8, TOWER_BELLS, FULL_BAND, 8, TOWER_BELLS, target)
+    assert plan.is_full_reset
+    assert plan.ops == [(SET_AT_HAND,), (UNASSIGN_ALL,), (ASSIGN, 1, 0)]
+    # A diff would have needed 7 unassignments
+    assert plan.cost == 2
+
+
+def test_full_reset_of_an_empty_tower_skips_unassign_all():
+    target = {0: 1, 1: 2}
+    plan = plan_load(8, TOWER_BELLS, {}, 8, TOWER_BELLS, target)
+    assert not any(op[0] == UNASSIGN_ALL for op in plan.ops)
+    assert sorted(op for op in plan.ops if op[0] == ASSIGN) == [(ASSIGN, 1, 0), (ASSIGN, 2, 1)]
+
+
+def test_diff_is_preferred_when_costs_are_equal():
+    # Both plans cost 2: two unassignments, or `unassign_all` plus one assignment
+    current = {0: 1, 1: 2, 2: 3}
+    target = {0: 1}
+    plan = plan_load(8, TOWER_BELLS, current, 8, TOWER_BELLS, target)
+    assert not plan.is_full_reset
+    assert plan.ops == [(SET_AT_HAND,), (UNASSIGN, 1), (UNASSIGN, 2)]
+
+
+def test_shrinking_the_tower_does_not_unassign_removed_bells():
+    target = {b: u for b, u in FULL_BAND.items() if b < 6}
+    plan = plan_load(8, TOWER_BELLS, FULL_BAND, 6, TOWER_BELLS, target)
+    assert not plan.is_full_reset
+    assert plan.ops == [(SET_AT_HAND,), (SET_SIZE, 6)]
+
+
+def test_size_and_bell_type_changes_come_before_assignments():
+    target = {b: b + 1 for b in range(10)}
+    plan = plan_load(8, TOWER_BELLS, FULL_BAND, 10, HAND_BELLS, target)
+    assert plan.ops == [
+        (SET_AT_HAND,), (SET_SIZE, 10), (SET_BELL_TYPE, HAND_BELLS), (ASSIGN, 9, 8), (ASSIGN, 10, 9)
+    ]
@@ -0,0 +1,144 @@
+from practice import HAND, TOWER, Practice, parse_bells
+
+
+def make_practice(num_ringers=3):
+    practice = Practice()
+    for ringer_id in range(1, num_ringers + 1):
+        practice.add_ringer(ringer_id, f"Ringer {ringer_id}")
+    return practice
+
+
+def mask(text):
+    return parse_bells(text, 16)[0]
+
+
+def assert_consistent(touch):
+    """ Checks that a touch's incremental state matches a validation from scratch. """
+    state = (dict(touch._counted), list(touch._counts), touch._assigned, touch._duplicated,
+             set(touch.errors), set(touch._invalid))
+    touch.revalidate()
+    assert state == (dict(touch._counted), list(touch._counts), touch._assigned,
+                     touch._duplicated, set(touch.errors), set(touch._invalid))
+
+
+def test_duplicated_bells_are_errors():
+    practice = make_practice()
+    touch = practice.add_touch()
+    assert touch.set_text(1, "12")
+    assert touch.set_text(2, "2")
+    assert touch.errors == {1, 2}
+    assert touch.bells_left == mask("345678")
+
+    assert touch.set_text(2, "3")
+    assert touch.errors == set()
+    assert_consistent(touch)
+
+
+def test_rename_keeps_bells_and_errors():
+    practice = make_practice()
+    touch = practice.add_touch()
+    touch.set_text(1, "12")
+    touch.set_text(2, "2")
+
+    practice.rename_ringer(1, 10)
+    assert list(practice.ringers) == [10, 2, 3]
+    assert practice.ringers[10].id == 10
+    assert touch.text(10) == "12"
+    assert touch.bells(10) == mask("12")
+    assert touch.errors == {10, 2}
+    assert_consistent(touch)
+
+
+def test_rename_moves_the_presence_index():
+    practice = make_practice()
+    touch = practice.add_touch()
+    touch.set_text(1, "12")
+    practice.rename_ringer(1, 10)
+
+    # The renamed ringer leaving must still find the touch they have bells in
+    practice.set_in_room(10, False)
+    assert practice.update_presence([10]) == [touch]
+    assert touch.errors == {10}
+    assert touch.bells_left == mask("12345678")
+    assert_consistent(touch)
+
+
+def test_remove_ringer_clears_their_bells():
+    practice = make_practice()
+    touch = practice.add_touch()
+    touch.set_text(1, "12")
+    touch.set_text(2, "2")
+
+    assert practice.remove_ringer(2) == [touch]
+    assert 2 not in practice.ringers
+    assert touch.errors == set()
+    assert touch.assignments() == {0: 1, 1: 1}
+    assert touch.bells_left == mask("345678")
+    assert_consistent(touch)
+    # Nothing is left which refers to the removed ringer
+    assert 2 not in practice._ringer_touches
+
+
+def test_removing_a_ringer_without_bells_changes_nothing():
+    practice = make_practice()
+    touch = practice.add_touch()
+    touch.set_text(1, "1")
+    assert practice.remove_ringer(3) == []
+    assert_consistent(touch)
+
+
+def test_archive_counts_towards_allocation():
+    practice = make_practice()
+    first = practice.add_touch()
+    first.set_text(1, "12")
+    first.set_text(2, "34")
+    second = practice.add_touch()
+    second.bell_mode = HAND
+    second.set_text(1, "56")
+
+    practice.archive_touches([first, second])
+    assert practice.touches == []
+    assert practice.archived_rung == {1: 2, 2: 1}
+    assert practice.archived_bells[TOWER] == {1: mask("12"), 2: mask("34")}
+    assert practice.archived_bells[HAND] == {1: mask("56")}
+
+
+def test_archived_touches_are_not_updated_by_presence():
+    practice = make_practice()
+    archived = practice.add_touch()
+    archived.set_text(1, "12")
+    kept = practice.add_touch()
+    kept.set_text(1, "34")
+    practice.archive_touches([archived])
+
+    practice.set_in_room(1, False)
+    assert practice.update_presence([1]) == [kept]
+    assert kept.errors == {1}
+    assert_consistent(kept)
+
+
+def test_archive_follows_a_rename():
+    practice = make_practice()
+    touch = practice.add_touch()
+    touch.set_text(1, "12")
+    practice.archive_touches([touch])
+
+    practice.rename_ringer(1, 10)
+    assert practice.archived_rung == {10: 1}
+    assert practice.archived_bells[TOWER] == {10: mask("12")}
+
+    practice.remove_ringer(10)
+    assert practice.archived_rung == {}
+    assert practice.archived_bells[TOWER] == {}
+
+
+def test_departed_ringers_excludes_placeholders():
+    practice = make_practice()
+    placeholder = practice.add_placeholder_ringer("Dave")
+    practice.set_in_room(2, False)
+    assert practice.departed_ringers() == [2]
+
+    # Once the placeholder has been reattached to a user who then leaves, they count
+    practice.rename_ringer(placeholder.id, 4)
+    practice.set_in_room(4, False)
+    assert practice.departed_ringers() == [2, 4]
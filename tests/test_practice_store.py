@@ -0,0 +1,159 @@
+import os
+import time
+
+import practice_store
+from practice import Practice
+from practice_store import Journal, read_autosave, read_journal, restore, touch_record
+
+
+def make_practice():
+    practice = Practice()
+    practice.add_ringer(1, "Alice")
+    practice.add_ringer(2, "Bob")
+    for i in range(3):
+        touch = practice.add_touch()
+        touch.set_text(1, "12")
+        touch.set_text(2, str(3 + i))
+        touch.notes = f"Touch {i}"
+    return practice
+
+
+def records_of(practice):
+    return [touch_record(practice, t) for t in practice.touches]
+
+
+def test_journal_round_trip(tmp_path):
+    path = str(tmp_path / "practice.jsonl")
+    practice = make_practice()
+    journal = Journal(path)
+    journal.start(records_of(practice))
+
+    first, second, third = practice.touches
+    second.set_text(2, "78")
+    second.is_done = True
+    journal.write_touches([touch_record(practice, second)])
+    practice.swap_touches(0)
+    journal.write_order([t.id for t in practice.touches])
+    journal.stop()
+
+    records = read_journal(path)
+    assert records == records_of(practice)
+    assert [r["id"] for r in records] == [second.id, first.id, third.id]
+
+    # Restoring into a new practice reattaches the cells to the same ringers
+    restored = Practice()
+    restored.add_ringer(1, "Alice")
+    restored.add_ringer(2, "Bob")
+    plans = restore(restored, records)
+    assert [(p.text(1), p.text(2), p.is_done) for p in plans] == [
+        ("12", "78", True), ("12", "3", False), ("12", "5", False)
+    ]
+
+
+def test_malformed_cells_are_skipped():
+    practice = Practice()
+    practice.add_ringer(1, "Alice")
+    practice.add_ringer(2, "Bob")
+    records = [
+        {"id": 0, "notes": ["not", "text"], "bells": [
+            [1, "Alice", "12"], [2, "Bob"], [2, "Bob", "34", "56"], "Bob", [[2], "Bob", "7"],
+            [2, "Bob", 8],
+        ]},
+        {"id": 1, "bells": 7},
+    ]
+    first, second = restore(practice, records)
+    assert first.notes == ""
+    assert (first.text(1), first.text(2)) == ("12", "")
+    assert (second.text(1), second.text(2)) == ("", "")
+    # No placeholders were made for the bad cells
+    assert list(practice.ringers) == [1, 2]
+
+
+def test_half_written_line_is_ignored(tmp_path):
+    path = str(tmp_path / "practice.jsonl")
+    practice = make_practice()
+    journal = Journal(path)
+    journal.start(records_of(practice))
+    journal.stop()
+    expected = read_journal(path)
+
+    with open(path, "a") as f:
+        f.write('{"touch": {"id": 0, "si')
+    assert read_journal(path) == expected
+
+
+def test_journal_is_compacted(tmp_path, monkeypatch):
+    monkeypatch.setattr(practice_store, "COMPACT_AFTER", 5)
+    path = str(tmp_path / "practice.jsonl")
+    practice = make_practice()
+    journal = Journal(path)
+    journal.start(records_of(practice))
+
+    touch = practice.touches[0]
+    for i in range(20):
+        touch.notes = f"Edit {i}"
+        journal.write_touches([touch_record(practice, touch)])
+    # A removed touch is left out of the replayed journal
+    removed = practice.touches[2]
+    practice.remove_touches([removed])
+    journal.write_order([t.id for t in practice.touches])
+    journal.stop()
+
+    with open(path) as f:
+        lines = f.readlines()
+    # A snapshot, plus at most `COMPACT_AFTER` changes since it
+    assert len(lines) <= 1 + practice_store.COMPACT_AFTER
+    assert lines[0].startswith('{"touches":')
+    assert read_journal(path) == records_of(practice)
+    assert read_journal(path)[0]["notes"] == "Edit 19"
+
+
+def test_ringers_with_the_same_name_are_told_apart():
+    practice = Practice()
+    practice.add_ringer(4, "Sam")
+    practice.add_ringer(7, "Sam")
+    touch = practice.add_touch()
+    touch.set_text(4, "12")
+    touch.set_text(7, "34")
+    records = records_of(practice)
+
+    # In the same session, each cell goes back to the ringer with the same ID
+    restored = Practice()
+    restored.add_ringer(7, "Sam")
+    restored.add_ringer(4, "Sam")
+    plan, = restore(restored, records)
+    assert (plan.text(4), plan.text(7)) == ("12", "34")
+
+    # In a new session the IDs have changed, but the two cells still go to different ringers
+    restored = Practice()
+    restored.add_ringer(20, "Sam")
+    plan, = restore(restored, records)
+    placeholder = next(r for r in restored.ringers if r != 20)
+    assert sorted([plan.text(20), plan.text(placeholder)]) == ["12", "34"]
+
+
+def test_old_journals_are_read(tmp_path):
+    path = str(tmp_path / "practice.jsonl")
+    with open(path, "w") as f:
+        f.write('{"touches": [{"id": 0, "size": 6, "bells": {"Alice": "12", "Bob": "34"}}]}\n')
+    practice = Practice()
+    practice.add_ringer(1, "Alice")
+    plan, = restore(practice, read_journal(path))
+    bob = practice.find_ringer("Bob")
+    assert plan.size == 6
+    assert (plan.text(1), plan.text(bob.id)) == ("12", "34")
+    assert not bob.is_in_room
+
+
+def test_old_autosave_which_cannot_be_moved_is_skipped(tmp_path, monkeypatch):
+    path = str(tmp_path / "practice.jsonl")
+    with open(path, "w") as f:
+        f.write('{"touches": []}\n')
+    old = time.time() - practice_store.RESTORE_MAX_AGE - 60
+    os.utime(path, (old, old))
+
+    def replace(_src, _dst):
+        raise PermissionError("locked")
+
+    monkeypatch.setattr(os, "replace", replace)
+    assert read_autosave(path) is None
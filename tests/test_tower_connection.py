@@ -0,0 +1,180 @@
+"""
+Tests of PreparedTower, which call its socket-io handlers directly and give it fake socket-io
+clients, instead of connecting to Ringing Room.
+"""
+
+import pytest
+from belltower import Bell, TOWER_BELLS, ringing_room
+from belltower.ringing_room import InvalidRRVersionError
+
+from tower_connection import PreparedTower
+
+PAGE = ("https://ringingroom.example", "Fake Tower", TOWER_BELLS)
+
+
+@pytest.fixture
+def tower():
+    tower = PreparedTower(123456789, PAGE, None, run_version_check=False)
+    # Record what would be sent to the server
+    tower.sent = []
+    tower._join_tower = lambda: tower.sent.append("join")
+    tower._request_global_state = lambda: tower.sent.append("global_state")
+    return tower
+
+
+def receive_state(tower, users, assignments, size=8):
+    """ Simulate the server's replies to joining the tower and asking for its state. """
+    tower._on_user_list({
+        "user_list": [{"user_id": u, "username": name} for u, name in users.items()]
+    })
+    for bell, user_id in assignments.items():
+        tower._on_assign_user({"bell": bell + 1, "user": user_id})
+    tower._on_global_bell_state({"global_bell_state": [True] * size})
+
+
+def test_first_connection_is_not_a_resync(tower):
+    # socket-io can run the 'connect' handler for the first connection
+    tower._on_socket_reconnect()
+    assert tower.sent == []
+    assert tower._snapshot is None
+
+
+def test_resync_after_dropping(tower):
+    receive_state(tower, {1: "Alice", 2: "Bob"}, {0: 1, 1: 2})
+    events = []
+    tower.on_disconnect(lambda: events.append("disconnect"))
+    tower.on_resync(lambda: events.append("resync"))
+    tower.on_user_enter(lambda *args: events.append(("enter",) + args))
+    tower.on_user_leave(lambda *args: events.append(("leave",) + args))
+    tower.on_assign(lambda *args: events.append(("assign",) + args))
+
+    tower._on_socket_disconnect()
+    assert events == ["disconnect"]
+    tower._on_socket_reconnect()
+    assert tower.sent == ["join", "global_state"]
+
+    # While the snapshot is collected, nothing changes and no per-user callbacks are run
+    receive_state(tower, {1: "Alice", 3: "Carol"}, {0: 3})
+    assert events == ["disconnect", "resync"]
+    assert tower.all_users == {1: "Alice", 3: "Carol"}
+    assert tower.get_assignment(Bell.from_index(0)) == 3
+    assert tower.get_assignment(Bell.from_index(1)) is None
+    assert tower._snapshot is None
+
+
+def test_leaves_during_resync_update_the_snapshot(tower):
+    tower._on_socket_disconnect()
+    tower._on_socket_reconnect()
+    tower._on_user_list({"user_list": [{"user_id": 1, "username": "Alice"},
+                                       {"user_id": 2, "username": "Bob"}]})
+    tower._on_assign_user({"bell": 1, "user": 2})
+    tower._on_user_leave({"user_id": 2, "username": "Bob"})
+    tower._on_global_bell_state({"global_bell_state": [True] * 8})
+    assert tower.all_users == {1: "Alice"}
+    assert tower.get_assignment(Bell.from_index(0)) is None
+
+
+def test_only_one_resync_per_drop(tower):
+    resyncs = []
+    tower.on_resync(lambda: resyncs.append(True))
+    tower._on_socket_disconnect()
+    tower._on_socket_reconnect()
+    receive_state(tower, {1: "Alice"}, {})
+    # A second 'connect' without a drop in between doesn't rejoin the tower
+    tower._on_socket_reconnect()
+    assert tower.sent == ["join", "global_state"]
+    assert resyncs == [True]
+
+
+def test_closing_on_purpose_is_not_a_drop(tower):
+    disconnects = []
+    tower.on_disconnect(lambda: disconnects.append(True))
+    tower._is_closing = True
+    tower._on_socket_disconnect()
+    tower._on_socket_reconnect()
+    assert disconnects == []
+    assert tower.sent == []
+
+
+# ===== CONNECTING =====
+
+class FakeClient:
+    """ Just enough of a `socketio.Client` for `PreparedTower.connect`. """
+
+    def __init__(self):
+        self.handlers = {}
+        self.is_disconnected = False
+
+    def on(self, event, handler):
+        self.handlers[event] = handler
+
+    def disconnect(self):
+        self.is_disconnected = True
+        self.handlers["disconnect"]()
+
+
+@pytest.fixture
+def clients(tower):
+    """ Makes the tower connect to FakeClients, returning the list of clients it makes. """
+    clients = []
+
+    def create_client():
+        clients.append(FakeClient())
+        tower._socket_io_client = clients[-1]
+
+    tower._create_client = create_client
+    return clients
+
+
+class FakeSession:
+    def __init__(self, version):
+        self.version = version
+        self.urls = []
+
+    def get(self, url):
+        self.urls.append(url)
+        return type("Response", (), {"json": lambda _self: {"socketio-version": self.version}})()
+
+
+def test_page_is_not_fetched_again(monkeypatch):
+    def parse_page(_tower_id, _url):
+        raise AssertionError("the page was fetched again")
+
+    monkeypatch.setattr(ringing_room, "parse_page", parse_page)
+    tower = PreparedTower(123456789, PAGE, None)
+    assert (tower.tower_id, tower.tower_name, tower.bell_type) == (123456789, "Fake Tower",
+                                                                   TOWER_BELLS)
+    # `parse_page` is put back afterwards
+    assert ringing_room.parse_page is parse_page
+
+
+def test_connecting_only_happens_once(tower, clients):
+    tower.connect()
+    tower.connect()
+    assert len(clients) == 1
+
+
+def test_tower_can_reconnect_after_being_closed(tower, clients):
+    disconnects = []
+    tower.on_disconnect(lambda: disconnects.append(True))
+    tower.connect()
+    tower.disconnect()
+    assert clients[0].is_disconnected
+    assert disconnects == []
+
+    tower.connect()
+    assert len(clients) == 2
+    # The new connection dropping is reported
+    clients[1].handlers["disconnect"]()
+    assert disconnects == [True]
+
+
+def test_version_is_checked_through_the_session():
+    session = FakeSession("1.2")
+    tower = PreparedTower(123456789, PAGE, session)
+    tower.check_version()
+    assert session.urls == ["https://ringingroom.example/api/version"]
+
+    tower = PreparedTower(123456789, PAGE, FakeSession("0.9"))
+    with pytest.raises(InvalidRRVersionError):
+        tower.check_version()
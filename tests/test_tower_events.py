@@ -0,0 +1,123 @@
+import pytest
+
+from tower_events import EventBus
+
+
+class FakeWidget:
+    """ Just enough of a Tk widget to drive `EventBus.start`, one poll at a time. """
+
+    def __init__(self):
+        self.exists = True
+        self.scheduled = []
+
+    def winfo_exists(self):
+        return self.exists
+
+    def after(self, _ms, func):
+        self.scheduled.append(func)
+
+    def run_next(self):
+        self.scheduled.pop(0)()
+
+
+def test_events_are_handled_in_order():
+    bus = EventBus()
+    handled = []
+    enter = bus.callback("enter", lambda *args: handled.append(("enter",) + args))
+    leave = bus.callback("leave", lambda *args: handled.append(("leave",) + args))
+    enter(1, "Alice")
+    leave(1, "Alice")
+    enter(2, "Bob")
+    assert handled == []
+    assert not bus.is_idle
+
+    bus.drain()
+    assert handled == [("enter", 1, "Alice"), ("leave", 1, "Alice"), ("enter", 2, "Bob")]
+    assert bus.is_idle
+
+
+def test_batches_are_limited():
+    bus = EventBus(max_batch=2)
+    handled = []
+    put = bus.callback("event", handled.append)
+    for i in range(5):
+        put(i)
+    bus.drain()
+    assert handled == [0, 1]
+    bus.drain()
+    bus.drain()
+    assert handled == [0, 1, 2, 3, 4]
+
+
+def test_overflow_drops_events_then_catches_up():
+    bus = EventBus(max_pending=2, max_batch=1)
+    handled = []
+    catch_ups = []
+    put = bus.callback("event", handled.append)
+    bus.on_overflow(lambda: catch_ups.append(list(handled)))
+    for i in range(5):
+        put(i)
+
+    # The catch-up only runs once every queued event has been handled
+    bus.drain()
+    assert (handled, catch_ups) == ([0], [])
+    bus.drain()
+    assert (handled, catch_ups) == ([0, 1], [[0, 1]])
+    assert bus.is_idle
+
+    # The bus accepts events again once it has caught up
+    put(5)
+    bus.drain()
+    assert handled == [0, 1, 5]
+    assert catch_ups == [[0, 1]]
+
+
+def test_control_events_are_never_dropped():
+    bus = EventBus(max_pending=2)
+    handled = []
+    put = bus.callback("event", lambda i: handled.append(i))
+    disconnect = bus.callback("disconnect", lambda: handled.append("disconnect"), is_control=True)
+    resync = bus.callback("resync", lambda: handled.append("resync"), is_control=True)
+    put(0)
+    put(1)
+    disconnect()
+    put(2)
+    resync()
+
+    bus.drain()
+    # Control events don't take up the space of droppable ones, and keep their place in the order
+    assert handled == [0, 1, "disconnect", "resync"]
+
+
+def test_poll_continues_after_a_handler_raises():
+    bus = EventBus()
+    handled = []
+
+    def handle(i):
+        if i == 1:
+            raise KeyError(i)
+        handled.append(i)
+
+    put = bus.callback("event", handle)
+    widget = FakeWidget()
+    bus.start(widget)
+    for i in range(3):
+        put(i)
+
+    with pytest.raises(KeyError):
+        widget.run_next()
+    assert handled == [0]
+    # The bad event has been taken off the queue, and the next poll handles the rest
+    widget.run_next()
+    assert handled == [0, 2]
+    assert bus.is_idle
+
+
+def test_poll_stops_when_the_widget_is_destroyed():
+    bus = EventBus()
+    widget = FakeWidget()
+    bus.start(widget)
+    assert len(widget.scheduled) == 1
+    widget.exists = False
+    widget.run_next()
+    assert widget.scheduled == []
@@ -0,0 +1,230 @@
+import threading
+import time
+
+import pytest
+from belltower import HAND_BELLS, TOWER_BELLS
+from belltower.page_parsing import TowerNotFoundError
+
+import tower_lookup
+from tower_lookup import TowerCache, TowerDirectory, TowerLookup, fetch_page
+
+PAGE = ("https://ringingroom.example", "Fake Tower", TOWER_BELLS)
+
+
+class FakeFetcher:
+    """ Stands in for `fetch_page`, recording every tower ID which is fetched. """
+
+    def __init__(self, pages):
+        # Maps tower IDs to pages, or to exceptions to raise
+        self.pages = pages
+        self.fetched = []
+        # Cleared to hold up every fetch until it's set
+        self.can_finish = threading.Event()
+        self.can_finish.set()
+
+    def __call__(self, _session, tower_id, _url):
+        self.fetched.append(tower_id)
+        self.can_finish.wait()
+        page = self.pages[tower_id]
+        if isinstance(page, Exception):
+            raise page
+        return page
+
+
+@pytest.fixture
+def fetcher(monkeypatch):
+    fetcher = FakeFetcher({"111111111": PAGE})
+    monkeypatch.setattr(tower_lookup, "fetch_page", fetcher)
+    return fetcher
+
+
+@pytest.fixture
+def lookup():
+    lookup = TowerLookup()
+    yield lookup
+    lookup.close()
+
+
+def wait_for_results(lookup, results, count, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while len(results) < count:
+        assert time.monotonic() < deadline, "the lookup never finished"
+        lookup.process_results()
+        time.sleep(0.01)
+
+
+# ===== CACHE =====
+
+def test_cache_hits_and_misses():
+    cache = TowerCache()
+    assert cache.get("111111111") == (False, None)
+    cache.put("111111111", PAGE)
+    cache.put("222222222", None)
+    assert cache.get("111111111") == (True, PAGE)
+    # Towers which don't exist are cached too
+    assert cache.get("222222222") == (True, None)
+
+
+def test_cache_entries_expire():
+    cache = TowerCache(ttl=-1)
+    cache.put("111111111", PAGE)
+    assert cache.get("111111111") == (False, None)
+
+
+def test_cache_evicts_the_least_recently_used():
+    cache = TowerCache(max_size=2)
+    cache.put("1", PAGE)
+    cache.put("2", PAGE)
+    cache.get("1")
+    cache.put("3", PAGE)
+    assert cache.get("2") == (False, None)
+    assert cache.get("1") == (True, PAGE)
+    assert cache.get("3") == (True, PAGE)
+
+
+# ===== DIRECTORY =====
+
+def test_directory_is_saved(tmp_path):
+    path = str(tmp_path / "towers.json")
+    directory = TowerDirectory(path)
+    directory.put("111111111", PAGE)
+    directory.put("222222222", ("https://other.example", "Other", HAND_BELLS))
+    directory.mark_joined("222222222")
+
+    directory = TowerDirectory(path)
+    assert directory.name("111111111") == "Fake Tower"
+    assert directory.page("222222222") == ("https://other.example", "Other", HAND_BELLS)
+    assert directory.recent() == [("222222222", "Other")]
+
+    directory.forget("222222222")
+    assert TowerDirectory(path).page("222222222") is None
+
+
+def test_corrupt_directory_is_ignored(tmp_path):
+    path = tmp_path / "towers.json"
+    path.write_text("{not json")
+    directory = TowerDirectory(str(path))
+    assert directory.name("111111111") is None
+    assert directory.recent() == []
+
+
+# ===== LOOKUP THREAD =====
+
+def test_lookups_are_cached(fetcher, lookup):
+    results = []
+    lookup.request("111111111", lambda *result: results.append(result))
+    wait_for_results(lookup, results, 1)
+    lookup.request("111111111", lambda *result: results.append(result))
+    wait_for_results(lookup, results, 2)
+    assert results == [("111111111", PAGE)] * 2
+    assert fetcher.fetched == ["111111111"]
+
+
+def test_only_the_latest_request_is_answered(fetcher, lookup):
+    fetcher.pages.update({"222222222": PAGE, "333333333": PAGE})
+    fetcher.can_finish.clear()
+    results = []
+    lookup.request("111111111", lambda *result: results.append(result))
+    # Wait for the first lookup to start, then supersede it twice while it's still running
+    while not fetcher.fetched:
+        time.sleep(0.01)
+    lookup.request("222222222", lambda *result: results.append(result))
+    lookup.request("333333333", lambda *result: results.append(result))
+    fetcher.can_finish.set()
+
+    wait_for_results(lookup, results, 1)
+    time.sleep(0.05)
+    lookup.process_results()
+    assert results == [("333333333", PAGE)]
+    # The request which was superseded before it started was never fetched
+    assert fetcher.fetched == ["111111111", "333333333"]
+
+
+def test_cancelled_requests_are_not_answered(fetcher, lookup):
+    fetcher.can_finish.clear()
+    results = []
+    lookup.request("111111111", lambda *result: results.append(result))
+    lookup.cancel()
+    fetcher.can_finish.set()
+    time.sleep(0.05)
+    lookup.process_results()
+    assert results == []
+
+
+def test_missing_towers_are_forgotten(fetcher, tmp_path):
+    fetcher.pages["999999999"] = TowerNotFoundError("999999999", "https://ringingroom.com")
+    directory = TowerDirectory(str(tmp_path / "towers.json"))
+    directory.put("999999999", PAGE)
+    lookup = TowerLookup(directory=directory)
+    try:
+        results = []
+        lookup.request("999999999", lambda *result: results.append(result))
+        wait_for_results(lookup, results, 1)
+    finally:
+        lookup.close()
+    assert results == [("999999999", None)]
+    assert directory.name("999999999") is None
+    assert lookup.cache.get("999999999") == (True, None)
+
+
+def test_network_failures_fall_back_on_the_directory(fetcher, tmp_path):
+    fetcher.pages["111111111"] = ConnectionError("offline")
+    directory = TowerDirectory(str(tmp_path / "towers.json"))
+    directory.put("111111111", PAGE)
+    lookup = TowerLookup(directory=directory)
+    try:
+        results = []
+        lookup.request("111111111", lambda *result: results.append(result))
+        wait_for_results(lookup, results, 1)
+    finally:
+        lookup.close()
+    assert results == [("111111111", PAGE)]
+    # Failures aren't cached, since the tower may well exist
+    assert lookup.cache.get("111111111") == (False, None)
+
+
+def test_close_stops_the_thread_and_closes_the_session(fetcher):
+    lookup = TowerLookup()
+    while lookup.session is None:
+        time.sleep(0.01)
+    closed = []
+    lookup.session.close = lambda: closed.append(True)
+    lookup.close()
+    lookup._thread.join(timeout=5.0)
+    assert not lookup._thread.is_alive()
+    assert closed == [True]
+
+
+def test_close_can_keep_the_session(fetcher):
+    lookup = TowerLookup()
+    while lookup.session is None:
+        time.sleep(0.01)
+    closed = []
+    lookup.session.close = lambda: closed.append(True)
+    lookup.close(close_session=False)
+    lookup._thread.join(timeout=5.0)
+    assert not lookup._thread.is_alive()
+    assert closed == []
+
+
+# ===== PARSING =====
+
+class FakeSession:
+    def __init__(self, html):
+        self.html = html
+        self.urls = []
+
+    def get(self, url):
+        self.urls.append(url)
+        return type("Response", (), {"text": self.html})()
+
+
+def test_fetch_page_parses_the_tower_page():
+    session = FakeSession('server_ip: "https://sio.example"\n name: "St Foo"\n audio: "Hand"\n')
+    assert fetch_page(session, 111111111) == ("https://sio.example", "St Foo", HAND_BELLS)
+    assert session.urls == ["https://ringingroom.com/111111111"]
+
+
+def test_fetch_page_raises_for_missing_towers():
+    with pytest.raises(TowerNotFoundError):
+        fetch_page(FakeSession("<html>Not found</html>"), 111111111)
@@ -1,51 +1,153 @@
 import tkinter as tk
-from belltower import RingingRoomTower
-from belltower.page_parsing import parse_page
+
+import stats
+from tower_lookup import TowerDirectory, TowerLookup
+
+# How long (in milliseconds) to wait after the last edit to the tower ID before looking it up
+LOOKUP_DEBOUNCE = 300
+# How often (in milliseconds) to check for finished lookups
+LOOKUP_POLL_INTERVAL = 50
 
 
 def choose_tower(title="Choose a RR tower!", normal_font=("TkDefaultFont", 12),
-                 title_font=("TkDefaultFont", 12, "bold")):
+                 title_font=("TkDefaultFont", 12, "bold"), parent=None):
     """
     This function creates a window where the user can input the tower ID, returning a
-    RingingRoomTower or None when the user has made their choice.
+    RingingRoomTower or None when the user has made their choice.  The tower starts connecting as
+    soon as it's shown, so it may already be connected when it's returned.  Towers which have been
+    seen before are shown straight from the tower directory, and the most recently joined towers
+    can be joined with one click.  If `parent` is given, the window is a dialog over it (and the
+    parent keeps running while it's open).
     """
     # Incredible hack: arrays are always passed by reference, so we can set the first item in an
     # array from inside a local function.  Isn't Python wonderful?
     window_intentionally_closed = [False]
 
+    # The Tk 'after' ID of the lookup which is waiting for the user to stop typing
+    pending_lookup = [None]
+    # The speculative connection to the tower being shown, if there is one
+    connection = [None]
+    # The (tower ID, page) of the valid tower being shown, or None.  The page is None if the tower
+    # is being shown from the directory and hasn't been looked up yet
+    shown = [None]
+
+    def show_tower(tower_id, page):
+        """ Update the UI to show the result of looking up a tower. """
+        if page is None:
+            shown[0] = None
+            abandon_connection()
+            show_status(f"No tower found for {tower_id}", False)
+        else:
+            _url, tower_name, _bell_type = page
+            show_known_tower(tower_id, tower_name, page)
+
+    def show_known_tower(tower_id, tower_name, page=None):
+        shown[0] = (tower_id, page)
+        show_status(f"Join '{tower_name}'?", True)
+        # Connecting needs the networking stack, so otherwise wait for the lookup thread to import
+        # it (see `poll_lookup`)
+        if lookup.session is not None:
+            connect_early()
+
+    def connect_early():
+        """ Start connecting to the tower being shown, in case the user joins it. """
+        tower_id, page = shown[0]
+        if page is None:
+            page = directory.page(tower_id)
+            if page is None:
+                return
+        if (connection[0] is not None and connection[0].tower_id == int(tower_id)
+                and connection[0].page == page):
+            return
+        # Either this is a new tower, or a refreshed page doesn't match the directory's
+        abandon_connection()
+        from tower_connection import SpeculativeConnection
+        connection[0] = SpeculativeConnection(int(tower_id), page, lookup.session)
+
+    def abandon_connection():
+        if connection[0] is not None:
+            connection[0].abandon()
+            connection[0] = None
+
+    def show_status(text, is_valid):
+        join_button['state'] = tk.NORMAL if is_valid else tk.DISABLED
+        tower_name_box['text'] = text
+        tower_name_box['fg'] = "black" if is_valid else "red"
+
     def on_id_change(*args):
         """ Callback called whenever the user changes the tower ID. """
         tower_id = tower_id_var.get()
+        shown[0] = None
+
+        # Any lookups (and connections) for the previous ID are now stale
+        if connection[0] is not None and str(connection[0].tower_id) != tower_id:
+            abandon_connection()
+        if pending_lookup[0] is not None:
+            window.after_cancel(pending_lookup[0])
+            pending_lookup[0] = None
+        lookup.cancel()
 
-        # If the tower ID points to a valid tower, then this will be overwritten
-        tower_name = None
         if tower_id == "":
-            text = "Tower IDs can't be blank"
+            show_status("Tower IDs can't be blank", False)
         elif len(tower_id) != 9:
-            text = "Tower IDs must have 9 digits"
+            show_status("Tower IDs must have 9 digits", False)
         else:
-            # Try to load the tower name from RR.  If this fails, then the tower does not exist
-            try:
-                _url, tower_name, _bell_type = parse_page(tower_id, "ringingroom.com")
-            except Exception:
-                pass
-            # Decide on what text to display, according to what the user wrote
-            if tower_name is None:
-                text = f"No tower found for {tower_id}"
-            else:
-                text = f"Join '{tower_name}'?"
-
-        # Update the UI
-        join_button['state'] = tk.DISABLED if tower_name is None else tk.NORMAL
-        tower_name_box['text'] = text
-        tower_name_box['fg'] = "red" if tower_name is None else "black"
+            # Towers we've seen recently can be shown straight away
+            is_hit, page = lookup.cache.get(tower_id)
+            if is_hit:
+                show_tower(tower_id, page)
+                return
+            # Towers we've seen before are shown straight from the directory, and refreshed in the
+            # background
+            tower_name = directory.name(tower_id)
+            if tower_name is not None:
+                show_known_tower(tower_id, tower_name)
+                start_lookup(tower_id)
+                return
+            # Otherwise, try to load the tower name from RR once the user stops typing.  If this
+            # fails, then the tower does not exist
+            join_button['state'] = tk.DISABLED
+            tower_name_box['text'] = f"Looking up {tower_id}..."
+            tower_name_box['fg'] = "black"
+            pending_lookup[0] = window.after(
+                LOOKUP_DEBOUNCE,
+                lambda: start_lookup(tower_id)
+            )
+
+    def start_lookup(tower_id):
+        pending_lookup[0] = None
+        lookup.request(tower_id, show_tower)
+
+    def poll_lookup():
+        # The parent's event loop keeps running after a dialog is closed
+        if not window.winfo_exists():
+            return
+        lookup.process_results()
+        if shown[0] is not None and connection[0] is None and lookup.session is not None:
+            connect_early()
+        window.after(LOOKUP_POLL_INTERVAL, poll_lookup)
 
     def on_join_click():
         """ Mark the closing as intentional, and close the window. """
+        if shown[0] is None:
+            return
+        # A tower shown from the directory may not have started connecting yet
+        if connection[0] is None:
+            connect_early()
+            if connection[0] is None:
+                return
+        directory.mark_joined(shown[0][0])
         window_intentionally_closed[0] = True
         window.destroy()
 
-    window = tk.Tk()
+    def join_recent(tower_id):
+        tower_id_var.set(tower_id)
+        on_join_click()
+
+    # This is read before the window is made, so that the recent towers are in the first frame
+    directory = TowerDirectory()
+
+    window = tk.Tk() if parent is None else tk.Toplevel(parent)
     window.title(title)
     # A title with the program name
     title = tk.Label(window, text=title, font=title_font)
@@ -62,6 +164,18 @@ def choose_tower(title="Choose a RR tower!", normal_font=("TkDefaultFont", 12),
     cancel_button = tk.Button(cancel_join_label, text="Cancel", font=normal_font,
                               command=window.destroy)
     join_button = tk.Button(cancel_join_label, text="Join", font=normal_font, command=on_join_click)
+    # Buttons to join the towers which were joined most recently
+    recent_frame = tk.Frame(window)
+    recent_towers = directory.recent()
+    if recent_towers:
+        tk.Label(recent_frame, text="Recent towers:", font=normal_font).pack()
+    for tower_id, tower_name in recent_towers:
+        tk.Button(
+            recent_frame,
+            text=f"{tower_name} ({tower_id})",
+            font=normal_font,
+            command=lambda t=tower_id: join_recent(t)
+        ).pack(fill=tk.X)
 
     title.pack()
     input_frame.pack()
@@ -71,11 +185,35 @@ def choose_tower(title="Choose a RR tower!", normal_font=("TkDefaultFont", 12),
     cancel_join_label.pack()
     cancel_button.grid(row=0, column=0)
     join_button.grid(row=0, column=1)
+    recent_frame.pack(fill=tk.X, padx=5, pady=(5, 0))
+
+    # Get the window on screen before starting the lookup thread, which warms up the networking
+    # stack and so competes for the GIL
+    window.update()
+    if parent is None:
+        stats.mark_startup("first_window")
+    lookup = TowerLookup(directory=directory)
 
     # Cause an update so that everything gets initialised
     on_id_change()
+    poll_lookup()
 
     # Go into the mainloop, until either the window is closed, or the user hits 'Join'
-    window.mainloop()
+    try:
+        if parent is None:
+            window.mainloop()
+        else:
+            entry.focus_set()
+            window.transient(parent)
+            window.grab_set()
+            window.wait_window()
+    finally:
+        # The joined tower keeps using the lookup's session, so it's only closed if nothing is
+        # joined
+        lookup.close(close_session=not window_intentionally_closed[0])
 
-    return RingingRoomTower(int(tower_id_var.get())) if window_intentionally_closed[0] else None
+    if not window_intentionally_closed[0]:
+        abandon_connection()
+        return None
+    # 'Join' is only enabled while a tower is shown, which is when it starts connecting
+    return connection[0].tower
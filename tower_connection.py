@@ -0,0 +1,262 @@
+"""
+Code to join a Ringing Room tower as quickly as possible.  The tower chooser has already fetched and
+parsed the tower's page (see `tower_lookup`), so a PreparedTower is made from that page rather than
+fetching it again, and it makes its HTTP requests through the lookup's `requests.Session` so that
+the connection to Ringing Room is reused.  As soon as the chooser shows a valid tower, a
+SpeculativeConnection starts opening the socket in the background, so by the time the user clicks
+'Join' the tower is usually already connected.
+
+If the socket drops, socket-io reconnects with exponential backoff.  Ringing Room forgets anonymous
+users when they disconnect, so a PreparedTower then rejoins the tower and collects the server's
+users and assignments into a snapshot (without firing any per-user callbacks), which replaces the
+tower's stale state in one go before the `on_resync` callbacks are run.
+
+This imports `belltower` (and so the whole networking stack), so it should only be imported once
+the lookup thread has warmed it up.
+"""
+
+import threading
+import time
+import urllib.parse
+
+import requests
+from belltower import Bell, RingingRoomTower, Stroke, ringing_room
+from belltower.ringing_room import InvalidRRVersionError
+
+import stats
+from tower_lookup import DEFAULT_URL, fetch_page
+
+"""
+The delays (in seconds) between attempts to reconnect, which double from `RECONNECT_DELAY` up to
+`RECONNECT_DELAY_MAX`, plus or minus `RECONNECT_JITTER` so that a whole band doesn't retry at once.
+"""
+RECONNECT_DELAY = 0.25
+RECONNECT_DELAY_MAX = 4.0
+RECONNECT_JITTER = 0.1
+
+# Held while a PreparedTower is being initialised, since that briefly replaces `parse_page`
+_init_lock = threading.Lock()
+
+
+def open_tower(tower_id, url=DEFAULT_URL):
+    """
+    Fetches a tower's page and returns a PreparedTower for it (which isn't connected yet), without
+    any UI.  Raises `TowerNotFoundError` if the tower doesn't exist.
+    """
+    session = requests.Session()
+    return PreparedTower(tower_id, fetch_page(session, tower_id, url), session)
+
+
+class PreparedTower(RingingRoomTower):
+    """
+    A RingingRoomTower made from a tower page which has already been fetched.  Connecting is
+    thread-safe and only happens once, so the tower can be connected speculatively on one thread
+    and then used in a `with` block on another.  The tower also reconnects and resynchronises
+    itself if the connection drops.  If no session is given (e.g. because the page came from the
+    tower directory), the tower makes its own.
+    """
+
+    def __init__(self, tower_id, page, session, run_version_check=True):
+        # `RingingRoomTower.__init__` always fetches the page (through `parse_page`), so it is
+        # given the page we already have instead.  The version check is run when connecting.
+        with _init_lock:
+            parse_page = ringing_room.parse_page
+            ringing_room.parse_page = lambda _tower_id, _url: page
+            try:
+                super().__init__(tower_id, run_version_check=False)
+            finally:
+                ringing_room.parse_page = parse_page
+
+        self._session = session if session is not None else requests.Session()
+        self._run_version_check = run_version_check
+        # Held while connecting or disconnecting, so a speculative connection is only made once
+        self._connection_lock = threading.Lock()
+        # Set while we're closing the connection on purpose, so that it isn't reported as dropped.
+        # This is cleared by connecting again, so the tower can be reused
+        self._is_closing = False
+
+        # The (users, assignments) which are being collected from the server after reconnecting,
+        # or None if the tower isn't being resynchronised
+        self._snapshot = None
+        # When the connection dropped, to measure how long reconnecting takes
+        self._dropped_at = None
+        self._invoke_on_disconnect = []
+        self._invoke_on_resync = []
+
+    def check_version(self):
+        """ The same as `RingingRoomTower.check_version`, but using the lookup's session. """
+        response = self._session.get(urllib.parse.urljoin(self._url, "api/version"))
+        semver = response.json()["socketio-version"].split(".")
+        rr_major = int(semver[0])
+        rr_minor = int(semver[1]) if len(semver) > 1 else 0
+        if not (rr_major == self.EXPECTED_RR_MAJOR and rr_minor >= self.EXPECTED_RR_MINOR):
+            raise InvalidRRVersionError(
+                f"{rr_major}.{rr_minor}",
+                f"{self.EXPECTED_RR_MAJOR}.{self.EXPECTED_RR_MINOR}"
+            )
+
+    def connect(self):
+        """
+        Open the socket-io connection and join the tower, unless that has already been done.  If
+        another thread is connecting, this waits for it to finish.
+        """
+        with self._connection_lock:
+            if self._socket_io_client is not None:
+                return
+            if self._run_version_check:
+                self.check_version()
+            self._is_closing = False
+            try:
+                self._create_client()
+            except Exception:
+                # Leave the tower unconnected, so that connecting can be tried again
+                self._socket_io_client = None
+                raise
+
+            client = self._socket_io_client
+            client.reconnection_delay = RECONNECT_DELAY
+            client.reconnection_delay_max = RECONNECT_DELAY_MAX
+            client.randomization_factor = RECONNECT_JITTER
+            # These are added after the first connection, so they should only fire when it drops
+            # and when socket-io reconnects (but see `_on_socket_reconnect`)
+            client.on("disconnect", self._on_socket_disconnect)
+            client.on("connect", self._on_socket_reconnect)
+
+    def disconnect(self):
+        with self._connection_lock:
+            if self._socket_io_client is not None:
+                self._is_closing = True
+                self._socket_io_client.disconnect()
+                self._socket_io_client = None
+
+    # ===== RECONNECTION =====
+
+    def on_disconnect(self, func):
+        """ Add a callback for the connection dropping (but not for it being closed on purpose). """
+        self._invoke_on_disconnect.append(func)
+        return func
+
+    def on_resync(self, func):
+        """
+        Add a callback for the tower being resynchronised after reconnecting.  When this is called,
+        `all_users` and `get_assignment` have been replaced by the server's state.
+        """
+        self._invoke_on_resync.append(func)
+        return func
+
+    def _on_socket_disconnect(self):
+        if self._is_closing:
+            return
+        self.logger.warning("Connection to Ringing Room dropped, reconnecting")
+        self._dropped_at = time.perf_counter()
+        for c in self._invoke_on_disconnect:
+            c()
+
+    def _on_socket_reconnect(self):
+        """ Rejoin the tower, and start collecting the server's state into a snapshot. """
+        # socket-io can process the first connection after this handler has been added, and the
+        # tower has already been joined then
+        if self._dropped_at is None:
+            return
+        self.logger.info("Reconnected to Ringing Room, resynchronising")
+        self._snapshot = ({}, {})
+        self._waiting_for_first_global_state = True
+        # The server replies to these in order, so its global state arrives after all the users and
+        # assignments which joining the tower causes it to send
+        self._join_tower()
+        self._request_global_state()
+
+    def _on_user_list(self, user_list):
+        if self._snapshot is None:
+            super()._on_user_list(user_list)
+            return
+        users, _assignments = self._snapshot
+        for user in user_list["user_list"]:
+            users[user["user_id"]] = user["username"]
+
+    def _on_user_enter(self, data):
+        if self._snapshot is None:
+            super()._on_user_enter(data)
+            return
+        users, _assignments = self._snapshot
+        users[data["user_id"]] = data["username"]
+
+    def _on_user_leave(self, data):
+        if self._snapshot is None:
+            super()._on_user_leave(data)
+            return
+        users, assignments = self._snapshot
+        users.pop(data["user_id"], None)
+        for bell in [b for b, u in assignments.items() if u == data["user_id"]]:
+            del assignments[bell]
+
+    def _on_assign_user(self, data):
+        if self._snapshot is None:
+            super()._on_assign_user(data)
+            return
+        _users, assignments = self._snapshot
+        bell = Bell.from_number(data["bell"])
+        if data["user"]:
+            assignments[bell] = data["user"]
+        else:
+            assignments.pop(bell, None)
+
+    def _on_global_bell_state(self, data):
+        if self._snapshot is None:
+            super()._on_global_bell_state(data)
+            return
+        # The snapshot is complete, so replace the stale state with it in one go
+        self._update_bell_state([Stroke(x) for x in data["global_bell_state"]])
+        self._waiting_for_first_global_state = False
+        (self._user_name_map, self._assigned_users), self._snapshot = self._snapshot, None
+        if self._dropped_at is not None:
+            stats.record("reconnect", time.perf_counter() - self._dropped_at)
+            self._dropped_at = None
+        self.logger.info(f"Resynchronised with {len(self._user_name_map)} user(s)")
+        for c in self._invoke_on_resync:
+            c()
+
+    # ===== ENTER/EXIT FOR 'WITH' BLOCKS =====
+
+    def __enter__(self):
+        self.connect()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.disconnect()
+
+
+class SpeculativeConnection:
+    """
+    Connects to a tower on a background thread, before the user has decided to join it.  If the
+    user picks another tower instead, the connection is abandoned and closed in the background.
+    """
+
+    def __init__(self, tower_id, page, session):
+        self.tower_id = tower_id
+        self.page = page
+        self.tower = PreparedTower(tower_id, page, session)
+
+        self._abandoned = threading.Event()
+        self._thread = threading.Thread(
+            target=self._connect,
+            name=f"Connect-{tower_id}",
+            daemon=True
+        )
+        self._thread.start()
+
+    def abandon(self):
+        """ Close the connection (without waiting), since the user didn't join this tower. """
+        self._abandoned.set()
+        threading.Thread(target=self.tower.disconnect, daemon=True).start()
+
+    def _connect(self):
+        try:
+            self.tower.connect()
+        except Exception as e:
+            # This will be tried again (and the error shown) when the user joins the tower
+            print(f"Couldn't connect to tower #{self.tower_id} early: {e}")
+            return
+        # The user may have moved on while this was connecting
+        if self._abandoned.is_set():
+            self.tower.disconnect()
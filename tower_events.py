@@ -0,0 +1,117 @@
+"""
+Passing the tower's events from the socket-io thread to the Tk thread.  `belltower` runs its
+callbacks on the socket-io client's thread, where it isn't safe to touch Tk (or the practice which
+Tk draws), and where slow UI work would hold up the socket.  An EventBus turns every callback into
+an entry on a bounded queue, which never blocks, and the Tk thread drains the queue every
+`DRAIN_INTERVAL` ms, handling at most `MAX_BATCH` events per frame.
+
+If the Tk thread stalls for long enough that the queue fills up, further events are dropped rather
+than making the socket wait.  Once everything which was queued has been handled, the bus runs its
+overflow handler, which should bring the UI up to date from the tower's current state.  Control
+events (e.g. the connection dropping or being resynchronised) can't be recovered like that, so they
+are never dropped - they don't count towards the bound, but are still handled in order with
+everything else.
+"""
+
+import queue
+import threading
+import time
+
+import stats
+
+""" The most events which can be waiting for the Tk thread before new events are dropped. """
+MAX_PENDING = 10000
+""" How often (in ms) the Tk thread drains the queue, and the most events it handles each time. """
+DRAIN_INTERVAL = 20
+MAX_BATCH = 500
+
+
+class EventBus:
+    """
+    A bounded queue of events from the socket-io thread, which are handled in batches on the Tk
+    thread.  Every type of event has one handler.
+    """
+
+    def __init__(self, max_pending=MAX_PENDING, max_batch=MAX_BATCH):
+        # The queue itself is unbounded, so that control events always fit, and the bound is only
+        # applied to the events which can be dropped
+        self._events = queue.Queue()
+        self._max_pending = max_pending
+        self._max_batch = max_batch
+        # The number of droppable events in the queue
+        self._num_pending = 0
+        self._pending_lock = threading.Lock()
+        # Maps event types to their handlers
+        self._handlers = {}
+        self._overflow_handler = None
+        # Set by the socket-io thread when an event is dropped, and cleared once it's been caught up
+        self._has_overflowed = False
+        self._last_drain = time.perf_counter()
+        self._widget = None
+
+    def callback(self, event_type, handler, is_control=False):
+        """
+        Set the handler for a type of event, returning a function which queues events of that type.
+        The function is what should be given to the tower, in place of the handler.  Control events
+        are never dropped.
+        """
+        self._handlers[event_type] = handler
+
+        def put(*args):
+            if not is_control:
+                with self._pending_lock:
+                    if self._num_pending >= self._max_pending:
+                        self._has_overflowed = True
+                        stats.record("event_overflow", time.perf_counter() - self._last_drain)
+                        return
+                    self._num_pending += 1
+            self._events.put((event_type, args, is_control, time.perf_counter()))
+        return put
+
+    def on_overflow(self, handler):
+        """ Set the function which is run (on the Tk thread) after events have been dropped. """
+        self._overflow_handler = handler
+
+    @property
+    def is_idle(self):
+        """ Whether or not every event has been handled. """
+        return self._events.empty() and not self._has_overflowed
+
+    def start(self, widget):
+        """ Start draining the queue from a widget's event loop, until the widget is destroyed. """
+        self._widget = widget
+        self._poll()
+
+    def _poll(self):
+        if not self._widget.winfo_exists():
+            return
+        # Keep draining even if a handler raises, otherwise every later event would be stuck
+        try:
+            self.drain()
+        finally:
+            self._widget.after(DRAIN_INTERVAL, self._poll)
+
+    def drain(self):
+        """ Handle the next batch of events.  Must be called on the Tk thread. """
+        start = self._last_drain = time.perf_counter()
+        num_handled = 0
+        while num_handled < self._max_batch:
+            try:
+                event_type, args, is_control, queued_at = self._events.get_nowait()
+            except queue.Empty:
+                break
+            if not is_control:
+                with self._pending_lock:
+                    self._num_pending -= 1
+            stats.record("event_lag", time.perf_counter() - queued_at)
+            self._handlers[event_type](*args)
+            num_handled += 1
+
+        # Events which are still queued are older than the tower's current state, so the dropped
+        # events can only be caught up with once they've all been handled
+        if self._has_overflowed and self._events.empty():
+            self._has_overflowed = False
+            if self._overflow_handler is not None:
+                self._overflow_handler()
+        if num_handled:
+            stats.record("event_batch", time.perf_counter() - start)
@@ -0,0 +1,277 @@
+"""
+Code to look up towers on Ringing Room without blocking the Tk thread.  Page lookups are made on a
+background thread, only the most recently requested tower ID is ever resolved, and the results are
+kept in a small cache so that retyping an ID doesn't cause another HTTP round trip.
+
+`belltower` imports the whole networking stack (socketio, engineio and requests), which takes much
+longer than showing a window, so it is imported by the lookup thread as soon as it starts.  By the
+time the user has typed a tower ID, the stack is warm and the first lookup goes straight out.
+Pages are fetched through one `requests.Session`, which is then handed to the tower (see
+`tower_connection`) so that joining reuses the same connection to Ringing Room.
+
+Every tower which is found is also saved to a TowerDirectory on disk, so the next time the program
+starts, towers which have been seen before are shown (and can be joined) without waiting for the
+network.  The lookup thread still refreshes them in the background, and falls back on the directory
+if Ringing Room can't be reached.
+"""
+
+import collections
+import json
+import os
+import queue
+import re
+import threading
+import time
+import urllib.parse
+
+from practice_store import AUTOSAVE_DIR
+
+DEFAULT_URL = "ringingroom.com"
+""" The file which the towers that have been seen before are saved in. """
+DIRECTORY_PATH = os.path.join(AUTOSAVE_DIR, "towers.json")
+""" The number of towers shown in the list of recently joined towers. """
+NUM_RECENT_TOWERS = 5
+
+
+def fetch_page(session, tower_id, url=DEFAULT_URL):
+    """
+    The same as `belltower.page_parsing.parse_page`, except that the page is fetched through a
+    `requests.Session`.  Returns a `(socket-io url, tower name, bell type)` tuple, or raises
+    `TowerNotFoundError` if the tower doesn't exist.
+    """
+    from belltower import BellType
+    from belltower.page_parsing import TowerNotFoundError
+
+    http_url = url if url.startswith("http") else "https://" + url
+    html = session.get(urllib.parse.urljoin(http_url, str(tower_id))).text
+    try:
+        load_balancing_url, = re.findall('server_ip: "(.*)"', html)
+        tower_name, = re.findall(' name: "(.*)"', html)
+        bell_type_name, = re.findall('audio: "(.*)"', html)
+    except ValueError as e:
+        raise TowerNotFoundError(tower_id, http_url) from e
+    return (load_balancing_url, tower_name, BellType.from_ringingroom_name(bell_type_name))
+
+
+class TowerCache:
+    """
+    An in-memory LRU cache of tower pages, where entries expire after a given time-to-live.  Each
+    entry is either the `(url, tower_name, bell_type)` tuple returned by `parse_page`, or `None` if
+    the tower doesn't exist.
+    """
+
+    def __init__(self, max_size=64, ttl=300):
+        self._max_size = max_size
+        self._ttl = ttl
+        # Maps tower IDs to (expiry time, page) pairs, with the most recently used at the end
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, tower_id):
+        """ Returns a pair of (is_hit, page) for a given tower ID. """
+        with self._lock:
+            entry = self._entries.get(tower_id)
+            if entry is None:
+                return (False, None)
+            expiry, page = entry
+            if expiry < time.monotonic():
+                del self._entries[tower_id]
+                return (False, None)
+            self._entries.move_to_end(tower_id)
+            return (True, page)
+
+    def put(self, tower_id, page):
+        with self._lock:
+            self._entries[tower_id] = (time.monotonic() + self._ttl, page)
+            self._entries.move_to_end(tower_id)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+
+
+class TowerDirectory:
+    """
+    The towers which have been found before, saved to disk.  Every entry holds the tower's name,
+    bell type and socket-io URL (as strings, so reading the directory doesn't need `belltower`),
+    and when it was last seen and joined.  Entries are written by the lookup thread and when a
+    tower is joined, so access is locked.
+    """
+
+    def __init__(self, path=DIRECTORY_PATH):
+        self._path = path
+        self._lock = threading.Lock()
+        # Maps tower IDs (as strings) to dicts of "url", "name", "bell_type", "last_seen" and
+        # (for towers which have been joined) "last_joined"
+        self._towers = {}
+        try:
+            with open(path) as f:
+                self._towers = json.load(f)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            print(f"Couldn't read the tower directory from {path}: {e}")
+
+    def name(self, tower_id):
+        """ The name of a tower, or None if it isn't in the directory. """
+        with self._lock:
+            entry = self._towers.get(str(tower_id))
+            return None if entry is None else entry["name"]
+
+    def page(self, tower_id):
+        """ A tower's page in the form returned by `fetch_page`, or None if it isn't known. """
+        from belltower import BellType
+
+        with self._lock:
+            entry = self._towers.get(str(tower_id))
+            if entry is None:
+                return None
+            return (entry["url"], entry["name"], BellType.from_ringingroom_name(entry["bell_type"]))
+
+    def recent(self, count=NUM_RECENT_TOWERS):
+        """ The `(tower_id, name)` pairs of the towers which were joined most recently. """
+        with self._lock:
+            joined = [(t, e) for t, e in self._towers.items() if "last_joined" in e]
+        joined.sort(key=lambda item: -item[1]["last_joined"])
+        return [(tower_id, entry["name"]) for tower_id, entry in joined[:count]]
+
+    def put(self, tower_id, page):
+        """ Add or refresh a tower which has just been found. """
+        url, tower_name, bell_type = page
+        with self._lock:
+            entry = self._towers.setdefault(str(tower_id), {})
+            entry.update(url=url, name=tower_name, bell_type=bell_type.ringingroom_name(),
+                         last_seen=time.time())
+            self._write()
+
+    def mark_joined(self, tower_id):
+        with self._lock:
+            entry = self._towers.get(str(tower_id))
+            if entry is not None:
+                entry["last_joined"] = time.time()
+                self._write()
+
+    def forget(self, tower_id):
+        """ Remove a tower which no longer exists. """
+        with self._lock:
+            if self._towers.pop(str(tower_id), None) is not None:
+                self._write()
+
+    def _write(self):
+        """ Atomically replace the file with the current entries.  Must hold the lock. """
+        try:
+            os.makedirs(os.path.dirname(self._path) or ".", exist_ok=True)
+            temp_path = self._path + ".tmp"
+            with open(temp_path, "w") as f:
+                json.dump(self._towers, f, indent=1)
+            os.replace(temp_path, self._path)
+        except OSError as e:
+            print(f"Couldn't save the tower directory: {e}")
+
+
+class TowerLookup:
+    """
+    A background thread which resolves tower IDs into tower pages.  Requesting a new tower ID
+    supersedes any previous request, so a stale lookup never overwrites the result of a newer one.
+    """
+
+    def __init__(self, url=DEFAULT_URL, cache=None, directory=None):
+        self.url = url
+        self.cache = cache if cache is not None else TowerCache()
+        # The towers found before, which are updated by every lookup (if given)
+        self.directory = directory
+        # The HTTP session which pages are fetched through.  This is made by the lookup thread, so
+        # is None until the networking stack has been imported
+        self.session = None
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        # Incremented by every request or cancellation, so that stale results can be spotted
+        self._generation = 0
+        # The latest (generation, tower_id, callback) which hasn't been started yet
+        self._pending = None
+        self._results = queue.Queue()
+        # Set by `close`, to stop the thread (and maybe close the session) once it's finished
+        self._is_closed = False
+        self._should_close_session = False
+
+        self._thread = threading.Thread(target=self._run, name="TowerLookup", daemon=True)
+        self._thread.start()
+
+    def request(self, tower_id, callback):
+        """
+        Look up a tower in the background, superseding any previous request.  `callback` is called
+        with `(tower_id, page)` from `process_results`, where `page` is `None` if the tower doesn't
+        exist.
+        """
+        with self._lock:
+            self._generation += 1
+            self._pending = (self._generation, tower_id, callback)
+        self._wakeup.set()
+
+    def cancel(self):
+        """ Make sure that no outstanding request will have its callback called. """
+        with self._lock:
+            self._generation += 1
+            self._pending = None
+
+    def close(self, close_session=True):
+        """
+        Stop the lookup thread, without waiting for it.  The session is closed too, unless it's
+        been handed to a tower which is still being used (see `tower_connection`).
+        """
+        with self._lock:
+            self._generation += 1
+            self._pending = None
+            self._is_closed = True
+            self._should_close_session = close_session
+        self._wakeup.set()
+
+    def process_results(self):
+        """ Run the callbacks of any finished lookups.  Must be called on the Tk thread. """
+        while True:
+            try:
+                generation, tower_id, callback, page = self._results.get_nowait()
+            except queue.Empty:
+                return
+            # Drop results which have been superseded while they were being looked up
+            if generation == self._generation:
+                callback(tower_id, page)
+
+    def _run(self):
+        import requests
+        from belltower.page_parsing import TowerNotFoundError
+
+        self.session = requests.Session()
+        while True:
+            self._wakeup.wait()
+            with self._lock:
+                self._wakeup.clear()
+                if self._is_closed:
+                    break
+                request, self._pending = self._pending, None
+            if request is None:
+                continue
+
+            generation, tower_id, callback = request
+            is_hit, page = self.cache.get(tower_id)
+            if not is_hit:
+                try:
+                    page = fetch_page(self.session, tower_id, self.url)
+                    self.cache.put(tower_id, page)
+                    if self.directory is not None:
+                        self.directory.put(tower_id, page)
+                except TowerNotFoundError:
+                    page = None
+                    self.cache.put(tower_id, page)
+                    if self.directory is not None:
+                        self.directory.forget(tower_id)
+                except Exception:
+                    # Don't cache network failures, since the tower may well exist.  If we've seen
+                    # it before, then assume that it hasn't changed
+                    page = None
+                    if self.directory is not None:
+                        page = self.directory.page(tower_id)
+            self._results.put((generation, tower_id, callback, page))
+
+        # The session is closed on this thread, so that it's never closed during a lookup
+        if self._should_close_session:
+            self.session.close()